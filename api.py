@@ -1,21 +1,38 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from flask_restx import Api, Resource, fields
 import os
-import difflib
-from html import escape
-import uuid
-from datetime import datetime
-import re
+import hashlib
+import json
+import logging
 import threading
 import time
-from pathlib import Path
-import pdfplumber
-import sys
 from file_manager_api import file_manager
+import text_cache
+import doc_converter
+import search_index
+import chunk_store
+import symbol_index
+import guide_index
+import diff_engine
+import diff_store
+import batch_compare
+import content_store
+import oracle_query
+import source_sync
+import dir_index
+import http_cache
+import line_index
+import jobs
+import metrics
+import uploads
 
 app = Flask(__name__)
 # Register the file manager blueprint
 app.register_blueprint(file_manager)
+# Oversized request bodies are refused from Content-Length, before they are read
+app.config['MAX_CONTENT_LENGTH'] = uploads.MAX_REQUEST_BYTES
+# Per-route latency histograms and the opt-in request profiler
+metrics.init_app(app)
 
 api = Api(
     app,
@@ -27,6 +44,8 @@ api = Api(
 
 # Define the namespace
 ns = api.namespace('files', description='File operations')
+admin_ns = api.namespace('admin', description='Administrative operations')
+jobs_ns = api.namespace('jobs', description='Background jobs for long-running conversions and compares')
 
 # Define the response models
 file_list_response = api.model('FileListResponse', {
@@ -40,30 +59,214 @@ file_content_response = api.model('FileContentResponse', {
     'status': fields.String(description='Status of the operation', default='')
 })
 
-# Add cleanup configuration
-DIFF_CLEANUP_THRESHOLD = 24 * 60 * 60  # 24 hours in seconds
-DIFF_CLEANUP_INTERVAL = 60 * 60  # 1 hour in seconds
+compare_file_ref = api.model('CompareFileRef', {
+    'filename': fields.String(required=False, description='Name of a file in the files folder'),
+    'session_id': fields.String(required=False, description='Session ID to look for the file in session-specific directory'),
+    'hash': fields.String(required=False, description='Content hash returned by an earlier compare')
+})
+
+def resolve_file_path(filename, session_id=''):
+    """Return the path of a file, preferring the session directory when session_id is given"""
+    if session_id:
+        session_filepath = os.path.join('files', session_id, filename)
+        if os.path.exists(session_filepath):
+            return session_filepath
+    # Fall back to main files directory
+    return os.path.join('files', filename)
+
+def json_error(body, status):
+    """JSON error response with its status set; Flask-RESTX resources turn (response, status) tuples into 500s"""
+    response = jsonify(body)
+    response.status_code = status
+    return response
+
+def is_plain_name(name):
+    """True for a file or session name without directory parts, so it cannot leave its folder"""
+    return bool(name) and os.path.basename(name) == name and name not in ('.', '..')
+
+def read_text_file(filepath):
+    """Read a text file as UTF-8 or latin-1, using the encoding detected once per file version"""
+    with open(filepath, 'r', encoding=line_index.detect_encoding(filepath)) as file:
+        return file.read() or ''
+
+def resolve_compare_input(data, prefix):
+    """Return (content, filename) for one side of a compare, given inline or by reference"""
+    content = data.get(f'{prefix}_content')
+    if content is not None:
+        return content, ''
+    ref = data.get(f'{prefix}_ref') or {}
+    if ref.get('hash'):
+        content = content_store.get(ref['hash'])
+        if content is None:
+            raise LookupError(f"Unknown content hash for {prefix}")
+        return content, ref.get('filename', '')
+    if ref.get('filename'):
+        session_id = ref.get('session_id', '')
+        if not is_plain_name(ref['filename']) or (session_id and not is_plain_name(session_id)):
+            raise ValueError(f"Invalid file name or session ID for {prefix}")
+        filepath = resolve_file_path(ref['filename'], session_id)
+        if not os.path.exists(filepath):
+            raise LookupError(f"File not found: {ref['filename']}")
+        return read_text_file(filepath), ref['filename']
+    return '', ''
+
+class DiffSaveError(Exception):
+    pass
+
+def diff_key(file1_content, file2_content, file1_name, time_budget, inline_highlights):
+    """Content address of a compare in the diff store"""
+    return diff_store.make_key(file1_content, file2_content, {
+        'file1_name': file1_name,
+        'time_budget': time_budget,
+        'inline_highlights': inline_highlights
+    })
+
+def cached_diff(key):
+    """Return the stored compact diff for a key, or None"""
+    result = diff_store.store.get(key)
+    hit = result is not None and 'a_lines' in result
+    metrics.cache_result('diff_store', hit)
+    return result if hit else None
+
+def record_diff_input(file1_content, file2_content):
+    metrics.observe('diff_input_bytes', len(file1_content) + len(file2_content))
+    metrics.observe('diff_input_lines', file1_content.count('\n') + file2_content.count('\n') + 2)
+
+def store_diff(key, result, file1_name):
+    """Render the diff page and store it with the result"""
+    result['file1_name'] = file1_name
+    try:
+        # The page only carries the summary; hunks are fetched as they scroll into view
+        html = render_template('file_diff.html',
+            diff_id=key,
+            file1_name=file1_name,
+            summary=diff_engine.summarize(result['opcodes'])
+        )
+        diff_store.store.put(key, result, html)
+    except Exception as e:
+        raise DiffSaveError(str(e))
+
+def compute_diff(file1_content, file2_content, file1_name, time_budget, inline_highlights):
+    """Return (diff_id, compact diff), diffing and rendering only when the diff store has no entry"""
+    # Identical compares are answered from the content-addressed store
+    key = diff_key(file1_content, file2_content, file1_name, time_budget, inline_highlights)
+    result = cached_diff(key)
+    if result is None:
+        # Line-hashed patience/Myers diff; regions that exceed the time budget
+        # are reported as whole-block replacements
+        record_diff_input(file1_content, file2_content)
+        with metrics.timer('diff_compute_seconds'):
+            result = diff_engine.compare(file1_content, file2_content, time_budget, inline_highlights)
+        store_diff(key, result, file1_name)
+    return key, result
+
+# Summaries of session compares by the versions of both files, so unchanged
+# files are answered without reading them or loading their stored diff
+_session_results = {}
+_session_results_lock = threading.Lock()
+SESSION_RESULTS_MAX_ENTRIES = 5000
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-def cleanup_old_diff_files():
-    """Clean up diff files older than DIFF_CLEANUP_THRESHOLD"""
-    while True:
+def _session_entry(filename, status, diff_id=None, summary=None, coarse=False):
+    entry = {'filename': filename, 'status': status, 'summary': summary, 'coarse': coarse}
+    if diff_id:
+        entry['diff_id'] = diff_id
+        entry['diff_url'] = f'/diff/{diff_store.DiffStore.html_filename(diff_id)}'
+        entry['hunks_url'] = f'/files/diff/{diff_id}/hunks'
+    return entry
+
+def compare_session(session_id, time_budget, inline_highlights):
+    """Compare every file of files/<session_id> with its baseline in files/.
+
+    Returns one summary entry per file: unchanged, modified, added (no
+    baseline) or error. Diffs missing from the diff store are computed in
+    parallel on the batch compare pool; hunks are fetched later by diff_id.
+    A remembered summary whose diff was evicted from the store since is
+    diffed and stored again, so every returned diff_id exists when answered.
+    """
+    session_dir = os.path.join('files', session_id)
+    entries = {}
+    pending = []
+    for filename in sorted(dir_index.for_folder(session_dir).names()):
+        session_path = os.path.join(session_dir, filename)
+        baseline_path = os.path.join('files', filename)
+        version = (session_path, _file_version(session_path), _file_version(baseline_path),
+                   time_budget, inline_highlights)
+        with _session_results_lock:
+            known = _session_results.get(version)
+        if known is not None and known.get('diff_id') and not diff_store.store.contains(known['diff_id']):
+            known = None
+        if known is not None:
+            entries[filename] = dict(known, cached=True)
+            continue
         try:
-            diff_dir = Path('diff')
-            if diff_dir.exists():
-                current_time = time.time()
-                for file in diff_dir.glob('diff_*.html'):
-                    if current_time - file.stat().st_mtime > DIFF_CLEANUP_THRESHOLD:
-                        try:
-                            file.unlink()
-                        except Exception as e:
-                            print(f"Error deleting old diff file {file}: {e}")
+            session_content = read_text_file(session_path)
+            baseline_content = read_text_file(baseline_path) if version[2] is not None else ''
         except Exception as e:
-            print(f"Error in cleanup thread: {e}")
-        time.sleep(DIFF_CLEANUP_INTERVAL)
+            entries[filename] = dict(_session_entry(filename, 'error'), error=str(e))
+            continue
+        status = 'added' if version[2] is None else 'modified'
+        if status == 'modified' and session_content == baseline_content:
+            lines = len(session_content.splitlines())
+            entry = _session_entry(filename, 'unchanged', summary=diff_engine.summarize([('equal', 0, lines, 0, lines)]))
+            entries[filename] = dict(entry, cached=False)
+            with _session_results_lock:
+                _session_results[version] = entry
+            continue
+        key = diff_key(baseline_content, session_content, filename, time_budget, inline_highlights)
+        result = cached_diff(key)
+        if result is not None:
+            entry = _session_entry(filename, status, key, diff_engine.summarize(result['opcodes']), result['coarse'])
+            entries[filename] = dict(entry, cached=True)
+            with _session_results_lock:
+                _session_results[version] = entry
+            continue
+        record_diff_input(baseline_content, session_content)
+        pending.append((filename, version, status, key, baseline_content, session_content))
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=cleanup_old_diff_files, daemon=True)
-cleanup_thread.start()
+    outcomes = batch_compare.compare_all(
+        [(baseline_content, session_content) for _, _, _, _, baseline_content, session_content in pending],
+        time_budget, inline_highlights)
+    for (filename, version, status, key, _, _), (result, seconds, error) in zip(pending, outcomes):
+        if error is not None:
+            entries[filename] = dict(_session_entry(filename, 'error'), error=error)
+            continue
+        metrics.observe('diff_compute_seconds', seconds)
+        store_diff(key, result, filename)
+        entry = _session_entry(filename, status, key, diff_engine.summarize(result['opcodes']), result['coarse'])
+        entries[filename] = dict(entry, cached=False)
+        with _session_results_lock:
+            _session_results[version] = entry
+
+    with _session_results_lock:
+        while len(_session_results) > SESSION_RESULTS_MAX_ENTRIES:
+            _session_results.pop(next(iter(_session_results)))
+    return [entries[filename] for filename in sorted(entries)]
+
+def compare_response(diff_id, result, file1_content, file2_content, response_mode='full', context=3):
+    """Build the /files/compare response body for a compact diff"""
+    # Inputs are kept by hash so follow-up compares can send references only
+    response = {
+        'status': 'Success',
+        'diff_id': diff_id,
+        'diff_url': f'/diff/{diff_store.DiffStore.html_filename(diff_id)}',
+        'file1_name': result.get('file1_name', ''),
+        'file1_hash': content_store.put(file1_content),
+        'file2_hash': content_store.put(file2_content),
+        'coarse': result['coarse']
+    }
+    if response_mode == 'hunks':
+        response['summary'] = diff_engine.summarize(result['opcodes'])
+        response['hunks'], _ = diff_engine.hunks(result, context)
+    else:
+        response['original_lines'], response['modified_lines'] = diff_engine.side_by_side(result)
+    return response
 
 @ns.route('/list')
 class FileLister(Resource):
@@ -82,10 +285,9 @@ class FileLister(Resource):
             if not os.path.isdir(folder_path):
                 return jsonify({'files': [], 'status': 'Error: Path is not a folder'}), 400
                 
-            files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-            print(files)
-            return jsonify({
-                'files': files,
+            index = dir_index.for_folder(folder_path)
+            return http_cache.cached_json(index.etag() + '-names', lambda: {
+                'files': index.names(),
                 'status': 'Success'
             })
         except Exception as e:
@@ -96,7 +298,9 @@ class FileReader(Resource):
     @ns.doc('read_file',
             params={
                 'filename': 'Name of the file to read',
-                'session_id': 'Session ID to look for files in session-specific directory'
+                'session_id': 'Session ID to look for files in session-specific directory',
+                'from_line': '1-based first line to return (default: whole file)',
+                'line_count': 'Number of lines to return from from_line'
             },
             responses={
                 200: 'Success',
@@ -109,42 +313,315 @@ class FileReader(Resource):
         session_id = request.args.get('session_id', '')
         
         if not filename:
-            return jsonify({'content': '', 'filename': '', 'status': 'Error: No file name provided'}), 400
+            return json_error({'content': '', 'filename': '', 'status': 'Error: No file name provided'}, 400)
             
         try:
             # First try to find file in session directory if session_id is provided
-            if session_id:
-                session_filepath = os.path.join('files', session_id, filename)
-                if os.path.exists(session_filepath):
-                    filepath = session_filepath
-                else:
-                    # Fall back to main files directory
-                    filepath = os.path.join('files', filename)
-            else:
-                filepath = os.path.join('files', filename)
+            filepath = resolve_file_path(filename, session_id)
 
             if not os.path.exists(filepath):
-                return jsonify({'content': '', 'filename': filename, 'status': 'Error: File not found'}), 404
+                return json_error({'content': '', 'filename': filename, 'status': 'Error: File not found'}, 404)
                 
+            from_line = request.args.get('from_line', '')
+            line_count = request.args.get('line_count', '')
+            # Conditional GET against the file version; the encoded body is cached per version
+            etag = http_cache.file_etag(filepath, request.query_string.decode('utf-8'))
+            if not (from_line or line_count):
+                return http_cache.cached_json(etag, lambda: {
+                    'content': read_text_file(filepath),
+                    'filename': filename,
+                    'status': 'Success'
+                }, os.path.getmtime(filepath))
+
+            from_line = int(from_line) if from_line else 1
+            line_count = int(line_count) if line_count else None
+            if from_line < 1 or (line_count is not None and line_count < 0):
+                return json_error({'content': '', 'filename': filename, 'status': 'Error: Invalid line window'}, 400)
+
+            def build_window():
+                # Served through the per-version line-offset index, only the window is read
+                index = line_index.get_index(filepath)
+                content, first, count = index.read_lines(from_line - 1, line_count)
+                return {
+                    'content': content,
+                    'filename': filename,
+                    'from_line': first + 1,
+                    'line_count': count,
+                    'total_lines': index.total_lines,
+                    'status': 'Success'
+                }
+            return http_cache.cached_json(etag, build_window, os.path.getmtime(filepath))
+        except Exception as e:
+            return json_error({'content': '', 'filename': filename, 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/search')
+class FileSearcher(Resource):
+    @ns.doc('search_files',
+            params={
+                'q': 'Search query',
+                'limit': 'Maximum number of results (default 10, at least 1)',
+                'folder': 'Restrict results to "doc" or "files"'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid query'
+            })
+    def get(self):
+        """Full-text search over the doc and files folders"""
+        query = request.args.get('q', '')
+        folder = request.args.get('folder', '')
+        if not query.strip():
+            return json_error({'results': [], 'status': 'Error: No query provided'}, 400)
+        if folder and folder not in search_index.INDEXED_FOLDERS:
+            return json_error({'results': [], 'status': 'Error: Invalid folder'}, 400)
+
+        try:
+            limit = max(int(request.args.get('limit', 10)), 1)
+            results, took_ms = search_index.search(query, limit, folder or None)
+            return jsonify({
+                'query': query,
+                'results': results,
+                # PDFs still being extracted in the background, not searchable yet
+                'pending_documents': search_index.index.pending(),
+                'took_ms': round(took_ms, 3),
+                'status': 'Success'
+            })
+        except Exception as e:
+            return json_error({'results': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/chunks')
+class ChunkSearcher(Resource):
+    @ns.doc('search_chunks',
+            params={
+                'q': 'Query text',
+                'filename': 'Use this file of the files folder as the query instead, e.g. a script package',
+                'session_id': 'Session ID to look for the query file in session-specific directory',
+                'k': 'Maximum number of chunks (default 5)',
+                'budget': 'Maximum estimated tokens of all returned chunks together',
+                'doc': 'Only return chunks of this doc file'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid query, file name or session ID',
+                404: 'File not found'
+            })
+    def get(self):
+        """Guide sections most relevant to a query or a script file, ranked by TF-IDF, within a token budget"""
+        query = request.args.get('q', '')
+        filename = request.args.get('filename', '')
+        try:
+            if filename:
+                session_id = request.args.get('session_id', '')
+                if not is_plain_name(filename) or (session_id and not is_plain_name(session_id)):
+                    return json_error({'chunks': [], 'status': 'Error: Invalid file name or session ID'}, 400)
+                filepath = resolve_file_path(filename, session_id)
+                if not os.path.exists(filepath):
+                    return json_error({'chunks': [], 'status': 'Error: File not found'}, 404)
+                query = read_text_file(filepath)
+            if not query.strip():
+                return json_error({'chunks': [], 'status': 'Error: No query provided'}, 400)
+
+            k = max(int(request.args.get('k', 5)), 1)
+            budget = request.args.get('budget', '')
+            budget = int(budget) if budget else None
+            chunks, took_ms = chunk_store.top_chunks(query, k, budget, request.args.get('doc') or None)
+            return jsonify({
+                'chunks': chunks,
+                'tokens': sum(chunk['tokens'] for chunk in chunks),
+                'took_ms': round(took_ms, 3),
+                'status': 'Success'
+            })
+        except Exception as e:
+            return json_error({'chunks': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/symbols/definitions')
+class SymbolDefinitions(Resource):
+    @ns.doc('symbol_definitions',
+            params={
+                'name': 'Procedure, function, constant, package or code table; bare or qualified (pkg.name)',
+                'kind': 'Restrict to package, function, procedure, constant, code_table or code_row',
+                'session_id': 'Also search the files of this session'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid query'
+            })
+    def get(self):
+        """Where is a symbol defined in the script packages and code tables of files/"""
+        name = request.args.get('name', '').strip()
+        if not name:
+            return json_error({'definitions': [], 'status': 'Error: No name provided'}, 400)
+        try:
+            return jsonify({
+                'name': name,
+                'definitions': symbol_index.index.definitions(
+                    name, request.args.get('session_id', ''), request.args.get('kind') or None),
+                'status': 'Success'
+            })
+        except Exception as e:
+            return json_error({'definitions': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/symbols/usages')
+class SymbolUsages(Resource):
+    @ns.doc('symbol_usages',
+            params={
+                'name': 'Symbol to look up; a package name also matches calls into the package',
+                'limit': 'Maximum number of usages (default: all)',
+                'session_id': 'Also search the files of this session'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid query'
+            })
+    def get(self):
+        """Where is a symbol used: imports, calls, member accesses and code table references"""
+        name = request.args.get('name', '').strip()
+        if not name:
+            return json_error({'usages': [], 'status': 'Error: No name provided'}, 400)
+        try:
+            limit = int(request.args.get('limit', 0)) or None
+            return jsonify({
+                'name': name,
+                'usages': symbol_index.index.usages(name, request.args.get('session_id', ''), limit),
+                'status': 'Success'
+            })
+        except Exception as e:
+            return json_error({'usages': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/symbols/outline')
+class SymbolOutline(Resource):
+    @ns.doc('symbol_outline',
+            params={
+                'filename': 'Name of the file',
+                'session_id': 'Session ID to look for the file in session-specific directory'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid file name',
+                404: 'File not found'
+            })
+    def get(self):
+        """Package, imports and definitions of one file"""
+        filename = request.args.get('filename', '')
+        if not filename:
+            return json_error({'status': 'Error: No file name provided'}, 400)
+        try:
+            outline = symbol_index.index.outline(filename, request.args.get('session_id', ''))
+            if outline is None:
+                return json_error({'filename': filename, 'status': 'Error: File not found'}, 404)
+            return jsonify(dict(outline, status='Success'))
+        except Exception as e:
+            return json_error({'filename': filename, 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/guides')
+class GuideLister(Resource):
+    @ns.doc('list_guides', responses={200: 'Success'})
+    def get(self):
+        """Guides of the doc folder grouped by guide number, with their releases"""
+        try:
+            return jsonify({'guides': guide_index.index.guides(), 'status': 'Success'})
+        except Exception as e:
+            return json_error({'guides': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/guides/<string:guide>/changes')
+class GuideChanges(Resource):
+    @ns.doc('guide_changes',
+            params={
+                'guide': 'Guide number, e.g. 1522',
+                'from': 'Release to compare from, e.g. 5.7',
+                'to': 'Release to compare to, e.g. 5.9'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid releases',
+                404: 'Guide or release not found'
+            })
+    def get(self, guide):
+        """Section-level changes of a guide between two releases, precomputed per guide version"""
+        from_release = request.args.get('from', '').strip()
+        to_release = request.args.get('to', '').strip()
+        if not (from_release and to_release):
+            return json_error({'guide': guide, 'status': 'Error: from and to releases are required'}, 400)
+        try:
+            entry = guide_index.index.get(guide)
+            if entry is None:
+                return json_error({'guide': guide, 'status': 'Error: Guide not found'}, 404)
+            try:
+                changes = guide_index.index.changes(entry, from_release, to_release)
+            except KeyError as e:
+                return json_error({'guide': guide, 'status': f'Error: {e.args[0]}'}, 404)
+            etag = hashlib.sha1(f"{entry['version']}\0{from_release}\0{to_release}".encode('utf-8')).hexdigest()
+            return http_cache.cached_json(etag, lambda: dict(changes, **{
+                'guide': guide,
+                'title': entry['title'],
+                'from': from_release,
+                'to': to_release,
+                'status': 'Success'
+            }))
+        except Exception as e:
+            return json_error({'guide': guide, 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/guides/<string:guide>/text')
+class GuideText(Resource):
+    @ns.doc('guide_text',
+            params={
+                'guide': 'Guide number, e.g. 1522',
+                'release': 'Release to read, e.g. 5.9'
+            },
+            responses={
+                200: 'Success',
+                400: 'No release given',
+                404: 'Guide or release not found'
+            })
+    def get(self, guide):
+        """Text and sections of one release, rebuilt from the guide's base text and deltas"""
+        release = request.args.get('release', '').strip()
+        if not release:
+            return json_error({'guide': guide, 'status': 'Error: No release provided'}, 400)
+        try:
+            entry = guide_index.index.get(guide)
+            if entry is None:
+                return json_error({'guide': guide, 'status': 'Error: Guide not found'}, 404)
             try:
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    content = file.read() or ''  # Ensure empty string if read() returns None or empty
-                    return jsonify({
-                        'content': content,
-                        'filename': filename,
-                        'status': 'Success'
-                    })
-            except UnicodeDecodeError:
-                # Try reading with a different encoding if UTF-8 fails
-                with open(filepath, 'r', encoding='latin-1') as file:
-                    content = file.read() or ''  # Ensure empty string if read() returns None or empty
-                    return jsonify({
-                        'content': content,
-                        'filename': filename,
-                        'status': 'Success'
-                    })
+                lines = guide_index.index.release_lines(entry, release)
+            except KeyError as e:
+                return json_error({'guide': guide, 'status': f'Error: {e.args[0]}'}, 404)
+            sections = next(item['sections'] for item in entry['releases'] if item['release'] == release)
+            return jsonify({
+                'guide': guide,
+                'release': release,
+                'content': '\n'.join(lines),
+                'sections': [{'number': number, 'title': title, 'start_line': start + 1, 'end_line': end}
+                             for number, title, start, end in sections],
+                'status': 'Success'
+            })
         except Exception as e:
-            return jsonify({'content': '', 'filename': filename, 'status': f'Error: {str(e)}'}), 400
+            return json_error({'guide': guide, 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/source/<string:name>')
+class SourceReader(Resource):
+    @ns.doc('read_source',
+            params={'name': 'Name of the Avaloq object'},
+            responses={
+                200: 'Success',
+                404: 'Source not found',
+                503: 'Database unavailable'
+            })
+    def get(self, name):
+        """Read the latest source text of an object from the database"""
+        try:
+            # Served over the shared connection pool, no connect per request
+            result = oracle_query.fetch_latest_source(name)
+        except Exception as e:
+            return json_error({'content': '', 'name': name, 'status': f'Error: {str(e)}'}, 503)
+
+        if result is None:
+            return json_error({'content': '', 'name': name, 'status': 'Error: Source not found'}, 404)
+        return jsonify({
+            'content': result[1] or '',
+            'name': result[0],
+            'status': 'Success'
+        })
 
 @ns.route('/compare')
 class FileComparer(Resource):
@@ -155,94 +632,171 @@ class FileComparer(Resource):
                 404: 'File not found'
             })
     @ns.expect(ns.model('CompareFiles', {
-        'file1_content': fields.String(required=True, description='Content of first file'),
-        'file2_content': fields.String(required=True, description='Content of second file'),
-        'file1_name': fields.String(required=True, description='Name of first file')
+        'file1_content': fields.String(required=False, description='Content of first file'),
+        'file2_content': fields.String(required=False, description='Content of second file'),
+        'file1_ref': fields.Nested(compare_file_ref, required=False, description='Reference to the first file instead of its content'),
+        'file2_ref': fields.Nested(compare_file_ref, required=False, description='Reference to the second file instead of its content'),
+        'file1_name': fields.String(required=True, description='Name of first file'),
+        'time_budget': fields.Float(required=False, description='Seconds allowed for line matching before falling back to a coarser diff (default 2, at most 30)'),
+        'inline_highlights': fields.Boolean(required=False, description='Add changed character ranges to lines of changed hunks'),
+        'response_mode': fields.String(required=False, description='"full" (default) for every line, "hunks" for changed hunks and summary counts only'),
+        'context': fields.Integer(required=False, description='Context lines around each hunk in hunks mode (default 3)')
     }))
     def post(self):
         """Compare the content of two files or provided content"""
         data = request.get_json()
-        file1_content = data.get('file1_content', '')
-        file2_content = data.get('file2_content', '')
-        file1_name = data.get('file1_name', '')
-                
         try:
-            # If content is provided directly, use it
-            if file1_content and file2_content:
-                file1_lines = file1_content.splitlines(True)
-                file2_lines = file2_content.splitlines(True)
-            
-            # Generate diff using ndiff for full file comparison from line 1
-            diff = list(difflib.ndiff(file1_lines, file2_lines))
-
-            original_lines = []
-            modified_lines = []
-            original_line_num = 1
-            modified_line_num = 1
-
-            for line in diff:
-                if line.startswith('-'):
-                    original_lines.append({
-                        'type': 'remove',
-                        'number': original_line_num,
-                        'content': line[2:]
-                    })
-                    original_line_num += 1
-                elif line.startswith('+'):
-                    modified_lines.append({
-                        'type': 'add',
-                        'number': modified_line_num,
-                        'content': line[2:]
-                    })
-                    modified_line_num += 1
-                elif line.startswith(' '):
-                    original_lines.append({
-                        'type': 'context',
-                        'number': original_line_num,
-                        'content': line[2:]
-                    })
-                    modified_lines.append({
-                        'type': 'context',
-                        'number': modified_line_num,
-                        'content': line[2:]
-                    })
-                    original_line_num += 1
-                    modified_line_num += 1
-                # Ignore lines starting with '?'
-
-            # Create diff directory if it doesn't exist
-            diff_dir = Path('diff')
-            diff_dir.mkdir(exist_ok=True)
-            
-            # Generate unique filename with timestamp and UUID
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid.uuid4())[:8]
-            filename = f'diff_{timestamp}_{unique_id}.html'
-            filepath = diff_dir / filename
-            
-            # Save the diff HTML to file with proper error handling
-            try:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(render_template('file_diff.html', 
-                        original_lines=original_lines,
-                        modified_lines=modified_lines,
-                        file1_name=file1_name
-                    ))
-            except Exception as e:
-                return jsonify({'status': f'Error saving diff file: {str(e)}'}), 500
-            
-            # Return the URL to access the diff file and the structured diff
-            diff_url = f'/diff/{filename}'
+            file1_content, file1_ref_name = resolve_compare_input(data, 'file1')
+            file2_content, _ = resolve_compare_input(data, 'file2')
+        except LookupError as e:
+            return json_error({'status': f'Error: {str(e)}'}, 404)
+        except ValueError as e:
+            return json_error({'status': f'Error: {str(e)}'}, 400)
+        file1_name = data.get('file1_name', '') or file1_ref_name
+        try:
+            time_budget = diff_engine.clamp_time_budget(data.get('time_budget'))
+        except ValueError as e:
+            return json_error({'status': f'Error: {str(e)}'}, 400)
+        inline_highlights = bool(data.get('inline_highlights', False))
+        response_mode = data.get('response_mode', 'full')
+        if response_mode not in ('full', 'hunks'):
+            return json_error({'status': 'Error: response_mode must be "full" or "hunks"'}, 400)
+
+        try:
+            diff_id, result = compute_diff(file1_content, file2_content, file1_name, time_budget, inline_highlights)
+            return jsonify(compare_response(diff_id, result, file1_content, file2_content,
+                                            response_mode, max(int(data.get('context', 3)), 0)))
+        except DiffSaveError as e:
+            return json_error({'status': f'Error saving diff file: {str(e)}'}, 500)
+        except Exception as e:
+            return json_error({'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/compare/session')
+class SessionComparer(Resource):
+    @ns.doc('compare_session',
+            responses={
+                200: 'Success',
+                400: 'Invalid input',
+                404: 'Session not found'
+            })
+    @ns.expect(ns.model('CompareSession', {
+        'session_id': fields.String(required=True, description='Session whose files are compared with their baselines in files/'),
+        'time_budget': fields.Float(required=False, description='Seconds allowed for line matching per file before falling back to a coarser diff (default 2, at most 30)'),
+        'inline_highlights': fields.Boolean(required=False, description='Add changed character ranges to lines of changed hunks')
+    }))
+    def post(self):
+        """Compare every file of a session with its baseline; returns per-file summaries, hunks are fetched by diff_id.
+
+        Stored diffs are evicted least recently used first, so a diff_id is
+        short-lived: once its hunks_url answers 404, compare the session again.
+        """
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id', '')
+        if not is_plain_name(session_id):
+            return json_error({'files': [], 'status': 'Error: Invalid session ID'}, 400)
+        if not os.path.isdir(os.path.join('files', session_id)):
+            return json_error({'files': [], 'status': 'Error: Session not found'}, 404)
+        try:
+            time_budget = diff_engine.clamp_time_budget(data.get('time_budget'))
+        except ValueError as e:
+            return json_error({'files': [], 'status': f'Error: {str(e)}'}, 400)
+
+        try:
+            started = time.perf_counter()
+            files = compare_session(session_id, time_budget, bool(data.get('inline_highlights', False)))
+            totals = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+            for entry in files:
+                for field, count in (entry['summary'] or {}).items():
+                    totals[field] += count
             return jsonify({
-                'status': 'Success',
-                'diff_url': diff_url,
-                'original_lines': original_lines,
-                'modified_lines': modified_lines,
-                'file1_name': file1_name
+                'session_id': session_id,
+                'files': files,
+                'totals': totals,
+                'changed_files': sum(1 for entry in files if entry['status'] in ('modified', 'added')
+                                     and any(entry['summary'][field] for field in ('added', 'removed', 'changed'))),
+                'took_ms': round((time.perf_counter() - started) * 1000, 3),
+                'status': 'Success'
             })
-            
+        except DiffSaveError as e:
+            return json_error({'files': [], 'status': f'Error saving diff file: {str(e)}'}, 500)
         except Exception as e:
-            return jsonify({'status': f'Error: {str(e)}'}), 400
+            return json_error({'files': [], 'status': f'Error: {str(e)}'}, 400)
+
+@ns.route('/diff/<string:diff_id>/hunks')
+class DiffHunks(Resource):
+    @ns.doc('diff_hunks',
+            params={
+                'diff_id': 'ID of a stored diff (diff_id returned by /files/compare)',
+                'offset': 'Index of the first hunk to return (default 0)',
+                'limit': 'Maximum number of hunks to return (default 20)',
+                'context': 'Context lines around each hunk (default 3)'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid parameters',
+                404: 'Diff not found'
+            })
+    def get(self, diff_id):
+        """Return a page of hunks of a stored diff"""
+        result = diff_store.store.get(diff_id)
+        if result is None or 'a_lines' not in result:
+            return json_error({'hunks': [], 'status': 'Error: Diff not found'}, 404)
+        try:
+            offset = max(int(request.args.get('offset', 0)), 0)
+            limit = max(int(request.args.get('limit', 20)), 1)
+            context = max(int(request.args.get('context', 3)), 0)
+        except ValueError:
+            return json_error({'hunks': [], 'status': 'Error: offset, limit and context must be integers'}, 400)
+
+        hunks, total = diff_engine.hunks(result, context, offset, limit)
+        return jsonify({
+            'status': 'Success',
+            'diff_id': diff_id,
+            'file1_name': result.get('file1_name', ''),
+            'offset': offset,
+            'total_hunks': total,
+            'original_total': len(result['a_lines']),
+            'modified_total': len(result['b_lines']),
+            'summary': diff_engine.summarize(result['opcodes']),
+            'hunks': hunks
+        })
+
+@ns.route('/diff/<string:diff_id>/lines')
+class DiffLines(Resource):
+    @ns.doc('diff_lines',
+            params={
+                'diff_id': 'ID of a stored diff (diff_id returned by /files/compare)',
+                'original_start': '1-based first original line',
+                'original_end': '1-based last original line (inclusive)',
+                'modified_start': '1-based first modified line',
+                'modified_end': '1-based last modified line (inclusive)'
+            },
+            responses={
+                200: 'Success',
+                400: 'Invalid parameters',
+                404: 'Diff not found'
+            })
+    def get(self, diff_id):
+        """Return the lines of a stored diff in a range, e.g. to expand a collapsed region"""
+        result = diff_store.store.get(diff_id)
+        if result is None or 'a_lines' not in result:
+            return json_error({'status': 'Error: Diff not found'}, 404)
+        try:
+            i_start = int(request.args.get('original_start', 1)) - 1
+            i_end = int(request.args.get('original_end', len(result['a_lines'])))
+            j_start = int(request.args.get('modified_start', 1)) - 1
+            j_end = int(request.args.get('modified_end', len(result['b_lines'])))
+        except ValueError:
+            return json_error({'status': 'Error: Line numbers must be integers'}, 400)
+
+        original_lines, modified_lines = diff_engine.side_by_side(
+            result, max(i_start, 0), i_end, max(j_start, 0), j_end)
+        return jsonify({
+            'status': 'Success',
+            'diff_id': diff_id,
+            'original_lines': original_lines,
+            'modified_lines': modified_lines
+        })
 
 @ns.route('/diff/<path:filename>')
 class DiffViewer(Resource):
@@ -255,14 +809,20 @@ class DiffViewer(Resource):
     def get(self, filename):
         """View a diff file"""
         try:
-            return send_from_directory('diff/', filename)
+            return send_from_directory(diff_store.DIFF_FOLDER, filename)
         except Exception as e:
             return jsonify({'status': f'Error: {str(e)}'}), 404
 
 @ns.route('/doc/<string:filename>')
 class PdfToTextReader(Resource):
     @ns.doc('pdf_to_text',
-            params={'filename': 'Name of the file to convert'},
+            params={
+                'filename': 'Name of the file to convert',
+                'pages': 'Comma separated 1-based pages or ranges to extract, e.g. 1-3,7',
+                'start': '1-based first page to extract (used with limit)',
+                'limit': 'Maximum number of pages to extract from start',
+                'stream': 'If true, stream NDJSON with one record per page'
+            },
             responses={
                 200: 'Success',
                 400: 'Invalid file name',
@@ -272,49 +832,79 @@ class PdfToTextReader(Resource):
     def get(self, filename):
         """Convert a PDF file to text or read other file types directly"""
         if not filename:
-            return jsonify({'content': '', 'filename': filename, 'status': 'Error: Invalid file name'}), 400
+            return json_error({'content': '', 'filename': filename, 'status': 'Error: Invalid file name'}, 400)
             
         file_path = os.path.join('doc', filename)
         if not os.path.exists(file_path):
-            return jsonify({'content': '', 'filename': filename, 'status': 'Error: File not found'}), 404
+            return json_error({'content': '', 'filename': filename, 'status': 'Error: File not found'}, 404)
             
+        # The representation depends on the file version and the page selection
+        etag = http_cache.file_etag(file_path, request.query_string.decode('utf-8'))
+        last_modified = os.path.getmtime(file_path)
+        if http_cache.is_not_modified(etag, last_modified):
+            return http_cache.not_modified_response(etag, last_modified)
+
         try:
-            # If it's not a PDF file, read it directly
-            if not filename.lower().endswith('.pdf'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            else:
-                # Handle PDF files
-                with pdfplumber.open(file_path) as pdf:
-                    content = ""
-                    for page in pdf.pages:
-                        content += page.extract_text() or ""
-                        content += "\n"
-                        
-            return jsonify({
-                'content': content,
-                'filename': filename,
-                'status': 'Success'
-            })
+            page_numbers = self._requested_pages(file_path)
+        except ValueError as e:
+            return json_error({'content': '', 'filename': filename, 'status': f'Error: {str(e)}'}, 400)
+
+        try:
+            if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+                def generate():
+                    for number, text in text_cache.iter_pages(file_path, page_numbers):
+                        yield json.dumps({'page': number, 'content': text, 'filename': filename}) + '\n'
+                response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+                response.set_etag(etag)
+                return response
+
+            if page_numbers is None:
+                # PDFs are served from the extracted-text cache, other files are read directly
+                return http_cache.cached_json(etag, lambda: {
+                    'content': text_cache.get_text(file_path),
+                    'filename': filename,
+                    'status': 'Success'
+                }, last_modified)
+
+            def build_pages():
+                pages = list(text_cache.iter_pages(file_path, page_numbers))
+                return {
+                    'content': text_cache.join_pages(text for _, text in pages),
+                    'filename': filename,
+                    'pages': [number for number, _ in pages],
+                    'page_count': text_cache.page_count(file_path),
+                    'status': 'Success'
+                }
+            return http_cache.cached_json(etag, build_pages, last_modified)
         except Exception as e:
-            return jsonify({'content': '', 'filename': filename, 'status': f'Error: {str(e)}'}), 500
+            return json_error({'content': '', 'filename': filename, 'status': f'Error: {str(e)}'}, 500)
+
+    @staticmethod
+    def _requested_pages(file_path):
+        """Return the 1-based page numbers selected by the query string, or None for all pages"""
+        pages = request.args.get('pages', '')
+        start = request.args.get('start', '')
+        limit = request.args.get('limit', '')
+        if not (pages or start or limit):
+            return None
+        count = text_cache.page_count(file_path)
+        if pages:
+            return text_cache.parse_page_spec(pages, count)
+        start = int(start) if start else 1
+        if start < 1:
+            raise ValueError('start must be at least 1')
+        last = start + int(limit) - 1 if limit else count
+        if last < start:
+            raise ValueError('limit must be at least 1')
+        return list(range(start, min(last, count) + 1))
 
 def pdf_to_text(pdf_path, txt_path=None):
     if not os.path.exists(pdf_path):
         print(f"File not found: {pdf_path}")
         return
 
-    # If the file is a markdown file, read it directly
-    if not pdf_path.lower().endswith('.pdf'):
-        with open(pdf_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    else:
-        # Handle PDF files as before
-        with pdfplumber.open(pdf_path) as pdf:
-            content = ""
-            for page in pdf.pages:
-                content += page.extract_text() or ""
-                content += "\n"
+    # Markdown files are read directly, PDFs go through the shared text cache
+    content = text_cache.get_text(pdf_path)
 
     if txt_path:
         with open(txt_path, "w", encoding="utf-8") as f:
@@ -323,6 +913,67 @@ def pdf_to_text(pdf_path, txt_path=None):
     else:
         print(content)
 
+@admin_ns.route('/convert')
+class DocConverter(Resource):
+    @admin_ns.doc('convert_docs',
+            responses={
+                200: 'Success',
+                400: 'Invalid number of workers',
+                500: 'Conversion error'
+            })
+    @admin_ns.expect(admin_ns.model('ConvertDocs', {
+        'force': fields.Boolean(required=False, description='Convert even if the cached text is up to date'),
+        'workers': fields.Integer(required=False, description='Number of worker processes')
+    }))
+    def post(self):
+        """Convert every document in the doc folder into the text cache"""
+        data = request.get_json(silent=True) or {}
+        workers = data.get('workers')
+        if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+            return json_error({'status': 'Error: workers must be a positive integer'}, 400)
+        try:
+            started = time.perf_counter()
+            reports = doc_converter.convert_all(
+                doc_converter.DOC_FOLDER,
+                workers=workers,
+                force=bool(data.get('force', False))
+            )
+            return jsonify({
+                'status': 'Success',
+                'files': reports,
+                'seconds': round(time.perf_counter() - started, 3)
+            })
+        except Exception as e:
+            return json_error({'status': f'Error: {str(e)}'}, 500)
+
+@admin_ns.route('/sync-sources')
+class SourceSync(Resource):
+    @admin_ns.doc('sync_sources',
+            responses={
+                200: 'Success',
+                400: 'Invalid filter',
+                500: 'Sync error'
+            })
+    @admin_ns.expect(admin_ns.model('SyncSources', {
+        'filter': fields.String(required=False, description='SQL LIKE pattern on the object name'),
+        'full': fields.Boolean(required=False, description='Ignore the high-water mark and export everything')
+    }))
+    def post(self):
+        """Export sources changed since the last sync into the files folder"""
+        data = request.get_json(silent=True) or {}
+        name_filter = data.get('filter') or None
+        if name_filter is not None and not isinstance(name_filter, str):
+            return json_error({'status': 'Error: filter must be a string'}, 400)
+        try:
+            result = source_sync.sync_sources(
+                name_filter=name_filter,
+                full=bool(data.get('full', False))
+            )
+            result['status'] = 'Success'
+            return jsonify(result)
+        except Exception as e:
+            return json_error({'status': f'Error: {str(e)}'}, 500)
+
 @ns.route('/write')
 class FileWriter(Resource):
     @ns.doc('write_file',
@@ -355,8 +1006,18 @@ class FileWriter(Resource):
 
             # Write file to session directory
             file_path = os.path.join(session_dir, file_name)
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(file_content)
+            # Replaced with a rename, so readers never see a partial file and the
+            # directory mtime tells every worker's directory index about the change
+            tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    file.write(file_content)
+                os.replace(tmp_path, file_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            dir_index.for_folder(session_dir).note_changed(file_name)
+            symbol_index.index.update_file(file_name, session_id)
 
             return jsonify({
                 'status': 'Success',
@@ -366,13 +1027,117 @@ class FileWriter(Resource):
         except Exception as e:
             return jsonify({'status': f'Error: {str(e)}'}), 500
 
+def run_compare_job(params):
+    """Job handler: the same inputs and response as POST /files/compare"""
+    file1_content, file1_ref_name = resolve_compare_input(params, 'file1')
+    file2_content, _ = resolve_compare_input(params, 'file2')
+    with app.app_context():
+        diff_id, result = compute_diff(
+            file1_content, file2_content,
+            params.get('file1_name', '') or file1_ref_name,
+            diff_engine.clamp_time_budget(params.get('time_budget')),
+            bool(params.get('inline_highlights', False)))
+    return compare_response(diff_id, result, file1_content, file2_content,
+                            params.get('response_mode', 'full'), max(int(params.get('context', 3)), 0))
+
+def run_convert_job(params):
+    """Job handler: extract a document of the doc folder into the text cache"""
+    filename = params.get('filename', '')
+    file_path = os.path.join('doc', filename)
+    if not filename or os.path.basename(filename) != filename or not os.path.exists(file_path):
+        raise LookupError(f'File not found: {filename}')
+    text_cache.get_text(file_path)
+    return {
+        'filename': filename,
+        'page_count': text_cache.page_count(file_path),
+        'content_url': f'/files/doc/{filename}'
+    }
+
+def run_convert_all_job(params):
+    """Job handler: bulk conversion of the doc folder"""
+    return {'files': doc_converter.convert_all(doc_converter.DOC_FOLDER, force=bool(params.get('force', False)))}
+
+jobs.job_queue.register('compare', run_compare_job)
+jobs.job_queue.register('convert', run_convert_job)
+jobs.job_queue.register('convert_all', run_convert_all_job)
+
+@jobs_ns.route('/')
+class JobSubmitter(Resource):
+    @jobs_ns.doc('submit_job',
+            responses={
+                202: 'Job queued',
+                400: 'Invalid job',
+                429: 'Job queue full'
+            })
+    @jobs_ns.expect(jobs_ns.model('SubmitJob', {
+        'kind': fields.String(required=True, description='Job kind: compare, convert or convert_all'),
+        'params': fields.Raw(required=False, description='Job parameters; for compare the /files/compare body, for convert {"filename": ...}'),
+        'timeout': fields.Integer(required=False, description='Seconds before the job is reported as timed out (default 300, at most 1800); the work itself is not cancelled')
+    }))
+    def post(self):
+        """Queue a long-running conversion or compare and return its job id"""
+        data = request.get_json(silent=True) or {}
+        try:
+            job = jobs.job_queue.submit(data.get('kind', ''), data.get('params') or {}, data.get('timeout'))
+        except (jobs.UnknownJobKind, ValueError) as e:
+            return json_error({'status': f'Error: {str(e)}'}, 400)
+        except jobs.QueueFull as e:
+            return json_error({'status': f'Error: {str(e)}'}, 429)
+        response = jsonify(job.to_dict())
+        response.status_code = 202
+        return response
+
+@jobs_ns.route('/<string:job_id>')
+class JobStatus(Resource):
+    @jobs_ns.doc('job_status',
+            params={
+                'job_id': 'ID returned when the job was submitted',
+                'wait': 'Seconds to long-poll for the job to finish (max 60)'
+            },
+            responses={
+                200: 'Success',
+                404: 'Job not found'
+            })
+    def get(self, job_id):
+        """Return the status, and once finished the result, of a job"""
+        try:
+            wait = min(max(float(request.args.get('wait', 0)), 0), 60)
+        except ValueError:
+            wait = 0
+        job = jobs.job_queue.wait(job_id, wait) if wait else jobs.job_queue.get(job_id)
+        if job is None:
+            return json_error({'status': 'Error: Job not found'}, 404)
+        return jsonify(job.to_dict())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose all metrics in the Prometheus text format, or as JSON with ?format=json"""
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profiles/<string:profile_id>')
+def profile_endpoint(profile_id):
+    """Return a request profile by the X-Profile-Id it was reported under; ?format=collapsed for flame graphs"""
+    profile = metrics.get_profile(profile_id)
+    if profile is None:
+        return json_error({'status': 'Error: Profile not found'}, 404)
+    if request.args.get('format') == 'collapsed':
+        return Response(profile['collapsed'], mimetype='text/plain')
+    return jsonify(profile)
+
 @app.route('/file-manager')
 def file_manager_ui():
     """Render the file manager UI"""
     return render_template('file_manager.html')
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     # Create files directory if it doesn't exist
     if not os.path.exists('files'):
         os.makedirs('files')
+    # Development server; production runs through serve.py (several workers, shared maintenance)
     app.run(debug=False,host='0.0.0.0',port=5000)
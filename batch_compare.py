@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import diff_engine
+
+# Worker processes for batch compares; with one worker (or one pending
+# diff) the diffs run in the calling thread. Every web server process has its
+# own pool, so by default the CPUs are shared out among the SERVER_WORKERS
+# processes (serve.py exports the count it starts) instead of each taking all
+_SERVER_PROCESSES = max(int(os.getenv('SERVER_WORKERS', '1')), 1)
+BATCH_COMPARE_WORKERS = int(os.getenv('BATCH_COMPARE_WORKERS',
+                                      str(max((os.cpu_count() or 1) // _SERVER_PROCESSES, 1))))
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _compare(file1_content, file2_content, time_budget, inline_highlights):
+    """Worker: diff one pair and report how long it took"""
+    started = time.perf_counter()
+    result = diff_engine.compare(file1_content, file2_content, time_budget, inline_highlights)
+    return result, time.perf_counter() - started
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: safe to start from threaded (and forked server) processes
+            context = multiprocessing.get_context('spawn')
+            _executor = ProcessPoolExecutor(max_workers=BATCH_COMPARE_WORKERS, mp_context=context)
+        return _executor
+
+
+def compare_all(pairs, time_budget, inline_highlights):
+    """Diff (file1_content, file2_content) pairs in parallel.
+
+    Returns one (result, seconds, error) tuple per pair, in order; a failed
+    pair has result None and the error message set.
+    """
+    if BATCH_COMPARE_WORKERS <= 1 or len(pairs) <= 1:
+        outcomes = []
+        for file1_content, file2_content in pairs:
+            try:
+                outcomes.append(_compare(file1_content, file2_content, time_budget, inline_highlights) + (None,))
+            except Exception as e:
+                outcomes.append((None, 0.0, str(e)))
+        return outcomes
+
+    executor = _get_executor()
+    futures = [executor.submit(_compare, file1_content, file2_content, time_budget, inline_highlights)
+               for file1_content, file2_content in pairs]
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append(future.result() + (None,))
+        except Exception as e:
+            outcomes.append((None, 0.0, str(e)))
+    return outcomes
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,284 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(REPO_DIR, 'benchmark_baseline.json')
+# Allowed relative slowdown against the baseline before a metric counts as a regression
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+# Every n-th line is edited when building the modified side of a compare
+COMPARE_EDIT_EVERY = 40
+# The largest compare input is the files/ corpus concatenated this many times
+COMPARE_XLARGE_COPIES = 8
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _latency(name, samples):
+    """Metric entry for a list of latencies in seconds, compared on the median"""
+    return {
+        'name': name,
+        'value': round(statistics.median(samples) * 1000, 3),
+        'p95': round(_percentile(samples, 0.95) * 1000, 3),
+        'unit': 'ms',
+        'higher_is_better': False
+    }
+
+
+def _rate(name, value, unit):
+    return {'name': name, 'value': round(value, 3), 'unit': unit, 'higher_is_better': True}
+
+
+def _timed(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _workspace():
+    """Temporary working directory linking the bundled corpora.
+
+    The app resolves files/, doc/, diff/ and cache/ relative to the working
+    directory, so benchmarking from here starts with empty caches and leaves
+    the repository untouched.
+    """
+    workspace = tempfile.mkdtemp(prefix='avaloq-bench-')
+    for folder in ('files', 'doc'):
+        os.symlink(os.path.join(REPO_DIR, folder), os.path.join(workspace, folder))
+    return workspace
+
+
+def _check(response):
+    if response.status_code not in (200, 304):
+        raise RuntimeError(f'{response.request.path} returned {response.status_code}')
+    return response
+
+
+def bench_pdf_to_text(api, text_cache, pdf_limit=None):
+    """Cold extraction through pdf_to_text, then reads served from the text cache"""
+    pdfs = sorted(name for name in os.listdir('doc') if text_cache.is_pdf(name))[:pdf_limit]
+    pages = 0
+    size = 0
+    cold = 0.0
+    warm = 0.0
+    for name in pdfs:
+        path = os.path.join('doc', name)
+        text_cache.invalidate(path)
+        # pdf_to_text prints the text when no output file is given
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            api.pdf_to_text(path)
+            cold += time.perf_counter() - started
+            started = time.perf_counter()
+            api.pdf_to_text(path)
+            warm += time.perf_counter() - started
+        pages += text_cache.page_count(path)
+        size += os.path.getsize(path)
+    return [
+        _rate('pdf_to_text.cold.pages_per_second', pages / cold, 'pages/s'),
+        _rate('pdf_to_text.cold.mb_per_second', size / (1024 * 1024) / cold, 'MB/s'),
+        _rate('pdf_to_text.cached.pages_per_second', pages / warm, 'pages/s'),
+    ], {'documents': len(pdfs), 'pages': pages, 'bytes': size}
+
+
+def _compare_inputs():
+    """Original/modified text pairs of increasing size from the files/ corpus"""
+    files = sorted(os.listdir('files'), key=lambda name: os.path.getsize(os.path.join('files', name)))
+    texts = {}
+    for name in files:
+        with open(os.path.join('files', name), 'r', encoding='utf-8', errors='replace') as f:
+            texts[name] = f.read()
+    corpus = '\n'.join(texts[name] for name in files)
+    inputs = {
+        'small': texts[files[len(files) // 2]],
+        'medium': texts[files[-2]],
+        'large': texts[files[-1]],
+        'xlarge': corpus * COMPARE_XLARGE_COPIES
+    }
+    pairs = {}
+    for size, original in inputs.items():
+        lines = original.split('\n')
+        for number in range(0, len(lines), COMPARE_EDIT_EVERY):
+            lines[number] = f'{lines[number]} -- edited {number}'
+        pairs[size] = (original, '\n'.join(lines))
+    return pairs
+
+
+def bench_compare(client, repeat):
+    """POST /files/compare latency; each cold run uses new content so the diff store misses"""
+    metrics = []
+    details = {}
+    for size, (original, modified) in _compare_inputs().items():
+        run = iter(range(repeat))
+
+        def cold():
+            body = {'file1_content': original, 'file2_content': f'{modified}\n-- run {next(run)}'}
+            _check(client.post('/files/compare', json=body))
+
+        body = {'file1_content': original, 'file2_content': modified, 'response_mode': 'hunks'}
+        _check(client.post('/files/compare', json=body))
+        metrics.append(_latency(f'compare.{size}.cold', _timed(cold, repeat)))
+        metrics.append(_latency(f'compare.{size}.cached_hunks',
+                                _timed(lambda: _check(client.post('/files/compare', json=body)), repeat)))
+        details[size] = {'bytes': len(original.encode('utf-8')), 'lines': original.count('\n') + 1}
+    return metrics, details
+
+
+def bench_read(client, repeat):
+    """GET /files/read for the largest script package: full, a line window and a revalidation"""
+    name = max(os.listdir('files'), key=lambda item: os.path.getsize(os.path.join('files', item)))
+    url = f'/files/read?filename={quote(name)}'
+    etag = _check(client.get(url)).headers['ETag']
+    return [
+        _latency('read.full', _timed(lambda: _check(client.get(url)), repeat)),
+        _latency('read.gzip', _timed(lambda: _check(client.get(url, headers={'Accept-Encoding': 'gzip'})), repeat)),
+        _latency('read.window', _timed(
+            lambda: _check(client.get(f'{url}&from_line=1000&line_count=200')), repeat)),
+        _latency('read.not_modified', _timed(
+            lambda: _check(client.get(url, headers={'If-None-Match': etag})), repeat)),
+    ], {'filename': name, 'bytes': os.path.getsize(os.path.join('files', name))}
+
+
+def bench_listing(client, repeat):
+    for url in ('/files/list', '/api/files', '/api/docs'):
+        _check(client.get(url))
+    return [
+        _latency('list.files', _timed(lambda: _check(client.get('/files/list')), repeat)),
+        _latency('list.file_manager_files', _timed(lambda: _check(client.get('/api/files')), repeat)),
+        _latency('list.file_manager_docs', _timed(lambda: _check(client.get('/api/docs')), repeat)),
+    ], {'files': len(os.listdir('files')), 'docs': len(os.listdir('doc'))}
+
+
+def run(repeat=DEFAULT_REPEAT, pdf_limit=None):
+    """Run every benchmark from a scratch workspace and return the results document"""
+    workspace = _workspace()
+    cwd = os.getcwd()
+    os.chdir(workspace)
+    try:
+        sys.path.insert(0, REPO_DIR)
+        import api
+        import text_cache
+
+        client = api.app.test_client()
+        started = time.perf_counter()
+        metrics = []
+        corpus = {}
+        for section, bench in (
+            ('pdf_to_text', lambda: bench_pdf_to_text(api, text_cache, pdf_limit)),
+            ('compare', lambda: bench_compare(client, repeat)),
+            ('read', lambda: bench_read(client, repeat)),
+            ('list', lambda: bench_listing(client, repeat)),
+        ):
+            section_metrics, corpus[section] = bench()
+            metrics.extend(section_metrics)
+        return {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+            'seconds': round(time.perf_counter() - started, 3),
+            'corpus': corpus,
+            'metrics': {metric.pop('name'): metric for metric in metrics}
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def compare_to_baseline(results, baseline, threshold=None):
+    """Return one row per metric present in both, with its change and whether it regressed.
+
+    Each baseline metric may carry its own 'threshold'; otherwise the
+    baseline's 'threshold' or DEFAULT_THRESHOLD applies.
+    """
+    rows = []
+    for name, metric in results['metrics'].items():
+        expected = baseline.get('metrics', {}).get(name)
+        if not expected or not expected['value']:
+            continue
+        limit = threshold if threshold is not None else expected.get(
+            'threshold', baseline.get('threshold', DEFAULT_THRESHOLD))
+        change = metric['value'] / expected['value'] - 1
+        slower = -change if metric['higher_is_better'] else change
+        rows.append({
+            'name': name,
+            'baseline': expected['value'],
+            'value': metric['value'],
+            'unit': metric['unit'],
+            'change': round(change, 4),
+            'threshold': limit,
+            'regressed': slower > limit
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PDF extraction, compares, reads and listings')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Samples per latency metric')
+    parser.add_argument('--pdf-limit', type=int, default=None, help='Only extract the first N PDFs of doc/')
+    parser.add_argument('--output', default=None, help='Write the results JSON to this file')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Override the allowed relative slowdown for every metric')
+    parser.add_argument('--update-baseline', action='store_true', help='Save the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.pdf_limit)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        # Hand-tuned per-metric thresholds survive a baseline refresh
+        for name, metric in results['metrics'].items():
+            if 'threshold' in previous.get('metrics', {}).get(name, {}):
+                metric['threshold'] = previous['metrics'][name]['threshold']
+        results['threshold'] = previous.get('threshold', DEFAULT_THRESHOLD)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}', file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline to create one', file=sys.stderr)
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    rows = compare_to_baseline(results, baseline, args.threshold)
+    for row in rows:
+        flag = 'REGRESSION' if row['regressed'] else 'ok'
+        print(f"{flag:<10} {row['name']:<40} {row['baseline']:>10} -> {row['value']:>10} {row['unit']:<8}"
+              f" {row['change']:+.1%} (limit {row['threshold']:.0%})", file=sys.stderr)
+    regressions = [row for row in rows if row['regressed']]
+    if regressions:
+        print(f'{len(regressions)} of {len(rows)} metrics regressed against {args.baseline}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
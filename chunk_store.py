@@ -0,0 +1,291 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+import dir_index
+import guide_index
+import metrics
+import search_index
+import text_cache
+
+logger = logging.getLogger(__name__)
+
+DOC_FOLDER = 'doc'
+CHUNK_EXTENSIONS = ('.md', '.pdf')
+# Sections longer than this are split into consecutive chunks of whole lines
+CHUNK_MAX_TOKENS = 512
+# Rough token count of a chunk for prompt budgets: about four characters a token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _title_key(title):
+    """A heading without case, spacing or punctuation, which PDF extraction does not keep reliably"""
+    return re.sub(r'[^a-z0-9]', '', title.lower())
+
+
+# Sections of the front matter that carry no guide content of their own
+FRONT_MATTER_TITLES = {'latest version', 'latest version of this document', 'feedback', 'copyright notice',
+                       'legal notice', 'version history', 'document history', 'contents', 'table of contents'}
+
+
+def _chunk_texts(lines, sections, max_tokens=CHUNK_MAX_TOKENS, document_title=''):
+    """Yield (section title, first line, end line) per chunk, splitting long sections on line boundaries.
+
+    Front matter (untitled lines, the document title, version history,
+    contents) is left out, and a heading without text of its own is joined
+    to the section after it.
+    """
+    skipped = {_title_key(title) for title in FRONT_MATTER_TITLES} | {_title_key(document_title)}
+    pending = None
+    for number, title, start, end in sections:
+        if not title or _title_key(title) in skipped:
+            pending = None
+            continue
+        if end - start <= 1:
+            pending = start if pending is None else pending
+            continue
+        heading = f'{number} {title}' if number else title
+        chunk_start = start if pending is None else pending
+        pending = None
+        tokens = 0
+        for position in range(chunk_start, end):
+            line_tokens = estimate_tokens(lines[position]) + 1
+            if tokens and tokens + line_tokens > max_tokens:
+                yield heading, chunk_start, position
+                chunk_start, tokens = position, 0
+            tokens += line_tokens
+        if chunk_start < end:
+            yield heading, chunk_start, end
+
+
+def chunk_document(path):
+    """Split a guide on its headings into chunks: [{section, start_line, end_line, content, tokens}]"""
+    lines = guide_index.document_lines(path)
+    sections = guide_index.split_sections(lines, markdown=not text_cache.is_pdf(path))
+    parsed = guide_index.parse_name(os.path.basename(path))
+    chunks = []
+    for section, start, end in _chunk_texts(lines, sections, document_title=parsed[2] if parsed else ''):
+        content = '\n'.join(lines[start:end])
+        chunks.append({'section': section, 'start_line': start + 1, 'end_line': end, 'content': content,
+                       'tokens': estimate_tokens(content)})
+    return chunks
+
+
+class ChunkStore:
+    """Heading-sized chunks of the doc/ guides with a TF-IDF matrix for relevance ranking.
+
+    Chunks of each file are kept per version (size and mtime from the
+    directory index) together with their term counts; only changed files are
+    re-chunked. The weighted matrix is held in CSR form (row ids, term ids,
+    weights as NumPy arrays) and rebuilt in a few vectorized steps after a
+    change, so ranking all chunks against a query is one sparse product.
+    A guide present as both Markdown and PDF is chunked from the Markdown,
+    which keeps the spaces between words that PDF extraction loses. The
+    releases of a guide repeat most of each other, so a section is returned
+    once, from the release that matches best (the latest one on a tie).
+    """
+
+    def __init__(self, folder=DOC_FOLDER):
+        self.folder = folder
+        self._lock = threading.RLock()
+        self._files = {}
+        self._vocabulary = {}
+        self._matrix = None
+
+    def _sources(self):
+        entries = {entry['name']: (entry['size'], entry['modified'])
+                   for entry in dir_index.for_folder(self.folder).entries()
+                   if entry['name'].lower().endswith(CHUNK_EXTENSIONS)}
+        return {name: version for name, version in entries.items()
+                if not (text_cache.is_pdf(name) and os.path.splitext(name)[0] + '.md' in entries)}
+
+    def _term_ids(self, tokens):
+        return [self._vocabulary.setdefault(token, len(self._vocabulary)) for token in tokens]
+
+    def _chunk_file(self, filename, version):
+        chunks = chunk_document(os.path.join(self.folder, filename))
+        terms = []
+        counts = []
+        lengths = []
+        for chunk in chunks:
+            # The section title counts too; the file name would match every chunk of the guide
+            frequencies = Counter(search_index.tokenize(chunk['content']))
+            frequencies.update(search_index.tokenize(chunk['section']))
+            terms.extend(self._term_ids(frequencies))
+            counts.extend(frequencies.values())
+            lengths.append(len(frequencies))
+        self._files[filename] = {
+            'version': version,
+            'chunks': chunks,
+            'terms': np.array(terms, dtype=np.int32),
+            'counts': np.array(counts, dtype=np.float32),
+            'lengths': np.array(lengths, dtype=np.int64)
+        }
+        self._matrix = None
+
+    def refresh(self):
+        """Bring the store up to date, re-chunking only files whose size or mtime changed"""
+        if not os.path.isdir(self.folder):
+            return
+        sources = self._sources()
+        with self._lock:
+            for filename in [filename for filename in self._files if filename not in sources]:
+                del self._files[filename]
+                self._matrix = None
+            for filename, version in sources.items():
+                cached = self._files.get(filename)
+                if cached is None or cached['version'] != version:
+                    try:
+                        self._chunk_file(filename, version)
+                    except Exception as e:
+                        logger.warning(f"Error chunking {self.folder}/{filename}: {e}")
+
+    def update_file(self, filename):
+        """Re-chunk one file after it was uploaded"""
+        if not filename.lower().endswith(CHUNK_EXTENSIONS):
+            return
+        path = os.path.join(self.folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove_file(filename)
+            return
+        with self._lock:
+            self._chunk_file(filename, (stat.st_size, stat.st_mtime))
+
+    def remove_file(self, filename):
+        with self._lock:
+            if self._files.pop(filename, None) is not None:
+                self._matrix = None
+
+    def _compact_vocabulary(self):
+        """Drop terms no chunk uses any more and renumber the rest; returns the new vocabulary"""
+        used = np.zeros(len(self._vocabulary), dtype=bool)
+        for entry in self._files.values():
+            used[entry['terms']] = True
+        if used.all():
+            return dict(self._vocabulary)
+        new_ids = np.cumsum(used) - 1
+        for entry in self._files.values():
+            entry['terms'] = new_ids[entry['terms']].astype(np.int32)
+        return {term: int(new_ids[term_id]) for term, term_id in self._vocabulary.items() if used[term_id]}
+
+    @staticmethod
+    def _section_groups(chunks):
+        """Per chunk, the same id for one part of one section in every release of a guide, and the release order"""
+        groups = {}
+        group_ids = []
+        releases = []
+        parts = Counter()
+        for chunk in chunks:
+            parsed = guide_index.parse_name(chunk['filename'])
+            guide = parsed[0] if parsed else chunk['filename']
+            section = (chunk['filename'], chunk['section'])
+            parts[section] += 1
+            group_ids.append(groups.setdefault((guide, _title_key(chunk['section']), parts[section]), len(groups)))
+            releases.append(guide_index.release_key(parsed[1]) if parsed else ())
+        order = {release: rank for rank, release in enumerate(sorted(set(releases)))}
+        return np.array(group_ids, dtype=np.int64), np.array([order[release] for release in releases], dtype=np.int64)
+
+    def _build_matrix(self):
+        """Concatenate the per-file term counts and weight them: (1 + log tf) * idf, rows L2-normalised.
+
+        The matrix carries its own copy of the vocabulary, so a query ranks
+        against the term ids it was built with while files keep changing.
+        """
+        vocabulary = self._compact_vocabulary()
+        self._vocabulary = dict(vocabulary)
+        files = sorted(self._files.items())
+        chunks = [dict(chunk, filename=filename) for filename, entry in files for chunk in entry['chunks']]
+        groups, releases = self._section_groups(chunks)
+        terms = np.concatenate([entry['terms'] for _, entry in files] or [np.zeros(0, np.int32)])
+        counts = np.concatenate([entry['counts'] for _, entry in files] or [np.zeros(0, np.float32)])
+        lengths = np.concatenate([entry['lengths'] for _, entry in files] or [np.zeros(0, np.int64)])
+        rows = np.repeat(np.arange(len(chunks)), lengths)
+
+        # Each (chunk, term) pair occurs once, so counting term ids gives document frequencies
+        document_frequency = np.bincount(terms, minlength=len(vocabulary))
+        idf = np.log((1 + len(chunks)) / (1 + document_frequency)) + 1
+        weights = (1 + np.log(counts)) * idf[terms]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(chunks)))
+        weights /= np.where(norms > 0, norms, 1)[rows]
+        return {'chunks': chunks, 'groups': groups, 'releases': releases, 'rows': rows, 'terms': terms,
+                'weights': weights, 'idf': idf, 'vocabulary': vocabulary}
+
+    def _current_matrix(self):
+        self.refresh()
+        with self._lock:
+            if self._matrix is None:
+                with metrics.timer('chunk_matrix_build_seconds'):
+                    self._matrix = self._build_matrix()
+            return self._matrix
+
+    def top_chunks(self, query, k=5, token_budget=None, filename=None):
+        """Return up to k chunks most similar to query (cosine over TF-IDF), best first.
+
+        A section found in several releases of a guide is returned once.
+        With token_budget, chunks are taken in rank order as long as their
+        estimated tokens still fit, so the result can go into a prompt as is.
+        """
+        matrix = self._current_matrix()
+        vocabulary = matrix['vocabulary']
+        frequencies = Counter(term for term in search_index.tokenize(query) if term in vocabulary)
+        if not frequencies or not matrix['chunks']:
+            return []
+        query_terms = np.array([vocabulary[term] for term in frequencies], dtype=np.int64)
+        query_weights = (1 + np.log(np.array(list(frequencies.values()), dtype=np.float64))) * matrix['idf'][query_terms]
+        query_vector = np.zeros(len(matrix['idf']))
+        query_vector[query_terms] = query_weights / np.linalg.norm(query_weights)
+
+        # Sparse matrix times dense query vector: one score per chunk
+        scores = np.bincount(matrix['rows'], weights=matrix['weights'] * query_vector[matrix['terms']],
+                             minlength=len(matrix['chunks']))
+        if filename:
+            scores[[chunk['filename'] != filename for chunk in matrix['chunks']]] = 0
+        candidates = np.flatnonzero(scores > 0)
+        # Best score first; of equal scores, the latest release
+        ranked = candidates[np.lexsort((-matrix['releases'][candidates], -scores[candidates]))]
+
+        results = []
+        seen = set()
+        used = 0
+        for position in ranked:
+            chunk = matrix['chunks'][position]
+            group = matrix['groups'][position]
+            if group in seen or (token_budget is not None and used + chunk['tokens'] > token_budget):
+                continue
+            seen.add(group)
+            used += chunk['tokens']
+            results.append(dict(chunk, score=round(float(scores[position]), 4)))
+            if len(results) >= k:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'chunks': sum(len(entry['chunks']) for entry in self._files.values()),
+                'terms': len(self._vocabulary)
+            }
+
+
+store = ChunkStore()
+
+
+def top_chunks(query, k=5, token_budget=None, filename=None):
+    started = time.perf_counter()
+    results = store.top_chunks(query, k, token_budget, filename)
+    return results, (time.perf_counter() - started) * 1000
+
+
+metrics.describe('chunk_matrix_build_seconds', 'histogram', 'Time to rebuild the TF-IDF chunk matrix after a change')
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+
+# Texts submitted to /files/compare are kept here by sha256 so later compares
+# can reference them by hash instead of sending the body again
+CONTENT_FOLDER = os.path.join('cache', 'content')
+CONTENT_STORE_MAX_ENTRIES = 2000
+
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+_lock = threading.Lock()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _path(digest):
+    return Path(CONTENT_FOLDER) / f'{digest}.txt'
+
+
+def put(text):
+    """Store a text and return its hash; storing the same text twice is a no-op"""
+    digest = content_hash(text)
+    path = _path(digest)
+    if path.exists():
+        os.utime(path)
+        return digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    prune()
+    return digest
+
+
+def get(digest):
+    """Return the text stored under a hash, or None if it is unknown"""
+    if not _HASH_PATTERN.match(digest or ''):
+        return None
+    path = _path(digest)
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return text
+
+
+def prune():
+    """Drop the least recently used texts beyond CONTENT_STORE_MAX_ENTRIES"""
+    with _lock:
+        entries = []
+        for path in Path(CONTENT_FOLDER).glob('*.txt'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        if len(entries) <= CONTENT_STORE_MAX_ENTRIES:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - CONTENT_STORE_MAX_ENTRIES]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
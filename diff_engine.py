@@ -0,0 +1,361 @@
+import math
+import time
+from bisect import bisect_left
+from difflib import SequenceMatcher
+
+# Seconds a single diff may spend on fine-grained matching before the remaining
+# regions are reported as whole-block replacements
+DEFAULT_TIME_BUDGET = 2.0
+# Upper bound on a requested time budget; a diff never runs without a deadline
+MAX_TIME_BUDGET = 30.0
+# Myers keeps one row of furthest reaching paths per edit, O(D^2) memory; a
+# region needing more edits than this is reported as one replacement instead
+MYERS_MAX_EDITS = 1000
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def clamp_time_budget(time_budget):
+    """Return a time budget in (0, MAX_TIME_BUDGET]; None gives the default, anything else not positive is a ValueError"""
+    if time_budget is None:
+        return DEFAULT_TIME_BUDGET
+    if isinstance(time_budget, bool) or not isinstance(time_budget, (int, float)):
+        raise ValueError('time_budget must be a number of seconds')
+    if not time_budget > 0 or math.isnan(time_budget):
+        raise ValueError('time_budget must be greater than 0')
+    return min(float(time_budget), MAX_TIME_BUDGET)
+
+
+def _hash_lines(a_lines, b_lines):
+    """Map every distinct line to a small integer so comparisons are int compares"""
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a, b
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Return the longest increasing run of lines that occur exactly once on both sides"""
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.setdefault(a[i], [0, 0, 0])
+        entry[0] += 1
+        entry[2] = i
+    positions = {}
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None and entry[0] == 1:
+            entry[1] += 1
+            positions[b[j]] = j
+    pairs = [(counts[line][2], j) for line, j in positions.items() if counts[line][1] == 1]
+    if not pairs:
+        return []
+    pairs.sort()
+
+    # Patience sorting: longest increasing subsequence of b positions in a order
+    tails = []
+    tail_index = []
+    backlinks = [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        slot = bisect_left(tails, j)
+        if slot == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[slot] = j
+            tail_index[slot] = index
+        backlinks[index] = tail_index[slot - 1] if slot else None
+    anchors = []
+    index = tail_index[-1]
+    while index is not None:
+        anchors.append(pairs[index])
+        index = backlinks[index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers(a, b, alo, ahi, blo, bhi, deadline, max_edits=MYERS_MAX_EDITS):
+    """Return matched (i, j) pairs of a[alo:ahi] and b[blo:bhi] using Myers' O(ND) algorithm.
+
+    v[offset + k] is the furthest x on diagonal k. Before each round d the
+    diagonals -d-1..d+1 it reads are saved for the backtrack, 2d + 3 values,
+    so memory stays O(D^2) for D <= max_edits; past that, or past the
+    deadline, _BudgetExceeded is raised.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(max_d + 1):
+        if time.perf_counter() > deadline:
+            raise _BudgetExceeded()
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m, alo, blo)
+    raise _BudgetExceeded()
+
+
+def _myers_backtrack(trace, x, y, alo, blo):
+    matches = []
+    for d in range(len(trace) - 1, -1, -1):
+        # trace[d] holds diagonals -d-1..d+1
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[d + k] < v[d + k + 2]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[d + 1 + prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((alo + x, blo + y))
+        x, y = prev_x, prev_y
+    matches.reverse()
+    return matches
+
+
+def _match_region(a, b, alo, ahi, blo, bhi, deadline, matches):
+    """Append matched pairs for a region: shared ends, then unique-line anchors, then Myers.
+
+    The sub-regions between anchors are worked through left to right from an
+    explicit stack rather than by recursion, since anchors can nest deeper
+    than the interpreter's recursion limit on large files.
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        item = stack.pop()
+        if len(item) == 2:
+            # A matched pair queued after the regions before it
+            matches.append(item)
+            continue
+        alo, ahi, blo, bhi = item
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        suffix = []
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            suffix.append((ahi, bhi))
+
+        pending = []
+        if alo < ahi and blo < bhi:
+            anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+            if anchors:
+                prev_i, prev_j = alo, blo
+                for i, j in anchors:
+                    pending.append((prev_i, i, prev_j, j))
+                    pending.append((i, j))
+                    prev_i, prev_j = i + 1, j + 1
+                pending.append((prev_i, ahi, prev_j, bhi))
+            else:
+                try:
+                    matches.extend(_myers(a, b, alo, ahi, blo, bhi, deadline))
+                except _BudgetExceeded:
+                    # Out of time or too many edits: leave the region unmatched, i.e. one replace block
+                    matches.coarse = True
+        pending.extend(reversed(suffix))
+        stack.extend(reversed(pending))
+
+
+class _Matches(list):
+    coarse = False
+
+
+def diff_opcodes(a_lines, b_lines, time_budget=DEFAULT_TIME_BUDGET):
+    """Diff two line lists and return (opcodes, coarse).
+
+    Opcodes use the difflib.SequenceMatcher.get_opcodes() format. coarse is
+    True when the time budget ran out and some regions were reported as whole
+    replacements instead of being matched line by line. time_budget is
+    clamped by clamp_time_budget, so there is always a deadline.
+    """
+    a, b = _hash_lines(a_lines, b_lines)
+    deadline = time.perf_counter() + clamp_time_budget(time_budget)
+    matches = _Matches()
+    _match_region(a, b, 0, len(a), 0, len(b), deadline, matches)
+
+    opcodes = []
+    i = j = 0
+    for mi, mj in matches + [(len(a), len(b))]:
+        if i < mi and j < mj:
+            opcodes.append(('replace', i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(('delete', i, mi, j, j))
+        elif j < mj:
+            opcodes.append(('insert', i, i, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == 'equal':
+                tag, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(('equal', i1, mi + 1, j1, mj + 1))
+            else:
+                opcodes.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes, matches.coarse
+
+
+def _inline_highlights(old, new):
+    """Return the changed character ranges of two similar lines"""
+    old_ranges = []
+    new_ranges = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        if i1 < i2:
+            old_ranges.append([i1, i2])
+        if j1 < j2:
+            new_ranges.append([j1, j2])
+    return old_ranges, new_ranges
+
+
+def compact(a_lines, b_lines, opcodes, inline_highlights=False, coarse=False):
+    """Return the compact, JSON-serialisable form of a diff.
+
+    Only the raw lines of both sides and the opcodes are kept; per-line
+    entries are built on demand by side_by_side. With inline_highlights, lines
+    paired up inside replace blocks get their changed [start, end) character
+    ranges recorded; unchanged regions are never compared character by character.
+    A coarse diff gets no highlights: its replace blocks can span most of both
+    files, and pairing their lines by position would not match related lines.
+    """
+    highlights = {'original': {}, 'modified': {}}
+    if inline_highlights and not coarse:
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag != 'replace':
+                continue
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                old_ranges, new_ranges = _inline_highlights(a_lines[i], b_lines[j])
+                highlights['original'][str(i)] = old_ranges
+                highlights['modified'][str(j)] = new_ranges
+    return {
+        'a_lines': a_lines,
+        'b_lines': b_lines,
+        'opcodes': [list(opcode) for opcode in opcodes],
+        'highlights': highlights,
+        'coarse': coarse
+    }
+
+
+def side_by_side(diff, i_start=0, i_end=None, j_start=0, j_end=None):
+    """Build original_lines / modified_lines entries for a line range of a compact diff.
+
+    Without a range this is the full line-by-line payload served by /files/compare.
+    """
+    a_lines = diff['a_lines']
+    b_lines = diff['b_lines']
+    i_end = len(a_lines) if i_end is None else i_end
+    j_end = len(b_lines) if j_end is None else j_end
+    original_highlights = diff['highlights']['original']
+    modified_highlights = diff['highlights']['modified']
+
+    original_lines = []
+    modified_lines = []
+    for tag, i1, i2, j1, j2 in diff['opcodes']:
+        if i1 >= i_end and j1 >= j_end:
+            break
+        line_type = 'context' if tag == 'equal' else 'remove'
+        for i in range(max(i1, i_start), min(i2, i_end)):
+            entry = {'type': line_type, 'number': i + 1, 'content': a_lines[i]}
+            if str(i) in original_highlights:
+                entry['highlights'] = original_highlights[str(i)]
+            original_lines.append(entry)
+        line_type = 'context' if tag == 'equal' else 'add'
+        for j in range(max(j1, j_start), min(j2, j_end)):
+            entry = {'type': line_type, 'number': j + 1, 'content': b_lines[j]}
+            if str(j) in modified_highlights:
+                entry['highlights'] = modified_highlights[str(j)]
+            modified_lines.append(entry)
+    return original_lines, modified_lines
+
+
+def compare(a_text, b_text, time_budget=DEFAULT_TIME_BUDGET, inline_highlights=False):
+    """Diff two texts and return the compact diff"""
+    a_lines = a_text.splitlines(True)
+    b_lines = b_text.splitlines(True)
+    opcodes, coarse = diff_opcodes(a_lines, b_lines, time_budget)
+    return compact(a_lines, b_lines, opcodes, inline_highlights, coarse)
+
+
+def group_hunks(opcodes, context=3):
+    """Split opcodes into hunks of changes surrounded by up to `context` equal lines"""
+    codes = list(opcodes)
+    if not any(tag != 'equal' for tag, _, _, _, _ in codes):
+        return []
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # A long equal run closes the current hunk and opens the next one
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return [group for group in groups if any(tag != 'equal' for tag, _, _, _, _ in group)]
+
+
+def hunks(diff, context=3, offset=0, limit=None):
+    """Return (hunks, total) for a compact diff: changed hunks with a few lines of context.
+
+    offset/limit select a page of hunks; only the lines of that page are built.
+    """
+    groups = group_hunks(diff['opcodes'], context)
+    page = groups[offset:offset + limit if limit is not None else None]
+    result = []
+    for group in page:
+        i_start, i_end = group[0][1], group[-1][2]
+        j_start, j_end = group[0][3], group[-1][4]
+        original_lines, modified_lines = side_by_side(diff, i_start, i_end, j_start, j_end)
+        result.append({
+            'original_start': i_start + 1,
+            'original_count': i_end - i_start,
+            'modified_start': j_start + 1,
+            'modified_count': j_end - j_start,
+            'original_lines': original_lines,
+            'modified_lines': modified_lines
+        })
+    return result, len(groups)
+
+
+def summarize(opcodes):
+    """Count added, removed, changed and unchanged lines of a diff"""
+    summary = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            summary['unchanged'] += i2 - i1
+        elif tag == 'delete':
+            summary['removed'] += i2 - i1
+        elif tag == 'insert':
+            summary['added'] += j2 - j1
+        else:
+            paired = min(i2 - i1, j2 - j1)
+            summary['changed'] += paired
+            summary['removed'] += i2 - i1 - paired
+            summary['added'] += j2 - j1 - paired
+    return summary
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DIFF_FOLDER = 'diff'
+# Upper bounds for the stored diffs; the least recently used entries are
+# evicted whenever a write would exceed either of them
+DIFF_STORE_MAX_BYTES = 256 * 1024 * 1024
+DIFF_STORE_MAX_ENTRIES = 1000
+
+
+def make_key(file1_content, file2_content, options=None):
+    """Return the content address of a compare: a hash of both inputs and the options"""
+    digest = hashlib.sha256()
+    for part in (file1_content, file2_content, json.dumps(options or {}, sort_keys=True)):
+        encoded = part.encode('utf-8')
+        # Length-prefix each part so ('ab', 'c') and ('a', 'bc') differ
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()[:32]
+
+
+class DiffStore:
+    """Content-addressed store of rendered diffs with an LRU size cap.
+
+    Each entry is diff_<key>.html (what diff_url points at) plus
+    diff_<key>.json holding the structured result, so a repeated compare is
+    answered without diffing or rendering again.
+    """
+
+    def __init__(self, folder=DIFF_FOLDER, max_bytes=DIFF_STORE_MAX_BYTES, max_entries=DIFF_STORE_MAX_ENTRIES):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total_bytes = 0
+
+    @staticmethod
+    def html_filename(key):
+        return f'diff_{key}.html'
+
+    def _paths(self, key):
+        return self.folder / self.html_filename(key), self.folder / f'diff_{key}.json'
+
+    def _load(self):
+        """Build the LRU order from disk, oldest access first"""
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        if not self.folder.exists():
+            return
+        found = []
+        for json_path in self.folder.glob('diff_*.json'):
+            key = json_path.stem[len('diff_'):]
+            html_path, _ = self._paths(key)
+            try:
+                size = json_path.stat().st_size + html_path.stat().st_size
+                found.append((json_path.stat().st_mtime, key, size))
+            except OSError:
+                continue
+        # Diffs written before the store existed have no .json and are never reused
+        for html_path in self.folder.glob('diff_*.html'):
+            if not html_path.with_suffix('.json').exists():
+                try:
+                    html_path.unlink()
+                except OSError:
+                    pass
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key):
+        """Return the stored result for a key, or None, marking it as recently used"""
+        if not re.match(r'^[0-9a-f]{32}$', key or ''):
+            return None
+        html_path, json_path = self._paths(key)
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                # Another worker process may have stored it since we loaded
+                try:
+                    size = json_path.stat().st_size + html_path.stat().st_size
+                except OSError:
+                    return None
+                self._entries[key] = size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(json_path)
+            return result
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+
+    def contains(self, key):
+        """Return True if a key is stored, without loading it or marking it as used"""
+        if not re.match(r'^[0-9a-f]{32}$', key or ''):
+            return False
+        return all(path.exists() for path in self._paths(key))
+
+    def put(self, key, result, html):
+        """Store a result and its rendered HTML, evicting least recently used entries to stay in bounds"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        html_path, json_path = self._paths(key)
+        size = 0
+        # The .json goes first: an .html without one is treated as a stale legacy file
+        for path, content in ((json_path, json.dumps(result)), (html_path, html)):
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            size += tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._load()
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            evicted = self._evict()
+        for old_key in evicted:
+            self._delete_files(old_key)
+
+    def _evict(self):
+        evicted = []
+        while len(self._entries) > 1 and (
+                self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            old_key, old_size = self._entries.popitem(last=False)
+            self._total_bytes -= old_size
+            evicted.append(old_key)
+        return evicted
+
+    def enforce_limits(self):
+        """Rescan the folder and evict down to the limits across entries written by every process.
+
+        Each process only accounts for entries it has seen, so with several
+        worker processes the folder can grow past the limits until this runs.
+        """
+        with self._lock:
+            self._entries = None
+            self._load()
+            evicted = self._evict()
+        for old_key in evicted:
+            self._delete_files(old_key)
+        return len(evicted)
+
+    def _forget(self, key):
+        with self._lock:
+            if self._entries is not None and key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+        self._delete_files(key)
+
+    def _delete_files(self, key):
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error deleting diff file {path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            return {'entries': len(self._entries), 'bytes': self._total_bytes}
+
+
+store = DiffStore()
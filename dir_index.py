@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+import time
+
+# One marker file per folder, touched whenever a process of the app changes a
+# file in place; the other processes rescan when its mtime moves
+MARKER_FOLDER = os.path.join('cache', 'dir_index')
+
+
+class DirectoryIndex:
+    """In-memory metadata of the files directly inside one folder.
+
+    The folder is rescanned only when its own mtime changes (entries added,
+    removed or renamed) or its change marker was touched by another process.
+    Changes to existing files made through the app are reported with
+    note_changed / note_removed, which re-stat a single file here and touch
+    the marker for the other processes.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.marker = os.path.join(
+            MARKER_FOLDER, hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16] + '.changed')
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._marker_mtime = None
+        self._entries = {}
+        self._etag = None
+
+    def _scan(self):
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for item in it:
+                if item.is_file():
+                    stat = item.stat()
+                    entries[item.name] = {'name': item.name, 'size': stat.st_size, 'modified': stat.st_mtime}
+        self._entries = entries
+        self._etag = None
+
+    def _marker_version(self):
+        try:
+            return os.stat(self.marker).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _touch_marker(self):
+        """Tell the other processes about a change; this one stays current unless it missed an earlier one"""
+        seen = self._marker_version() == self._marker_mtime
+        os.makedirs(MARKER_FOLDER, exist_ok=True)
+        now = time.time_ns()
+        with open(self.marker, 'a'):
+            os.utime(self.marker, ns=(now, now))
+        if seen and self._dir_mtime is not None:
+            self._marker_mtime = self._marker_version()
+
+    def _refresh(self):
+        dir_mtime = os.stat(self.folder).st_mtime_ns
+        marker_mtime = self._marker_version()
+        if dir_mtime != self._dir_mtime or marker_mtime != self._marker_mtime:
+            self._scan()
+            self._dir_mtime = dir_mtime
+            self._marker_mtime = marker_mtime
+
+    def entries(self):
+        """Return name/size/modified dicts for every file in the folder"""
+        with self._lock:
+            self._refresh()
+            return list(self._entries.values())
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def etag(self):
+        """Return a validator that changes whenever any entry changes"""
+        with self._lock:
+            self._refresh()
+            if self._etag is None:
+                digest = hashlib.sha1()
+                for name in sorted(self._entries):
+                    entry = self._entries[name]
+                    digest.update(f"{name}\0{entry['size']}\0{entry['modified']}\n".encode('utf-8'))
+                self._etag = digest.hexdigest()
+            return self._etag
+
+    def note_changed(self, filename):
+        """Re-stat one file after the app wrote it"""
+        path = os.path.join(self.folder, filename)
+        with self._lock:
+            self._touch_marker()
+            if self._dir_mtime is None:
+                return
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._entries.pop(filename, None)
+            else:
+                self._entries[filename] = {'name': filename, 'size': stat.st_size, 'modified': stat.st_mtime}
+            self._etag = None
+
+    def note_removed(self, filename):
+        with self._lock:
+            self._touch_marker()
+            self._entries.pop(filename, None)
+            self._etag = None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def for_folder(folder):
+    """Return the shared index of a folder"""
+    key = os.path.normpath(folder)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = DirectoryIndex(folder)
+        return _indexes[key]
+
@@ -0,0 +1,178 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pdfplumber
+
+import metrics
+import text_cache
+
+DOC_FOLDER = 'doc'
+CONVERTIBLE_EXTENSIONS = ('.pdf', '.md')
+# Large guides are split into page ranges of this size so one document can use several cores
+PAGES_PER_TASK = 16
+
+
+def _extract_range(pdf_path, first, last):
+    """Worker: extract pages first..last (0-based, exclusive end) of a PDF"""
+    started = time.perf_counter()
+    with pdfplumber.open(pdf_path) as pdf:
+        texts = [text_cache.extract_page(pdf.pages[i]) for i in range(first, last)]
+    return first, texts, time.perf_counter() - started
+
+
+def _txt_path(output_folder, source_path):
+    # Keep the source extension so a guide shipped as both .pdf and .md gets two outputs
+    return os.path.join(output_folder, os.path.basename(source_path) + '.txt')
+
+
+def _is_up_to_date(source_path, output_folder):
+    if output_folder:
+        txt_path = _txt_path(output_folder, source_path)
+        if not os.path.exists(txt_path) or os.path.getmtime(txt_path) < os.path.getmtime(source_path):
+            return False
+    return not text_cache.is_pdf(source_path) or text_cache.is_cached(source_path)
+
+
+def _write_txt(output_folder, source_path, content):
+    os.makedirs(output_folder, exist_ok=True)
+    txt_path = _txt_path(output_folder, source_path)
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _report(source_path, status, pages=0, seconds=0.0, error=None):
+    size = os.path.getsize(source_path)
+    entry = {
+        'filename': os.path.basename(source_path),
+        'status': status,
+        'pages': pages,
+        'bytes': size,
+        'seconds': round(seconds, 3)
+    }
+    if status == 'converted' and seconds > 0:
+        entry['pages_per_second'] = round(pages / seconds, 2)
+        entry['mb_per_second'] = round(size / (1024 * 1024) / seconds, 3)
+    if error:
+        entry['error'] = error
+    return entry
+
+
+def convert_all(folder=DOC_FOLDER, output_folder=None, workers=None, force=False,
+                pages_per_task=PAGES_PER_TASK):
+    """Convert every PDF/MD document in a folder using a process pool.
+
+    Extracted PDF text is stored in the shared text cache; when output_folder is
+    given a .txt file per document is written there as well. Documents whose
+    cache entry (and .txt file) are already current are skipped unless force is
+    set. Returns one report entry per document.
+    """
+    sources = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(CONVERTIBLE_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))
+    )
+    reports = {}
+    pending = {}
+
+    for source_path in sources:
+        if not force and _is_up_to_date(source_path, output_folder):
+            reports[source_path] = _report(source_path, 'skipped')
+        elif not text_cache.is_pdf(source_path) or (not force and text_cache.is_cached(source_path)):
+            # Markdown and already extracted PDFs only need writing to the output folder
+            started = time.perf_counter()
+            if output_folder:
+                _write_txt(output_folder, source_path, text_cache.get_text(source_path))
+            reports[source_path] = _report(source_path, 'converted', text_cache.page_count(source_path),
+                                           time.perf_counter() - started)
+        else:
+            pending[source_path] = None
+
+    if pending:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {}
+            state = {}
+            for source_path in pending:
+                try:
+                    with pdfplumber.open(source_path) as pdf:
+                        count = len(pdf.pages)
+                except Exception as e:
+                    reports[source_path] = _report(source_path, 'error', error=str(e))
+                    continue
+                state[source_path] = {
+                    'pages': [None] * count,
+                    'remaining': 0,
+                    'seconds': 0.0,
+                    'error': None
+                }
+                for first in range(0, count, pages_per_task):
+                    last = min(first + pages_per_task, count)
+                    future = executor.submit(_extract_range, source_path, first, last)
+                    futures[future] = source_path
+                    state[source_path]['remaining'] += 1
+                if count == 0:
+                    text_cache.store_pages(source_path, [])
+                    reports[source_path] = _report(source_path, 'converted')
+
+            for future in as_completed(futures):
+                source_path = futures[future]
+                doc = state[source_path]
+                doc['remaining'] -= 1
+                try:
+                    first, texts, seconds = future.result()
+                    doc['pages'][first:first + len(texts)] = texts
+                    doc['seconds'] += seconds
+                except Exception as e:
+                    doc['error'] = str(e)
+                if doc['remaining'] == 0:
+                    if doc['error']:
+                        reports[source_path] = _report(source_path, 'error', error=doc['error'])
+                    else:
+                        text_cache.store_pages(source_path, doc['pages'])
+                        # Workers run in other processes; their timings are recorded here
+                        metrics.record_pdf_extraction(source_path, len(doc['pages']), doc['seconds'])
+                        if output_folder:
+                            _write_txt(output_folder, source_path, text_cache.join_pages(doc['pages']))
+                        reports[source_path] = _report(
+                            source_path, 'converted', len(doc['pages']), doc['seconds'])
+                    # Release the page texts as soon as the document is published
+                    doc['pages'] = None
+
+    return [reports[source_path] for source_path in sources]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the doc/ corpus to text in parallel')
+    parser.add_argument('--folder', default=DOC_FOLDER, help='Folder containing the PDF/MD documents')
+    parser.add_argument('--output', default=None, help='Also write one .txt file per document here')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--pages-per-task', type=int, default=PAGES_PER_TASK,
+                        help='Pages extracted per worker task')
+    parser.add_argument('--force', action='store_true', help='Convert even if the output is up to date')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    reports = convert_all(args.folder, args.output, args.workers, args.force, args.pages_per_task)
+    elapsed = time.perf_counter() - started
+
+    for entry in reports:
+        line = f"{entry['status']:<9} {entry['filename']}"
+        if entry['status'] == 'converted' and entry['seconds']:
+            line += (f" ({entry['pages']} pages, {entry['seconds']:.2f}s,"
+                     f" {entry.get('pages_per_second', 0)} pages/s, {entry.get('mb_per_second', 0)} MB/s)")
+        if entry.get('error'):
+            line += f" - {entry['error']}"
+        print(line)
+
+    converted = [entry for entry in reports if entry['status'] == 'converted']
+    print(f"Converted {len(converted)} of {len(reports)} documents,"
+          f" {sum(entry['pages'] for entry in converted)} pages in {elapsed:.2f}s")
+    if any(entry['status'] == 'error' for entry in reports):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,16 @@
 from flask import Blueprint, jsonify, request, send_from_directory
 import os
+import re
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import shutil
+import text_cache
+import search_index
+import chunk_store
+import symbol_index
+import dir_index
+import http_cache
+import uploads
 
 file_manager = Blueprint('file_manager', __name__)
 
@@ -12,58 +21,115 @@ DOC_FOLDER = 'doc'
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def upload_target(folder, filename):
+    """Return (target folder, safe file name) for an upload, or raise UploadError"""
+    if folder not in ['files', 'doc']:
+        raise uploads.UploadError('Invalid folder')
+    if not filename:
+        raise uploads.UploadError('No selected file')
+    if not allowed_file(filename):
+        raise uploads.UploadError('File type not allowed')
+    filename = secure_filename(filename)
+    # For doc folder, only allow markdown files
+    if folder == 'doc' and not filename.lower().endswith('.md'):
+        raise uploads.UploadError('Only markdown files are allowed in doc folder')
+    return (FILES_FOLDER if folder == 'files' else DOC_FOLDER), filename
+
 @file_manager.route('/api/files', methods=['GET'])
 def list_files():
     """List files in the files directory (only first level)"""
-    files_list = []
-    for item in os.listdir(FILES_FOLDER):
-        item_path = os.path.join(FILES_FOLDER, item)
-        if os.path.isfile(item_path):  # Only include files, not directories
-            files_list.append({
-                'name': item,
-                'size': os.path.getsize(item_path),
-                'modified': os.path.getmtime(item_path)
-            })
-    return jsonify(files_list)
+    index = dir_index.for_folder(FILES_FOLDER)
+    # The variant keeps this body apart from /files/list, which shares the folder ETag
+    return http_cache.cached_json(index.etag() + '-entries', index.entries)
 
 @file_manager.route('/api/docs', methods=['GET'])
 def list_docs():
     """List markdown files in the doc directory"""
-    docs_list = []
-    for item in os.listdir(DOC_FOLDER):
-        item_path = os.path.join(DOC_FOLDER, item)
-        if os.path.isfile(item_path) and item.lower().endswith('.md'):
-            docs_list.append({
-                'name': item,
-                'size': os.path.getsize(item_path),
-                'modified': os.path.getmtime(item_path)
-            })
-    return jsonify(docs_list)
+    index = dir_index.for_folder(DOC_FOLDER)
+    return http_cache.cached_json(index.etag() + '-md', lambda: [
+        entry for entry in index.entries() if entry['name'].lower().endswith('.md')
+    ])
 
 @file_manager.route('/api/upload/<folder>', methods=['POST'])
 def upload_file(folder):
-    """Upload a file to either files or doc folder"""
+    """Upload a file to either files or doc folder.
+
+    Takes a multipart form with a "file" part, or the raw file as the request
+    body with ?filename=. A raw body is streamed straight to disk; a multipart
+    body is parsed (and spooled) by Werkzeug first. Either way bodies over
+    MAX_CONTENT_LENGTH are refused with 413 before they are read.
+    """
     if folder not in ['files', 'doc']:
         return jsonify({'error': 'Invalid folder'}), 400
-    
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # For doc folder, only allow markdown files
-        if folder == 'doc' and not filename.lower().endswith('.md'):
-            return jsonify({'error': 'Only markdown files are allowed in doc folder'}), 400
-        
-        upload_folder = FILES_FOLDER if folder == 'files' else DOC_FOLDER
-        file.save(os.path.join(upload_folder, filename))
-        return jsonify({'message': 'File uploaded successfully'})
-    
-    return jsonify({'error': 'File type not allowed'}), 400
+
+    try:
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file part'}), 400
+            file = request.files['file']
+            filename, stream = file.filename, file.stream
+        else:
+            filename, stream = request.args.get('filename', ''), request.stream
+        upload_folder, filename = upload_target(folder, filename)
+        # Hashed while streamed to a temp file, then renamed into place; extraction
+        # and indexing run as a background job
+        result = uploads.save_stream(stream, upload_folder, filename)
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Upload exceeds the {uploads.MAX_UPLOAD_BYTES} byte limit'}), 413
+    except uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(dict(result, message='File uploaded successfully'))
+
+@file_manager.route('/api/uploads/<folder>', methods=['POST'])
+def create_upload(folder):
+    """Start a resumable upload: JSON {filename, size, sha256 (optional)}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload_folder, filename = upload_target(folder, data.get('filename', ''))
+        state = uploads.create(upload_folder, filename, data.get('size'), data.get('sha256'))
+    except uploads.UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(state), 200 if state['complete'] else 201
+
+@file_manager.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Return how many bytes of a resumable upload have been received"""
+    state = uploads.status(upload_id)
+    if state is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    response = jsonify(state)
+    response.headers['Upload-Offset'] = str(state['offset'])
+    return response
+
+@file_manager.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def upload_chunk(upload_id):
+    """Append the request body at the offset given by Content-Range or Upload-Offset"""
+    content_range = re.match(r'^bytes (\d+)-\d+/(\d+|\*)$', request.headers.get('Content-Range', ''))
+    if content_range:
+        offset = int(content_range.group(1))
+    elif request.headers.get('Upload-Offset', '').isdigit():
+        offset = int(request.headers['Upload-Offset'])
+    else:
+        return jsonify({'error': 'Content-Range or Upload-Offset header required'}), 400
+    try:
+        state = uploads.append(upload_id, offset, request.stream)
+    except uploads.UploadError as e:
+        response = jsonify({'error': str(e)})
+        if e.status == 409:
+            current = uploads.status(upload_id)
+            if current is not None:
+                response.headers['Upload-Offset'] = str(current['offset'])
+        return response, e.status
+    response = jsonify(state)
+    response.headers['Upload-Offset'] = str(state['offset'])
+    return response
+
+@file_manager.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Discard an unfinished resumable upload"""
+    if not uploads.abort(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'message': 'Upload aborted'})
 
 @file_manager.route('/api/delete/<folder>/<filename>', methods=['DELETE'])
 def delete_file(folder, filename):
@@ -79,6 +145,13 @@ def delete_file(folder, filename):
     
     try:
         os.remove(file_path)
+        text_cache.invalidate(file_path)
+        search_index.index.remove_file(target_folder, os.path.basename(file_path))
+        if target_folder == FILES_FOLDER:
+            symbol_index.index.remove_file(os.path.basename(file_path))
+        else:
+            chunk_store.store.remove_file(os.path.basename(file_path))
+        dir_index.for_folder(target_folder).note_removed(os.path.basename(file_path))
         return jsonify({'message': 'File deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -90,4 +163,5 @@ def download_file(folder, filename):
         return jsonify({'error': 'Invalid folder'}), 400
     
     target_folder = FILES_FOLDER if folder == 'files' else DOC_FOLDER
-    return send_from_directory(target_folder, secure_filename(filename)) 
\ No newline at end of file
+    # conditional=True answers If-None-Match / If-Modified-Since with 304 and serves Range requests
+    return send_from_directory(target_folder, secure_filename(filename), conditional=True, etag=True) 
\ No newline at end of file
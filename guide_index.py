@@ -0,0 +1,335 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from itertools import combinations
+
+import diff_engine
+import dir_index
+import metrics
+import text_cache
+
+logger = logging.getLogger(__name__)
+
+DOC_FOLDER = 'doc'
+# One JSON file per guide: the first release's text in full, every later
+# release as a delta against the one before, and the precomputed section
+# changes between every pair of releases
+GUIDE_FOLDER = os.path.join('cache', 'guides')
+# Lines of context around each change within a modified section
+SECTION_CONTEXT = 2
+
+# <guide>-<release>-<lang>-CUG-<title>.pdf, or a yearly guide
+# <guide>-<lang>-CUG-<title>_<year>.pdf where the year is the release
+_NAME = re.compile(r'^(?P<guide>\d+)-(?:(?P<release>\d+(?:\.\d+)+)-)?(?P<lang>[a-z]{2})-CUG-'
+                   r'(?P<title>.+?)(?:_(?P<year>\d{4}))?\.(?P<ext>pdf|md)$', re.IGNORECASE)
+# PDF pages start with the file name and end with the copyright footer
+_FOOTER = re.compile(r'^www\.avaloq\.com\|', re.IGNORECASE)
+# Extracted PDF text keeps the space only after a heading number: "1.1 Deactivate ..."
+_PDF_HEADING = re.compile(r'^(?P<number>\d+(?:\.\d+){0,3})\s+(?P<title>[A-Z].{0,200})$')
+_MD_HEADING = re.compile(r'^#{1,6}\s+(?:(?P<number>\d+(?:\.\d+)*)\s+)?(?P<title>.+?)\s*$')
+
+
+def parse_name(filename):
+    """Return (guide, release, title) for a guide file name, or None"""
+    match = _NAME.match(filename)
+    if not match:
+        return None
+    release = match.group('release') or match.group('year')
+    if not release:
+        return None
+    title = re.sub(r'[_-]+', ' ', match.group('title')).strip()
+    return match.group('guide'), release, title
+
+
+def release_key(release):
+    return tuple(int(part) for part in release.split('.'))
+
+
+def document_lines(path):
+    """Text lines of a guide without blank lines and, for PDFs, the per-page header and footer"""
+    if not text_cache.is_pdf(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.rstrip() for line in f if line.strip()]
+    name = os.path.basename(path)
+    lines = []
+    for page in text_cache.get_pages(path):
+        page_lines = [line.rstrip() for line in page.splitlines() if line.strip()]
+        if page_lines and page_lines[0] == name:
+            page_lines = page_lines[1:]
+        if page_lines and _FOOTER.match(page_lines[-1]):
+            page_lines = page_lines[:-1]
+        lines.extend(page_lines)
+    return lines
+
+
+def split_sections(lines, markdown=False):
+    """Split lines on headings; returns [number, title, start, end] per section.
+
+    Lines before the first heading form an untitled front matter section.
+    """
+    pattern = _MD_HEADING if markdown else _PDF_HEADING
+    sections = []
+    for number, line in enumerate(lines):
+        match = pattern.match(line)
+        if match:
+            sections.append([match.group('number') or '', match.group('title').strip('` '), number, None])
+    if not sections or sections[0][2] > 0:
+        sections.insert(0, ['', '', 0, None])
+    for current, following in zip(sections, sections[1:]):
+        current[3] = following[2]
+    sections[-1][3] = len(lines)
+    return sections
+
+
+def _section_keys(sections, release):
+    """Match key per section: the title without number, case, spacing or markup, numbered if repeated.
+
+    The release is dropped too, since yearly guides name it in their
+    headings ("Checklist for November 2021").
+    """
+    keys = []
+    seen = {}
+    for _, title, _, _ in sections:
+        key = re.sub(r'[^a-z0-9_$#.]', '', title.lower().replace(release, ''))
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f'{key}#{seen[key]}')
+    return keys
+
+
+def make_delta(a_lines, b_lines):
+    """Compact delta turning a_lines into b_lines: [start, end, replacement lines] per change"""
+    opcodes, _ = diff_engine.diff_opcodes(a_lines, b_lines, time_budget=diff_engine.MAX_TIME_BUDGET)
+    return [[i1, i2, b_lines[j1:j2]] for tag, i1, i2, j1, j2 in opcodes if tag != 'equal']
+
+
+def apply_delta(lines, delta):
+    result = []
+    position = 0
+    for start, end, replacement in delta:
+        result.extend(lines[position:start])
+        result.extend(replacement)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
+def _section_title(section):
+    number, title = section[0], section[1]
+    return f'{number} {title}' if number else (title or 'Front matter')
+
+
+def section_changes(a, b, context=SECTION_CONTEXT):
+    """Section-level diff of two releases, each given as (release, lines, sections).
+
+    Returns added, removed and modified sections, the modified ones with their hunks.
+    """
+    a_release, a_lines, a_sections = a
+    b_release, b_lines, b_sections = b
+    a_by_key = dict(zip(_section_keys(a_sections, a_release), a_sections))
+    b_keys = _section_keys(b_sections, b_release)
+    changes = []
+    totals = {'added': 0, 'removed': 0, 'modified': 0, 'unchanged': 0}
+
+    for key, section in zip(b_keys, b_sections):
+        body = b_lines[section[2]:section[3]]
+        previous = a_by_key.pop(key, None)
+        if previous is None:
+            totals['added'] += 1
+            changes.append({'section': _section_title(section), 'status': 'added',
+                            'content': '\n'.join(body)})
+            continue
+        old_body = a_lines[previous[2]:previous[3]]
+        if old_body == body:
+            totals['unchanged'] += 1
+            continue
+        totals['modified'] += 1
+        result = diff_engine.compare('\n'.join(old_body), '\n'.join(body))
+        change = {'section': _section_title(section), 'status': 'modified',
+                  'summary': diff_engine.summarize(result['opcodes'])}
+        if previous[0] != section[0]:
+            change['previous_section'] = _section_title(previous)
+        change['hunks'], _ = diff_engine.hunks(result, context)
+        changes.append(change)
+
+    for section in a_by_key.values():
+        totals['removed'] += 1
+        changes.append({'section': _section_title(section), 'status': 'removed',
+                        'content': '\n'.join(a_lines[section[2]:section[3]])})
+    return {'totals': totals, 'changes': changes}
+
+
+def _pair_key(from_release, to_release):
+    return f'{from_release}..{to_release}'
+
+
+class GuideIndex:
+    """Guides of doc/ grouped by guide number, one entry per release.
+
+    Each guide is built once per version of its documents (size and mtime
+    from the directory index) and saved to cache/guides, so other processes
+    and later runs load it instead of extracting and diffing again. A release
+    present as both PDF and Markdown is read from the PDF.
+    """
+
+    def __init__(self, folder=DOC_FOLDER, cache_folder=GUIDE_FOLDER):
+        self.folder = folder
+        self.cache_folder = cache_folder
+        self._lock = threading.Lock()
+        self._guide_locks = {}
+        self._entries = {}
+
+    def _guide_lock(self, guide):
+        with self._lock:
+            return self._guide_locks.setdefault(guide, threading.Lock())
+
+    def sources(self):
+        """Current documents per guide: {guide: [{release, filename, title, version}]} in release order"""
+        guides = {}
+        if not os.path.isdir(self.folder):
+            return guides
+        for entry in dir_index.for_folder(self.folder).entries():
+            parsed = parse_name(entry['name'])
+            if parsed is None:
+                continue
+            guide, release, title = parsed
+            releases = guides.setdefault(guide, {})
+            known = releases.get(release)
+            if known is None or (text_cache.is_pdf(entry['name']) and not text_cache.is_pdf(known['filename'])):
+                releases[release] = {'release': release, 'filename': entry['name'], 'title': title,
+                                     'version': [entry['size'], entry['modified']]}
+        return {guide: sorted(releases.values(), key=lambda source: release_key(source['release']))
+                for guide, releases in guides.items()}
+
+    @staticmethod
+    def _version(sources):
+        key = json.dumps([[source['filename'], source['version']] for source in sources])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _cache_path(self, guide):
+        return os.path.join(self.cache_folder, f'{guide}.json')
+
+    def _load(self, guide):
+        try:
+            with open(self._cache_path(guide), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, entry):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        path = self._cache_path(entry['guide'])
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _build(self, guide, sources, version):
+        releases = []
+        texts = []
+        for source in sources:
+            lines = document_lines(os.path.join(self.folder, source['filename']))
+            sections = split_sections(lines, markdown=not text_cache.is_pdf(source['filename']))
+            texts.append((source['release'], lines, sections))
+            releases.append({'release': source['release'], 'filename': source['filename'],
+                             'lines': len(lines), 'sections': sections})
+
+        deltas = [make_delta(a[1], b[1]) for a, b in zip(texts, texts[1:])]
+        changes = {_pair_key(a[0], b[0]): section_changes(a, b) for a, b in combinations(texts, 2)}
+        return {
+            'guide': guide,
+            'title': sources[-1]['title'],
+            'version': version,
+            'releases': releases,
+            'base': texts[0][1] if texts else [],
+            'deltas': deltas,
+            'changes': changes
+        }
+
+    def get(self, guide, sources=None):
+        """Return the entry of one guide, building it if its documents changed, or None if unknown"""
+        if sources is None:
+            sources = self.sources().get(guide)
+        if not sources:
+            return None
+        version = self._version(sources)
+        entry = self._entries.get(guide)
+        if entry is not None and entry['version'] == version:
+            metrics.cache_result('guide_index', True)
+            return entry
+
+        with self._guide_lock(guide):
+            entry = self._entries.get(guide)
+            if entry is None or entry['version'] != version:
+                # Built by another process or an earlier run
+                entry = self._load(guide)
+            hit = entry is not None and entry['version'] == version
+            metrics.cache_result('guide_index', hit)
+            if not hit:
+                with metrics.timer('guide_build_seconds'):
+                    entry = self._build(guide, sources, version)
+                self._save(entry)
+            self._entries[guide] = entry
+        return entry
+
+    def build_all(self, stop=None):
+        """Bring every guide up to date; returns how many were (re)built or loaded"""
+        built = 0
+        for guide, sources in sorted(self.sources().items()):
+            if stop is not None and stop.is_set():
+                break
+            current = self._entries.get(guide)
+            if current is not None and current['version'] == self._version(sources):
+                continue
+            try:
+                self.get(guide, sources)
+                built += 1
+            except Exception as e:
+                logger.warning(f"Could not build guide {guide}: {e}")
+        return built
+
+    def guides(self):
+        """Guide numbers with their title and releases, without building anything"""
+        return [{
+            'guide': guide,
+            'title': sources[-1]['title'],
+            'releases': [{'release': source['release'], 'filename': source['filename']} for source in sources]
+        } for guide, sources in sorted(self.sources().items(), key=lambda item: int(item[0]))]
+
+    @staticmethod
+    def _release_index(entry, release):
+        for number, item in enumerate(entry['releases']):
+            if item['release'] == release:
+                return number
+        raise KeyError(f"Release {release} not found for guide {entry['guide']}")
+
+    def release_lines(self, entry, release):
+        """Reconstruct the text lines of one release from the base and the deltas"""
+        lines = entry['base']
+        for delta in entry['deltas'][:self._release_index(entry, release)]:
+            lines = apply_delta(lines, delta)
+        return lines
+
+    def changes(self, entry, from_release, to_release):
+        """Precomputed section changes between two releases of a guide (in either order)"""
+        from_index = self._release_index(entry, from_release)
+        to_index = self._release_index(entry, to_release)
+        if from_index == to_index:
+            raise ValueError('from and to must be different releases')
+        if from_index < to_index:
+            return entry['changes'][_pair_key(from_release, to_release)]
+        # Going back: recompute with the sides swapped, rare enough not to store
+        return section_changes(
+            (from_release, self.release_lines(entry, from_release), entry['releases'][from_index]['sections']),
+            (to_release, self.release_lines(entry, to_release), entry['releases'][to_index]['sections']))
+
+    def stats(self):
+        with self._lock:
+            return {'guides_loaded': len(self._entries)}
+
+
+index = GuideIndex()
+
+metrics.describe('guide_build_seconds', 'histogram', 'Time to extract, delta-encode and diff the releases of one guide')
@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    # Listed in requirements.txt; without it responses are negotiated to gzip only
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Encoded bodies are kept per (ETag, encoding) so each file version is
+# serialised and compressed once
+BODY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_lock = threading.Lock()
+_bodies = OrderedDict()
+_body_bytes = 0
+
+
+def file_etag(path, variant=''):
+    """Return an ETag for a file version and a representation variant (e.g. query parameters)"""
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{variant}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag, last_modified=None):
+    """Evaluate If-None-Match / If-Modified-Since against the current validators"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def not_modified_response(etag, last_modified=None):
+    response = Response(status=304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = int(last_modified)
+    # Clients may keep the body but must revalidate before using it
+    response.cache_control.no_cache = True
+
+
+def negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def _cache_get(key):
+    with _lock:
+        body = _bodies.get(key)
+        if body is not None:
+            _bodies.move_to_end(key)
+        return body
+
+
+def _cache_put(key, body):
+    global _body_bytes
+    if len(body) > BODY_CACHE_MAX_BYTES // 4:
+        return
+    with _lock:
+        if key in _bodies:
+            return
+        _bodies[key] = body
+        _body_bytes += len(body)
+        while _body_bytes > BODY_CACHE_MAX_BYTES:
+            _, evicted = _bodies.popitem(last=False)
+            _body_bytes -= len(evicted)
+
+
+def cached_json(etag, build, last_modified=None):
+    """Answer a GET with a JSON body identified by etag.
+
+    Returns 304 when the client's validators match. Otherwise the body from
+    build() is serialised and compressed according to Accept-Encoding; both
+    steps are cached per (etag, encoding), so build() only runs on a miss.
+    """
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    encoding = negotiate_encoding()
+    body = _cache_get((etag, encoding))
+    metrics.cache_result('http_body', body is not None)
+    if body is None:
+        identity = _cache_get((etag, None))
+        if identity is None:
+            identity = (current_app.json.dumps(build()) + '\n').encode('utf-8')
+            _cache_put((etag, None), identity)
+        if encoding is None or len(identity) < COMPRESS_MIN_SIZE:
+            encoding = None
+            body = identity
+        else:
+            body = _encode(identity, encoding)
+            _cache_put((etag, encoding), body)
+
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    _set_validators(response, etag, last_modified)
+    return response
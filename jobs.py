@@ -0,0 +1,353 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+import metrics
+
+# Worker threads running jobs, and how many jobs may wait for one
+JOB_WORKERS = 4
+JOB_QUEUE_DEPTH = 32
+# Seconds a job may run before it is reported as timed out, and the upper
+# bound a client may ask for. A thread cannot be interrupted, so a timed-out
+# job keeps its worker until the handler returns (see JobQueue)
+JOB_TIMEOUT = 300
+JOB_MAX_TIMEOUT = 1800
+# Finished jobs (and their results) are kept this long for polling
+JOB_RESULT_RETENTION = 60 * 60
+JOB_MAX_RETAINED = 1000
+
+# Job state is mirrored here so any worker process of a multi-process server
+# can answer a poll for a job another process runs
+JOB_STATE_FOLDER = os.path.join('cache', 'jobs')
+# How often a poll for another process's job re-reads its state
+JOB_POLL_INTERVAL = 0.25
+# The state file only holds the status; a result is written once, to its own
+# file, when the job finishes. A result larger than this keeps only its
+# top-level scalar fields (e.g. a compare's diff_id) for other processes
+JOB_MAX_SAVED_RESULT_BYTES = 1024 * 1024
+
+FINISHED_STATES = ('succeeded', 'failed', 'timed_out')
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFull(Exception):
+    """Raised when the job queue already holds JOB_QUEUE_DEPTH waiting jobs"""
+
+
+class UnknownJobKind(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, params, timeout):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.timeout = timeout
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        # Set while a worker runs the handler, even after the job timed out
+        self.in_worker = False
+
+    def _finish(self, status, result=None, error=None):
+        # The worker and a poller noticing the timeout may race; the first one wins
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            if status == 'succeeded':
+                # Before the state, so a poller seeing 'succeeded' finds the result
+                self._save_result()
+            self._save()
+            self._done.set()
+
+    def _check_timeout(self):
+        if self.status == 'running' and time.time() - self.started > self.timeout:
+            # The worker cannot be interrupted; its late result is discarded
+            self._finish('timed_out', error=f'Job exceeded its {self.timeout}s timeout')
+
+    def _write(self, path, text):
+        os.makedirs(JOB_STATE_FOLDER, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _save(self):
+        """Mirror the status of the job, without its result"""
+        state = self.to_dict()
+        del state['result']
+        try:
+            self._write(_state_path(self.id), json.dumps(state))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving job state {self.id}: {e}")
+
+    def _save_result(self):
+        """Write the result once, reduced to its scalar fields past JOB_MAX_SAVED_RESULT_BYTES"""
+        try:
+            text = json.dumps(self.result)
+            if len(text) > JOB_MAX_SAVED_RESULT_BYTES:
+                reduced = {key: value for key, value in self.result.items()
+                           if not isinstance(value, (list, dict))} if isinstance(self.result, dict) else {}
+                text = json.dumps(dict(reduced, result_truncated=True))
+            self._write(_result_path(self.id), text)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving job result {self.id}: {e}")
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'result': self.result,
+            'error': self.error,
+            'timeout': self.timeout
+        }
+
+
+def _state_path(job_id):
+    return os.path.join(JOB_STATE_FOLDER, f'{job_id}.json')
+
+
+def _result_path(job_id):
+    return os.path.join(JOB_STATE_FOLDER, f'{job_id}.result.json')
+
+
+def _load_state(job_id):
+    """Return the saved state of a job run by any process, or None"""
+    if not _JOB_ID_PATTERN.match(job_id or ''):
+        return None
+    try:
+        with open(_state_path(job_id), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    state['result'] = None
+    if state['status'] == 'succeeded':
+        try:
+            with open(_result_path(job_id), 'r', encoding='utf-8') as f:
+                state['result'] = json.load(f)
+        except (OSError, ValueError):
+            pass
+    # The owning process only marks a timeout when polled itself
+    if state['status'] == 'running' and time.time() - state['started'] > state.get('timeout', JOB_TIMEOUT):
+        state['status'] = 'timed_out'
+        state['error'] = f"Job exceeded its {state.get('timeout', JOB_TIMEOUT)}s timeout"
+    return state
+
+
+class _RemoteJob:
+    """Read-only view of a job owned by another worker process"""
+
+    def __init__(self, state):
+        self.state = state
+        self.status = state['status']
+
+    def to_dict(self):
+        return self.state
+
+
+def validate_timeout(timeout):
+    """Return the timeout for a job in seconds, capped at JOB_MAX_TIMEOUT; None gives JOB_TIMEOUT"""
+    if timeout is None:
+        return JOB_TIMEOUT
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+        raise ValueError('timeout must be a positive number of seconds')
+    return min(timeout, JOB_MAX_TIMEOUT)
+
+
+class JobQueue:
+    """Bounded pool of worker threads running registered job kinds.
+
+    Workers start on the first submit, so importing the module starts nothing.
+    A timeout only changes what is reported: the job is marked timed_out and
+    its late result discarded, but Python threads cannot be cancelled, so the
+    worker stays busy until the handler returns. Handlers that can run long
+    must bound their own work (compares do, through their time budget);
+    stats() counts the workers still held by timed-out jobs.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_QUEUE_DEPTH, retention=JOB_RESULT_RETENTION):
+        self.workers = workers
+        self.retention = retention
+        self._handlers = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+
+    def register(self, kind, handler):
+        """Register handler(params) -> JSON-serialisable result for a job kind"""
+        self._handlers[kind] = handler
+
+    def kinds(self):
+        return sorted(self._handlers)
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, params=None, timeout=None):
+        """Queue a job and return it; raises QueueFull when the queue is at its depth limit
+        and ValueError for a timeout that is not a positive number"""
+        if kind not in self._handlers:
+            raise UnknownJobKind(f'Unknown job kind: {kind}')
+        if self._closed:
+            raise QueueFull('Server is shutting down')
+        timeout = validate_timeout(timeout)
+        job = Job(kind, params or {}, timeout)
+        self._start_workers()
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull(f'Job queue is full ({self._queue.maxsize} waiting jobs)')
+        job._save()
+        return job
+
+    def get(self, job_id):
+        """Return a job of this process, or a read-only view of one saved by another process"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            state = _load_state(job_id)
+            return _RemoteJob(state) if state is not None else None
+        job._check_timeout()
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once finished or after timeout seconds"""
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while isinstance(job, _RemoteJob) and job.status not in FINISHED_STATES:
+            # Another process owns the job; its saved state is all there is to watch
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(JOB_POLL_INTERVAL, remaining))
+            job = self.get(job_id)
+        while isinstance(job, Job) and job.status not in FINISHED_STATES:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if job.status == 'running':
+                # Wake up in time to report a timeout
+                remaining = min(remaining, max(job.started + job.timeout - time.time(), 0) + 0.05)
+            job._done.wait(remaining)
+            job._check_timeout()
+        return job
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.status = 'running'
+                job.started = time.time()
+                job.in_worker = True
+                job._save()
+                try:
+                    result = self._handlers[job.kind](job.params)
+                except Exception as e:
+                    job._finish('failed', error=str(e))
+                else:
+                    job._check_timeout()
+                    job._finish('succeeded', result=result)
+            finally:
+                job.in_worker = False
+                self._queue.task_done()
+
+    def _prune(self):
+        """Drop finished jobs past their retention time, and the oldest beyond JOB_MAX_RETAINED"""
+        now = time.time()
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+            finished.sort(key=lambda job: job.finished)
+            excess = len(self._jobs) - JOB_MAX_RETAINED
+            for job in finished:
+                if now - job.finished > self.retention or excess > 0:
+                    del self._jobs[job.id]
+                    excess -= 1
+                    for path in (_state_path(job.id), _result_path(job.id)):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+
+    def shutdown(self, timeout):
+        """Stop accepting jobs and wait up to timeout seconds for queued and running ones"""
+        self._closed = True
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.1)
+        return self._queue.unfinished_tasks == 0
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job.status] = states.get(job.status, 0) + 1
+            overrunning = sum(1 for job in self._jobs.values() if job.status == 'timed_out' and job.in_worker)
+        return {'queued': self._queue.qsize(), 'workers': len(self._threads), 'workers_held_by_timed_out': overrunning,
+                'jobs': states}
+
+
+def prune_saved_states(retention=JOB_RESULT_RETENTION):
+    """Remove saved job states older than retention, e.g. those left by exited processes"""
+    removed = 0
+    now = time.time()
+    try:
+        names = os.listdir(JOB_STATE_FOLDER)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(JOB_STATE_FOLDER, name)
+        try:
+            if now - os.path.getmtime(path) > retention:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+job_queue = JobQueue()
+
+
+def _job_gauges():
+    stats = job_queue.stats()
+    samples = [('jobs_queued', {}, stats['queued']),
+               ('jobs_workers_held_by_timed_out', {}, stats['workers_held_by_timed_out'])]
+    samples.extend(('jobs', {'status': status}, count) for status, count in stats['jobs'].items())
+    return samples
+
+
+metrics.describe('jobs_queued', 'gauge', 'Jobs waiting for a worker')
+metrics.describe('jobs', 'gauge', 'Retained jobs by status')
+metrics.describe('jobs_workers_held_by_timed_out', 'gauge', 'Worker threads still running a job that already timed out')
+metrics.register_collector(_job_gauges)
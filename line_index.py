@@ -0,0 +1,93 @@
+import codecs
+import mmap
+import os
+import threading
+from array import array
+
+import metrics
+
+# Bytes decoded per step while probing a file for valid UTF-8
+DETECT_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+class LineIndex:
+    """Byte offsets of every line start of one file version, plus its detected encoding.
+
+    offsets[i] is where line i (0-based) starts and offsets[-1] is the file
+    size, so line i spans offsets[i]:offsets[i + 1].
+    """
+
+    def __init__(self, path, mtime_ns, size, offsets, encoding):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets
+        self.encoding = encoding
+
+    @property
+    def total_lines(self):
+        return len(self.offsets) - 1
+
+    def read_lines(self, from_line, line_count=None):
+        """Return the text of line_count lines starting at 0-based from_line"""
+        first = min(max(from_line, 0), self.total_lines)
+        last = self.total_lines if line_count is None else min(first + max(line_count, 0), self.total_lines)
+        start = self.offsets[first]
+        end = self.offsets[last]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        # Match the newline translation of files opened in text mode
+        text = data.decode(self.encoding)
+        return text.replace('\r\n', '\n').replace('\r', '\n'), first, last - first
+
+
+def _detect_encoding(buffer):
+    """Return 'utf-8' if the whole buffer decodes as UTF-8, otherwise 'latin-1'"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(buffer), DETECT_CHUNK_SIZE):
+            decoder.decode(buffer[start:start + DETECT_CHUNK_SIZE])
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    return 'utf-8'
+
+
+def _build(path, stat):
+    offsets = array('Q', [0])
+    encoding = 'utf-8'
+    if stat.st_size:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = buffer.find(b'\n')
+            while position != -1:
+                offsets.append(position + 1)
+                position = buffer.find(b'\n', position + 1)
+            encoding = _detect_encoding(buffer)
+    if offsets[-1] != stat.st_size:
+        # Last line without a trailing newline
+        offsets.append(stat.st_size)
+    return LineIndex(path, stat.st_mtime_ns, stat.st_size, offsets, encoding)
+
+
+def get_index(path):
+    """Return the line index of a file, rebuilding it only when the file changed"""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    with _lock:
+        index = _indexes.get(key)
+    if index is not None and index.mtime_ns == stat.st_mtime_ns and index.size == stat.st_size:
+        metrics.cache_result('line_index', True)
+        return index
+    metrics.cache_result('line_index', False)
+    index = _build(path, stat)
+    with _lock:
+        _indexes[key] = index
+    return index
+
+
+def detect_encoding(path):
+    return get_index(path).encoding
@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+
+import content_store
+import diff_store
+import guide_index
+import jobs
+import text_cache
+import uploads
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DOC_FOLDER = 'doc'
+# Seconds between maintenance passes, and between attempts to become leader
+MAINTENANCE_INTERVAL = float(os.getenv('MAINTENANCE_INTERVAL', '300'))
+# Held by the one process that runs maintenance; released when it exits,
+# so another process takes over on its next attempt
+LEADER_LOCK_FILE = os.path.join('cache', 'maintenance.lock')
+
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, shared by all processes on the host"""
+
+    def __init__(self, path=LEADER_LOCK_FILE):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        self._file.close()
+        self._file = None
+
+
+def warm_text_cache(folder=DOC_FOLDER, stop=None):
+    """Extract every PDF of folder that is not in the text cache yet"""
+    warmed = 0
+    if not os.path.isdir(folder):
+        return warmed
+    for name in sorted(os.listdir(folder)):
+        if stop is not None and stop.is_set():
+            break
+        path = os.path.join(folder, name)
+        if text_cache.is_pdf(path) and not text_cache.is_cached(path):
+            try:
+                text_cache.get_pages(path)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not warm text cache for {name}: {e}")
+    return warmed
+
+
+def run_once(stop=None):
+    """One maintenance pass: diff store limits, content store, stale jobs and uploads, text cache, guides"""
+    report = {
+        'diffs_evicted': diff_store.store.enforce_limits(),
+        'job_states_removed': jobs.prune_saved_states(),
+        'uploads_expired': uploads.prune_stale()
+    }
+    content_store.prune()
+    report['documents_warmed'] = warm_text_cache(stop=stop)
+    # After warming, so release deltas and section changes read cached text
+    report['guides_built'] = guide_index.index.build_all(stop)
+    return report
+
+
+class Maintenance:
+    """Background thread that runs maintenance only while this process is the leader"""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL, lock=None):
+        self.interval = interval
+        self.lock = lock or LeaderLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.lock.try_acquire():
+                    report = run_once(self._stop)
+                    logger.info(f"Maintenance pass in process {os.getpid()}: {report}")
+            except Exception as e:
+                logger.error(f"Maintenance pass failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout=None):
+        """Stop the thread after its current step and hand leadership on"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.lock.release()
+
+
+_maintenance = None
+
+
+def start(interval=MAINTENANCE_INTERVAL):
+    """Start this process's maintenance thread; it only does work while holding the leader lock"""
+    global _maintenance
+    if _maintenance is None:
+        _maintenance = Maintenance(interval).start()
+    return _maintenance
+
+
+def stop(timeout=None):
+    global _maintenance
+    if _maintenance is not None:
+        _maintenance.stop(timeout)
+        _maintenance = None
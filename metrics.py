@@ -0,0 +1,325 @@
+import bisect
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+LINE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000)
+
+# Per-request sampling profiler; requests opt in with ?profile=1 or an
+# X-Profile header, and only when the server runs with PROFILING_ENABLED=1
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '') in ('1', 'true', 'yes')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_MAX_DEPTH = 64
+PROFILE_RETAINED = 20
+
+_lock = threading.Lock()
+_descriptions = {}
+_counters = {}
+_histograms = {}
+_collectors = []
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def describe(name, kind, help_text, buckets=LATENCY_BUCKETS):
+    """Declare a metric; kind is 'counter', 'histogram' or 'gauge'"""
+    _descriptions[name] = {'kind': kind, 'help': help_text, 'buckets': buckets}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        key = (name, _key(labels))
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    with _lock:
+        key = (name, _key(labels))
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram(_descriptions.get(name, {}).get('buckets', LATENCY_BUCKETS))
+        histogram.observe(value)
+
+
+def cache_result(cache, hit):
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def record_pdf_extraction(path, pages, seconds):
+    document = os.path.basename(path)
+    inc('pdf_pages_extracted_total', pages, document=document)
+    inc('pdf_extraction_seconds_total', seconds, document=document)
+    observe('pdf_extraction_seconds', seconds)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the seconds spent in the block into histogram name"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def register_collector(collect):
+    """Register collect() -> [(name, labels, value)] gauges read when metrics are rendered"""
+    _collectors.append(collect)
+
+
+def _gauges():
+    samples = []
+    for collect in _collectors:
+        try:
+            samples.extend(collect())
+        except Exception:
+            # A broken collector must not take the whole endpoint down
+            continue
+    return samples
+
+
+def snapshot():
+    """Return all metrics as a JSON-serialisable dict, with cache hit rates"""
+    with _lock:
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+        histograms = [{
+            'name': name,
+            'labels': dict(labels),
+            'count': histogram.count,
+            'sum': round(histogram.sum, 6),
+            'buckets': dict(zip([str(bound) for bound in histogram.buckets] + ['+Inf'],
+                                _cumulative(histogram.counts)))
+        } for (name, labels), histogram in sorted(_histograms.items())]
+    hits = Counter()
+    lookups = Counter()
+    for counter in counters:
+        if counter['name'] == 'cache_requests_total':
+            lookups[counter['labels']['cache']] += counter['value']
+            if counter['labels']['result'] == 'hit':
+                hits[counter['labels']['cache']] += counter['value']
+    return {
+        'counters': counters,
+        'histograms': histograms,
+        'gauges': [{'name': name, 'labels': labels, 'value': value} for name, labels, value in _gauges()],
+        'cache_hit_rates': {cache: round(hits[cache] / total, 4) for cache, total in lookups.items()}
+    }
+
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Return all metrics in the Prometheus text exposition format"""
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name in seen:
+            return
+        seen.add(name)
+        description = _descriptions.get(name)
+        if description:
+            lines.append(f"# HELP {name} {description['help']}")
+        lines.append(f'# TYPE {name} {kind}')
+
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_labels_text(labels)} {_number(value)}')
+        for (name, labels), histogram in sorted(_histograms.items()):
+            header(name, 'histogram')
+            for bound, count in zip(histogram.buckets + (math.inf,), _cumulative(histogram.counts)):
+                bucket_labels = labels + (('le', _number(bound)),)
+                lines.append(f'{name}_bucket{_labels_text(bucket_labels)} {count}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {_number(histogram.sum)}')
+            lines.append(f'{name}_count{_labels_text(labels)} {histogram.count}')
+    for name, labels, value in sorted(_gauges(), key=lambda sample: sample[0]):
+        header(name, 'gauge')
+        lines.append(f'{name}{_labels_text(_key(labels))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread every interval seconds from a helper thread.
+
+    Stacks are aggregated in collapsed form ("outer;inner;leaf count"), which
+    flame graph tools read directly.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno or code.co_firstlineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def top(self, limit=20):
+        """Functions by share of samples in which they were the innermost frame"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'frame': frame, 'samples': count, 'share': round(count / self.samples, 4)}
+                for frame, count in leaves.most_common(limit)]
+
+
+_profiles = OrderedDict()
+
+
+def save_profile(route, profiler):
+    """Keep a finished profile for later retrieval and return its id"""
+    profile_id = uuid.uuid4().hex
+    with _lock:
+        _profiles[profile_id] = {
+            'profile_id': profile_id,
+            'route': route,
+            'seconds': round(profiler.seconds, 6),
+            'samples': profiler.samples,
+            'interval': profiler.interval,
+            'top': profiler.top(),
+            'collapsed': profiler.collapsed()
+        }
+        while len(_profiles) > PROFILE_RETAINED:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id):
+    with _lock:
+        return _profiles.get(profile_id)
+
+
+def init_app(app):
+    """Record per-route request latency and attach the opt-in profiler to a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.profiler = None
+        if PROFILING_ENABLED and (request.args.get('profile') or request.headers.get('X-Profile')):
+            g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop('metrics_started', None)
+        # Label by URL rule rather than path so IDs and file names don't explode the series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if started is not None:
+            observe('http_request_duration_seconds', time.perf_counter() - started,
+                    route=route, method=request.method)
+            inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile-Id'] = save_profile(route, profiler.stop())
+        return response
+
+    @app.teardown_request
+    def _teardown_request(error=None):
+        # after_request is skipped when a request raises: record it as a 500 and
+        # stop its profiler here, so the sampling thread never outlives the request
+        started = g.pop('metrics_started', None)
+        profiler = g.pop('profiler', None)
+        if started is None and profiler is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if started is not None:
+            observe('http_request_duration_seconds', time.perf_counter() - started,
+                    route=route, method=request.method)
+            inc('http_requests_total', route=route, method=request.method, status='500')
+        if profiler is not None:
+            save_profile(route, profiler.stop())
+
+
+describe('http_request_duration_seconds', 'histogram', 'Request latency per route')
+describe('http_requests_total', 'counter', 'Requests per route, method and status')
+describe('pdf_pages_extracted_total', 'counter', 'PDF pages extracted, per document')
+describe('pdf_extraction_seconds_total', 'counter', 'Seconds spent extracting PDF text, per document')
+describe('pdf_extraction_seconds', 'histogram', 'Duration of one PDF extraction')
+describe('diff_input_bytes', 'histogram', 'Combined size of both compare inputs', SIZE_BUCKETS)
+describe('diff_input_lines', 'histogram', 'Combined line count of both compare inputs', LINE_BUCKETS)
+describe('diff_compute_seconds', 'histogram', 'Time to compute a diff')
+describe('cache_requests_total', 'counter', 'Cache lookups per cache and result (hit/miss)')
+describe('oracle_connect_seconds', 'histogram', 'Time to open a new Oracle connection')
+describe('oracle_checkout_seconds', 'histogram', 'Time to check a connection out of the pool')
+describe('oracle_query_seconds', 'histogram', 'Oracle query execution and fetch time per operation')
+describe('oracle_pool_connections', 'gauge', 'Open pooled Oracle connections by state')
@@ -1,21 +1,62 @@
-import pyodbc
 import sys
 import logging
-from typing import Optional, Tuple, List
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple, List
 from dotenv import load_dotenv
 import os
 from contextlib import contextmanager
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import metrics
+
+try:
+    import pyodbc
+except ImportError:
+    # The ODBC driver manager is not installed; a stand-in connect function
+    # can still be supplied through configure_pool()
+    pyodbc = None
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Pool sizing and lifetime, overridable through the environment
+POOL_MIN_SIZE = int(os.getenv('ORACLE_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('ORACLE_POOL_MAX_SIZE', '8'))
+POOL_IDLE_TIMEOUT = float(os.getenv('ORACLE_POOL_IDLE_TIMEOUT', '300'))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv('ORACLE_POOL_CHECKOUT_TIMEOUT', '30'))
+# Connections idle for longer than this are pinged before being handed out
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('ORACLE_POOL_HEALTH_CHECK_INTERVAL', '30'))
+
+# SQL dialect per backend: the health check query and how to limit a result
+# to n rows. DB_BACKEND=sqlite runs the pool against a local stand-in.
+BACKENDS = {
+    'oracle': {'health_check_query': 'SELECT 1 FROM dual', 'row_limit': 'FETCH FIRST {rows} ROWS ONLY'},
+    'sqlite': {'health_check_query': 'SELECT 1', 'row_limit': 'LIMIT {rows}'},
+}
+DB_BACKEND = os.getenv('DB_BACKEND', 'oracle')
+
+# Source tables; a stand-in backend (e.g. SQLite) can point these elsewhere
+SRC_TABLE = 'src#1'
+SRC_HIST_TABLE = 'src_hist'
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+def backend_error_types(backend: str) -> Tuple[type, ...]:
+    """
+    Driver exceptions that mark a failed query on a backend
+    """
+    if backend == 'sqlite':
+        return (sqlite3.Error,)
+    return (pyodbc.Error,) if pyodbc is not None else (Exception,)
+
+
 def get_connection_string() -> str:
     """
     Create connection string for Oracle database
@@ -27,49 +68,373 @@ def get_connection_string() -> str:
         f"PWD={os.getenv('ORACLE_PASSWORD')}"
     )
 
+
+def odbc_connect():
+    """
+    Open a new ODBC connection to the Oracle database
+    """
+    if pyodbc is None:
+        raise RuntimeError("pyodbc is not available")
+    return pyodbc.connect(get_connection_string())
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'cursors', 'last_used', 'last_checked')
+
+    def __init__(self, connection):
+        self.connection = connection
+        # Cursors by SQL text; re-executing the same statement on its cursor
+        # lets the driver reuse the prepared statement
+        self.cursors = {}
+        self.last_used = time.monotonic()
+        self.last_checked = self.last_used
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections with min/max size, health checks
+    on checkout and idle eviction
+    """
+
+    def __init__(self,
+                 connect: Callable = odbc_connect,
+                 min_size: int = POOL_MIN_SIZE,
+                 max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 checkout_timeout: float = POOL_CHECKOUT_TIMEOUT,
+                 health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+                 health_check_query: Optional[str] = None,
+                 error_types: Tuple[type, ...] = None,
+                 backend: str = DB_BACKEND):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown database backend: {backend}")
+        self.backend = backend
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.health_check_query = health_check_query or BACKENDS[backend]['health_check_query']
+        self.error_types = error_types or backend_error_types(backend)
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def row_limit(self, rows: int) -> str:
+        """
+        Clause limiting a query to rows rows in this backend's dialect
+        """
+        return BACKENDS[self.backend]['row_limit'].format(rows=rows)
+
+    def _open(self) -> _PooledConnection:
+        with metrics.timer('oracle_connect_seconds'):
+            return _PooledConnection(self.connect())
+
+    def _discard(self, entry: _PooledConnection):
+        try:
+            entry.connection.close()
+        except Exception as error:
+            logger.warning(f"Error closing pooled connection: {error}")
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        if time.monotonic() - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            cursor = entry.connection.cursor()
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            cursor.close()
+            entry.last_checked = time.monotonic()
+            return True
+        except Exception as error:
+            logger.warning(f"Discarding unhealthy pooled connection: {error}")
+            return False
+
+    def fill(self):
+        """
+        Open connections until the pool holds at least min_size
+        """
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+
+    def acquire(self) -> _PooledConnection:
+        """
+        Check out a healthy connection, opening one if the pool is below max_size
+        """
+        with metrics.timer('oracle_checkout_seconds'):
+            return self._acquire()
+
+    def _acquire(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                entry = None
+                if self._idle:
+                    entry = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No connection available after {self.checkout_timeout}s")
+                    self._condition.wait(remaining)
+                    continue
+
+            if entry is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            if self._is_healthy(entry):
+                return entry
+            self._discard(entry)
+            with self._condition:
+                self._size -= 1
+
+    def release(self, entry: _PooledConnection, broken: bool = False):
+        """
+        Return a connection to the pool; broken connections are closed instead
+        """
+        with self._condition:
+            if broken or self._closed:
+                self._size -= 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                entry = None
+            self._condition.notify()
+        if entry is not None:
+            self._discard(entry)
+        self.evict_idle()
+
+    def evict_idle(self):
+        """
+        Close connections idle for longer than idle_timeout, keeping min_size open
+        """
+        expired = []
+        now = time.monotonic()
+        with self._condition:
+            # The least recently used connections sit at the left end
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0].last_used > self.idle_timeout):
+                expired.append(self._idle.popleft())
+                self._size -= 1
+        for entry in expired:
+            self._discard(entry)
+        return len(expired)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {'size': self._size, 'idle': len(self._idle), 'max_size': self.max_size}
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager checking a connection out of the pool
+        """
+        entry = self.acquire()
+        broken = False
+        try:
+            yield entry.connection
+        except self.error_types:
+            broken = not self._is_healthy_now(entry)
+            raise
+        finally:
+            self.release(entry, broken)
+
+    @contextmanager
+    def prepared(self, sql: str):
+        """
+        Context manager yielding a cursor for sql, reused across checkouts of the same connection
+        """
+        entry = self.acquire()
+        broken = False
+        try:
+            cursor = entry.cursors.get(sql)
+            if cursor is None:
+                cursor = entry.connection.cursor()
+                entry.cursors[sql] = cursor
+            yield cursor
+        except self.error_types:
+            entry.cursors.pop(sql, None)
+            broken = not self._is_healthy_now(entry)
+            raise
+        finally:
+            self.release(entry, broken)
+
+    def _is_healthy_now(self, entry: _PooledConnection) -> bool:
+        entry.last_checked = 0
+        return self._is_healthy(entry)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(connect: Callable = odbc_connect, **kwargs) -> ConnectionPool:
+    """
+    Replace the shared pool, e.g. to point it at a local stand-in backend
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(connect, **kwargs)
+        return _pool
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the shared connection pool, creating it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def _pool_gauges() -> list:
+    # Read the pool without creating it, so scraping metrics never connects
+    pool = _pool
+    if pool is None:
+        return []
+    stats = pool.stats()
+    return [
+        ('oracle_pool_connections', {'state': 'idle'}, stats['idle']),
+        ('oracle_pool_connections', {'state': 'in_use'}, stats['size'] - stats['idle']),
+    ]
+
+
+metrics.register_collector(_pool_gauges)
+
+
+def close_pool():
+    """
+    Close the shared pool's connections, e.g. when a worker process exits
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
 @contextmanager
 def get_connection():
     """
-    Context manager for getting a database connection
+    Context manager for getting a database connection from the shared pool
     """
-    connection = None
+    pool = get_pool()
     try:
-        connection = pyodbc.connect(get_connection_string())
-        yield connection
-    except pyodbc.Error as error:
-        logger.error(f"Error connecting to database: {error}")
+        with pool.connection() as connection:
+            yield connection
+    except pool.error_types as error:
+        logger.error(f"Database error: {error}")
         raise
-    finally:
-        if connection:
-            connection.close()
+
+
+def fetch_one(sql: str, params: tuple = ()) -> Optional[tuple]:
+    """
+    Execute a parameterized query on a pooled connection and return the first row
+    """
+    with get_pool().prepared(sql) as cursor, metrics.timer('oracle_query_seconds', operation='fetch_one'):
+        cursor.execute(sql, params)
+        # Unread rows are discarded by the next execute on this cursor; queries
+        # that could match many rows should limit themselves (see row_limit)
+        return cursor.fetchone()
+
+
+def fetch_all(sql: str, params: tuple = ()) -> List[tuple]:
+    """
+    Execute a parameterized query on a pooled connection and return all rows
+    """
+    with get_pool().prepared(sql) as cursor, metrics.timer('oracle_query_seconds', operation='fetch_all'):
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def latest_source_sql(row_limit: str) -> str:
+    return f"""
+            SELECT s.name, h.text
+            FROM {SRC_TABLE} s
+            JOIN {SRC_HIST_TABLE} h ON s.id = h.src_id
+            WHERE s.name = ?
+            ORDER BY h.seq_nr DESC
+            {row_limit}
+            """
+
+
+def fetch_latest_source(name: str) -> Optional[Tuple[str, str]]:
+    """
+    Return (name, text) of the newest source version of an object, or None
+    """
+    # Only the newest row is fetched, not every historical version
+    return fetch_one(latest_source_sql(get_pool().row_limit(1)), (name,))
+
 
 def fetch_data() -> Optional[Tuple[str, str]]:
     """
     Execute the SQL query and fetch the result
     """
+    pool = get_pool()
     try:
         with get_connection() as connection:
             cursor = connection.cursor()
-            sql_query = """
+            sql_query = f"""
             SELECT s.name, h.text
-            FROM src#1 s 
-            JOIN src_hist h ON s.id = h.src_id
+            FROM {SRC_TABLE} s
+            JOIN {SRC_HIST_TABLE} h ON s.id = h.src_id
             ORDER BY h.seq_nr DESC
-            FETCH FIRST 1 ROW ONLY
+            {pool.row_limit(1)}
             """
-            cursor.execute(sql_query)
-            result = cursor.fetchone()
+            with metrics.timer('oracle_query_seconds', operation='fetch_data'):
+                cursor.execute(sql_query)
+                result = cursor.fetchone()
             cursor.close()
             return result
-    except pyodbc.Error as error:
+    except pool.error_types as error:
         logger.error(f"Error executing query: {error}")
         return None
 
+
 def main():
     # Check if all required environment variables are set
-    required_vars = ["ORACLE_USERNAME", "ORACLE_PASSWORD", "ORACLE_HOST", 
+    required_vars = ["ORACLE_USERNAME", "ORACLE_PASSWORD", "ORACLE_HOST",
                     "ORACLE_PORT", "ORACLE_SERVICE_NAME"]
-    
+
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     if missing_vars:
         logger.error("Missing required environment variables:")
@@ -92,4 +457,9 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    # Only the command line configures logging; importers keep their own setup
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -0,0 +1,252 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from html import escape
+
+import dir_index
+import text_cache
+
+logger = logging.getLogger(__name__)
+
+# Folders covered by the index; doc/ goes through the extracted-text cache
+INDEXED_FOLDERS = ('doc', 'files')
+INDEXED_EXTENSIONS = ('.pdf', '.md', '.txt')
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+SNIPPET_RADIUS = 80
+MAX_SNIPPETS = 3
+
+# Avaloq identifiers keep their $ and # (e.g. MDB$CODE_CTACT_PROD, barr_type#is_ki)
+TOKEN_PATTERN = re.compile(r'[\w$#]+')
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+def read_source(path):
+    """Read a document as text, using the text cache for PDFs"""
+    if text_cache.is_pdf(path):
+        return text_cache.get_text(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='latin-1') as f:
+            return f.read()
+
+
+class SearchIndex:
+    """In-memory inverted index with BM25 ranking over doc/ and files/.
+
+    The index is built on first use or at worker start. Every search then
+    compares the file versions (size and mtime from the directory index)
+    with the indexed ones and re-indexes only what changed, so writes made
+    by other worker processes are picked up too. PDFs missing from the text
+    cache are never extracted on a search: one background thread extracts
+    them and indexes each once its text is cached, until then they are
+    counted as pending. add_file and remove_file apply this process's own
+    changes right away; both only touch the postings of the affected
+    document.
+    """
+
+    def __init__(self, folders=INDEXED_FOLDERS):
+        self.folders = folders
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._texts = {}
+        self._versions = {}
+        self._total_length = 0
+        # PDFs waiting for text extraction, and those whose extraction failed, by version
+        self._pending = {}
+        self._failed = {}
+        self._warming = None
+
+    @staticmethod
+    def _doc_id(folder, filename):
+        return f'{folder}/{filename}'
+
+    @staticmethod
+    def is_indexable(filename):
+        return filename.lower().endswith(INDEXED_EXTENSIONS)
+
+    def refresh(self):
+        """Index new and changed files of the indexed folders and drop removed ones"""
+        with self._lock:
+            for folder in self.folders:
+                current = {}
+                if os.path.isdir(folder):
+                    current = {entry['name']: (entry['size'], entry['modified'])
+                               for entry in dir_index.for_folder(folder).entries() if self.is_indexable(entry['name'])}
+                for doc_id in [doc_id for doc_id in self._versions
+                               if doc_id.partition('/')[0] == folder and doc_id.partition('/')[2] not in current]:
+                    self._remove(doc_id)
+                for filename, version in current.items():
+                    doc_id = self._doc_id(folder, filename)
+                    if self._versions.get(doc_id) == version:
+                        continue
+                    path = os.path.join(folder, filename)
+                    if text_cache.is_pdf(path) and not text_cache.is_cached(path):
+                        if self._failed.get(doc_id) != version:
+                            self._pending[doc_id] = version
+                        continue
+                    try:
+                        self._add(folder, filename, version)
+                    except Exception as e:
+                        logger.warning(f"Error indexing {folder}/{filename}: {e}")
+            self._built = True
+            self._pending = {doc_id: version for doc_id, version in self._pending.items()
+                             if self._versions.get(doc_id) != version}
+            if self._pending and self._warming is None:
+                self._warming = threading.Thread(target=self._warm_pending, name='search-index-warm', daemon=True)
+                self._warming.start()
+
+    def _warm_pending(self):
+        """Extract the pending PDFs into the text cache one by one, indexing each as it is done"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._warming = None
+                    return
+                doc_id, version = next(iter(self._pending.items()))
+            folder, _, filename = doc_id.partition('/')
+            try:
+                text_cache.get_pages(os.path.join(folder, filename))
+                with self._lock:
+                    self._add(folder, filename, version)
+            except Exception as e:
+                logger.warning(f"Error indexing {doc_id}: {e}")
+                with self._lock:
+                    self._failed[doc_id] = version
+            with self._lock:
+                self._pending.pop(doc_id, None)
+
+    def pending(self):
+        """Number of documents not searchable yet because their text is still being extracted"""
+        with self._lock:
+            return len(self._pending)
+
+    def _add(self, folder, filename, version=None):
+        doc_id = self._doc_id(folder, filename)
+        self._remove(doc_id)
+        path = os.path.join(folder, filename)
+        if version is None:
+            stat = os.stat(path)
+            version = (stat.st_size, stat.st_mtime)
+        text = read_source(path)
+        # The file name is indexed too, object names often only appear there
+        counts = Counter(tokenize(text))
+        counts.update(tokenize(filename))
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(counts.values())
+        self._doc_lengths[doc_id] = length
+        self._doc_terms[doc_id] = list(counts)
+        self._texts[doc_id] = text
+        self._versions[doc_id] = version
+        self._total_length += length
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+        self._texts.pop(doc_id, None)
+        self._versions.pop(doc_id, None)
+
+    def add_file(self, folder, filename):
+        """(Re)index one file; a no-op until the index has been built, deferred to refresh for an unextracted PDF"""
+        if folder not in self.folders or not self.is_indexable(filename):
+            return
+        path = os.path.join(folder, filename)
+        if text_cache.is_pdf(path) and not text_cache.is_cached(path):
+            return
+        with self._lock:
+            if self._built:
+                self._add(folder, filename)
+
+    def remove_file(self, folder, filename):
+        with self._lock:
+            self._remove(self._doc_id(folder, filename))
+            self._pending.pop(self._doc_id(folder, filename), None)
+
+    def search(self, query, limit=10, folder=None):
+        """Return the best matching documents for a query, ranked by BM25"""
+        self.refresh()
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not terms or not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            if folder:
+                scores = {doc_id: score for doc_id, score in scores.items() if doc_id.startswith(folder + '/')}
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            results = []
+            for doc_id, score in ranked:
+                doc_folder, _, filename = doc_id.partition('/')
+                results.append({
+                    'folder': doc_folder,
+                    'filename': filename,
+                    'score': round(score, 4),
+                    'snippets': make_snippets(self._texts[doc_id], terms)
+                })
+            return results
+
+
+def make_snippets(text, terms, radius=SNIPPET_RADIUS, limit=MAX_SNIPPETS):
+    """Return HTML-escaped excerpts around query term matches, with matches wrapped in <mark>"""
+    pattern = re.compile(r'(?<![\w$#])(' + '|'.join(re.escape(term) for term in terms) + r')(?![\w$#])',
+                         re.IGNORECASE)
+    snippets = []
+    last_end = -1
+    for match in pattern.finditer(text):
+        if match.start() < last_end:
+            continue
+        start = max(0, match.start() - radius)
+        end = min(len(text), match.end() + radius)
+        excerpt = text[start:end]
+        highlighted = ''
+        position = 0
+        for inner in pattern.finditer(excerpt):
+            highlighted += escape(excerpt[position:inner.start()]) + '<mark>' + escape(inner.group(0)) + '</mark>'
+            position = inner.end()
+        highlighted += escape(excerpt[position:])
+        snippets.append(('...' if start else '') + ' '.join(highlighted.split()) + ('...' if end < len(text) else ''))
+        last_end = end
+        if len(snippets) >= limit:
+            break
+    return snippets
+
+
+index = SearchIndex()
+
+
+def search(query, limit=10, folder=None):
+    started = time.perf_counter()
+    results = index.search(query, limit, folder)
+    return results, (time.perf_counter() - started) * 1000
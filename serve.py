@@ -0,0 +1,128 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    # gunicorn does not run on Windows; waitress is used there instead
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+logger = logging.getLogger(__name__)
+
+SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5000')
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str(min(os.cpu_count() or 1, 8))))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '4'))
+# Seconds a worker may spend on one request before it is restarted
+SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', '300'))
+# Seconds given to in-flight requests and running jobs on shutdown
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', '30'))
+
+
+def _prepare_folders():
+    for folder in ('files', 'doc', 'cache'):
+        os.makedirs(folder, exist_ok=True)
+
+
+def _worker_started():
+    """Per worker process: start the maintenance thread and build the search index in the background.
+
+    Maintenance only works while holding the leader lock; the search index is
+    built up front so the first search does not wait for it.
+    """
+    import maintenance
+    import search_index
+    maintenance.start()
+    threading.Thread(target=search_index.index.refresh, name='search-index-build', daemon=True).start()
+
+
+def _worker_stopping(graceful_timeout):
+    """Per worker process: let running jobs finish, hand on maintenance, stop the compare pool, close database connections"""
+    import batch_compare
+    import jobs
+    import maintenance
+    import oracle_query
+    if not jobs.job_queue.shutdown(graceful_timeout):
+        logger.warning(f"Jobs still running after {graceful_timeout}s in process {os.getpid()}")
+    maintenance.stop(graceful_timeout)
+    batch_compare.shutdown()
+    oracle_query.close_pool()
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn with the app imported once in the master (preload) and forked into the workers"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from api import app
+            return app
+
+
+def run_gunicorn(bind, workers, threads, timeout, graceful_timeout):
+    # Read when the app is preloaded, to size per-process pools (batch_compare)
+    os.environ['SERVER_WORKERS'] = str(workers)
+    GunicornServer({
+        'bind': bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'post_worker_init': lambda worker: _worker_started(),
+        'worker_exit': lambda server, worker: _worker_stopping(graceful_timeout),
+    }).run()
+
+
+def run_waitress(bind, threads, graceful_timeout):
+    """Single process fallback: waitress serves with a thread pool"""
+    os.environ['SERVER_WORKERS'] = '1'
+    from api import app
+    _worker_started()
+    try:
+        waitress.serve(app, listen=bind, threads=threads)
+    finally:
+        _worker_stopping(graceful_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the API with a production server')
+    parser.add_argument('--bind', default=SERVER_BIND, help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='Worker processes (gunicorn only)')
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help='Request threads per worker')
+    parser.add_argument('--timeout', type=int, default=SERVER_TIMEOUT, help='Seconds before a stuck worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=SERVER_GRACEFUL_TIMEOUT,
+                        help='Seconds to finish in-flight requests and jobs on shutdown')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    _prepare_folders()
+    if BaseApplication is not None:
+        run_gunicorn(args.bind, args.workers, args.threads, args.timeout, args.graceful_timeout)
+    elif waitress is not None:
+        run_waitress(args.bind, args.threads, args.graceful_timeout)
+    else:
+        print("Neither gunicorn nor waitress is installed; pip install -r requirements.txt", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+import oracle_query
+import search_index
+import symbol_index
+
+logger = logging.getLogger(__name__)
+
+FILES_FOLDER = 'files'
+SYNC_STATE_FILE = os.path.join('cache', 'source_sync.json')
+# Rows fetched per round trip; also used as the cursor array size
+FETCH_BATCH_SIZE = 500
+
+_UNSAFE_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+# Object type label in the files/ names ("swift_mt306_barr_lib [SCRIPT PACKAGE].txt"), by the
+# declaration that follows the "[Script 1.0]" header of the source
+OBJECT_TYPES = {
+    'script package': 'SCRIPT PACKAGE',
+    'code table': 'CODE TAB',
+    'report': 'REP SCREEN',
+    'task template': 'TASK TEMP'
+}
+_DECLARATION = re.compile(r'^\s*(?:(?:public|private|extendable|extension|final)\s+)*(?P<kind>'
+                          + '|'.join(re.escape(kind) for kind in OBJECT_TYPES) + r')\s', re.IGNORECASE)
+_lock = threading.Lock()
+
+
+def object_type(text):
+    """Return the object type label of a source from its declaration line, or None"""
+    for line in (text or '').splitlines():
+        if not line.strip() or line.lstrip().startswith('['):
+            continue
+        match = _DECLARATION.match(line + ' ')
+        return OBJECT_TYPES[re.sub(r'\s+', ' ', match.group('kind')).lower()] if match else None
+    return None
+
+
+def source_filename(name, text=None):
+    """Return the files/ name for an object, "<name> [<OBJECT TYPE>].txt" like the existing files.
+
+    Avaloq characters such as $ and # are kept; a source whose type is not
+    recognised is written as "<name>.txt".
+    """
+    filename = _UNSAFE_CHARS.sub('_', name).strip(' .')
+    kind = object_type(text)
+    return f'{filename} [{kind}].txt' if kind else f'{filename}.txt'
+
+
+def _state_key(name_filter):
+    return name_filter or '*'
+
+
+def load_state():
+    try:
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    os.makedirs(os.path.dirname(SYNC_STATE_FILE), exist_ok=True)
+    tmp_file = f'{SYNC_STATE_FILE}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file, SYNC_STATE_FILE)
+
+
+def changed_sources_sql(name_filter=None):
+    """Newest version of every object changed after a seq_nr, oldest change first"""
+    sql = f"""
+            SELECT s.name, h.seq_nr, h.text
+            FROM {oracle_query.SRC_TABLE} s
+            JOIN {oracle_query.SRC_HIST_TABLE} h ON s.id = h.src_id
+            WHERE h.seq_nr > ?
+              AND h.seq_nr = (SELECT MAX(h2.seq_nr) FROM {oracle_query.SRC_HIST_TABLE} h2 WHERE h2.src_id = s.id)
+            """
+    if name_filter:
+        sql += "  AND s.name LIKE ?\n"
+    return sql + "            ORDER BY h.seq_nr\n"
+
+
+def _write_source(folder, name, text):
+    filename = source_filename(name, text)
+    path = os.path.join(folder, filename)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text or '')
+    os.replace(tmp_path, path)
+    return filename
+
+
+def sync_sources(folder=FILES_FOLDER, name_filter=None, full=False, batch_size=FETCH_BATCH_SIZE):
+    """Stream object sources from src_hist into folder, one .txt file per object.
+
+    Only rows with a seq_nr above the high-water mark of the previous run (per
+    name filter) are fetched, unless full is set. Rows are pulled with
+    fetchmany so at most one batch is held in memory, and the high-water mark
+    is saved after every batch so an interrupted run resumes where it stopped.
+    name_filter is a SQL LIKE pattern on the object name.
+    """
+    with _lock:
+        state = load_state()
+        key = _state_key(name_filter)
+        high_water_mark = 0 if full else state.get(key, 0)
+        params = (high_water_mark, name_filter) if name_filter else (high_water_mark,)
+        os.makedirs(folder, exist_ok=True)
+
+        written = 0
+        batches = 0
+        started = time.perf_counter()
+        with oracle_query.get_connection() as connection:
+            cursor = connection.cursor()
+            cursor.arraysize = batch_size
+            try:
+                cursor.execute(changed_sources_sql(name_filter), params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for name, seq_nr, text in rows:
+                        filename = _write_source(folder, name, text)
+                        if folder == FILES_FOLDER:
+                            search_index.index.add_file(FILES_FOLDER, filename)
+                            symbol_index.index.update_file(filename)
+                        high_water_mark = max(high_water_mark, seq_nr)
+                        written += 1
+                    batches += 1
+                    state[key] = high_water_mark
+                    _save_state(state)
+            finally:
+                cursor.close()
+
+        seconds = time.perf_counter() - started
+        logger.info(f"Synced {written} sources in {batches} batches ({seconds:.2f}s), seq_nr now {high_water_mark}")
+        return {
+            'written': written,
+            'batches': batches,
+            'high_water_mark': high_water_mark,
+            'seconds': round(seconds, 3)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Avaloq sources from src_hist into files/')
+    parser.add_argument('--folder', default=FILES_FOLDER, help='Target folder for the source files')
+    parser.add_argument('--filter', default=None, help='SQL LIKE pattern on the object name')
+    parser.add_argument('--full', action='store_true', help='Ignore the high-water mark and export everything')
+    parser.add_argument('--batch-size', type=int, default=FETCH_BATCH_SIZE, help='Rows fetched per round trip')
+    args = parser.parse_args()
+
+    try:
+        result = sync_sources(args.folder, args.filter, args.full, args.batch_size)
+    except Exception as e:
+        logger.error(f"Source sync failed: {e}")
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
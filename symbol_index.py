@@ -0,0 +1,270 @@
+import logging
+import os
+import re
+import threading
+
+import dir_index
+import line_index
+
+logger = logging.getLogger(__name__)
+
+FILES_FOLDER = 'files'
+SOURCE_EXTENSIONS = ('.txt',)
+
+_IDENT = r'[a-z_][\w$#]*'
+_HEADER = re.compile(r'^\s*\[(?P<kind>[a-z ]+?)\s+[\d.]+\]', re.IGNORECASE)
+_PACKAGE = re.compile(r'^\s*(?:(?:public|private|extendable|final)\s+)*script\s+package\s+(?P<name>' + _IDENT + ')',
+                      re.IGNORECASE)
+_CODE_TABLE = re.compile(r'^\s*code\s+table\s+(?P<name>' + _IDENT + ')', re.IGNORECASE)
+_CODE_ROW = re.compile(r'^\s*row\s+\d+', re.IGNORECASE)
+_INTL_ID = re.compile(r'^\s*intl_id\s+"(?P<name>[^"]+)"', re.IGNORECASE)
+_ROUTINE = re.compile(r'^\s*(?:(?:public|private|protected|extendable|overridable|final)\s+)*'
+                      r'(?P<kind>function|procedure)\s+(?P<name>' + _IDENT + ')', re.IGNORECASE)
+_ROUTINE_END = re.compile(r'^\s*end\s+(?P<name>' + _IDENT + r')\s*;', re.IGNORECASE)
+_CONSTANT = re.compile(r'^\s*(?:(?:public|private)\s+)?(?P<name>' + _IDENT + r')\s+constant\b', re.IGNORECASE)
+_IMPORT = re.compile(r'^\s*import\s+(?:native\s+)?(?P<name>' + _IDENT + r')\s*;', re.IGNORECASE)
+_QUALIFIED = re.compile(r'\b(?P<qualifier>' + _IDENT + r')\.(?P<member>' + _IDENT + r')(?P<call>\s*\()?', re.IGNORECASE)
+_CALL = re.compile(r'(?<![\w$#.])(?P<name>' + _IDENT + r')\s*\(', re.IGNORECASE)
+# Code tables are referenced by name, e.g. code_asset_barr_type or MDB$CODE_CTACT_PROD
+_CODE_TABLE_NAME = re.compile(r'(?<![\w$#.])(?P<name>(?:mdb\$)?code_[\w$#]+)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"")
+
+
+def _strip(line):
+    """Remove string literals and the trailing -- comment of a source line"""
+    line = _STRING.sub("''", line)
+    comment = line.find('--')
+    return line if comment == -1 else line[:comment]
+
+
+def parse(text):
+    """Extract definitions and references from an Avaloq script package or code table.
+
+    Names are lower-cased, since Avaloq identifiers are case-insensitive.
+    Routines and constants are qualified with their package (pkg.name) and
+    code table rows with their table (table.intl_id). References are calls
+    and member accesses on imported packages, the file's own package and
+    code tables, plus unqualified calls of the package's own routines.
+    """
+    definitions = []
+    references = []
+    package = None
+    imports = set()
+    routine = None
+    table = None
+    lines = text.splitlines()
+
+    for number, raw in enumerate(lines, start=1):
+        line = _strip(raw)
+        if not line.strip():
+            continue
+
+        match = _PACKAGE.match(line)
+        if match and package is None:
+            package = match.group('name').lower()
+            definitions.append({'name': package, 'kind': 'package', 'line': number})
+            continue
+        match = _CODE_TABLE.match(line)
+        if match and table is None:
+            table = match.group('name').lower()
+            definitions.append({'name': table, 'kind': 'code_table', 'line': number})
+            continue
+        if table is not None:
+            match = _INTL_ID.match(raw)
+            if match:
+                definitions.append({'name': f"{table}.{match.group('name').lower()}", 'kind': 'code_row',
+                                    'line': number})
+            continue
+
+        match = _IMPORT.match(line)
+        if match:
+            name = match.group('name').lower()
+            imports.add(name)
+            references.append({'name': name, 'kind': 'import', 'line': number, 'routine': None})
+            continue
+
+        match = _ROUTINE.match(line)
+        if match:
+            routine = match.group('name').lower()
+            definitions.append({'name': f'{package}.{routine}' if package else routine,
+                                'kind': match.group('kind').lower(), 'line': number})
+            line = line[match.end():]
+        elif routine is None:
+            match = _CONSTANT.match(line)
+            if match:
+                name = match.group('name').lower()
+                definitions.append({'name': f'{package}.{name}' if package else name,
+                                    'kind': 'constant', 'line': number})
+                line = line[match.end():]
+        else:
+            match = _ROUTINE_END.match(line)
+            if match and match.group('name').lower() == routine:
+                routine = None
+                continue
+
+        seen = set()
+        for match in _QUALIFIED.finditer(line):
+            qualifier = match.group('qualifier').lower()
+            if qualifier in imports or qualifier == package or _CODE_TABLE_NAME.fullmatch(qualifier):
+                name = f"{qualifier}.{match.group('member').lower()}"
+                kind = 'call' if match.group('call') else 'member'
+                seen.add(qualifier)
+                if (name, kind) not in seen:
+                    seen.add((name, kind))
+                    references.append({'name': name, 'kind': kind, 'line': number, 'routine': routine})
+        for match in _CODE_TABLE_NAME.finditer(line):
+            name = match.group('name').lower()
+            if name not in seen:
+                seen.add(name)
+                references.append({'name': name, 'kind': 'code_table', 'line': number, 'routine': routine})
+        if package:
+            for match in _CALL.finditer(line):
+                name = match.group('name').lower()
+                if name not in seen:
+                    seen.add(name)
+                    references.append({'name': f'{package}.{name}', 'kind': 'call', 'line': number,
+                                       'routine': routine})
+
+    # Unqualified calls only count when they hit a routine of this package
+    local = {definition['name'] for definition in definitions if definition['kind'] in ('function', 'procedure')}
+    references = [reference for reference in references
+                  if reference['kind'] != 'call' or not package
+                  or not reference['name'].startswith(f'{package}.') or reference['name'] in local]
+    return {'package': package or table, 'imports': sorted(imports), 'definitions': definitions,
+            'references': references}
+
+
+def _matches(query, name):
+    """A query matches a full name, its member part (after the dot) or its package part"""
+    if query == name:
+        return True
+    if '.' in query:
+        return False
+    package, _, member = name.partition('.')
+    return query in (package, member) if member else False
+
+
+class SymbolIndex:
+    """Definitions and cross references of the source files in files/ (and session folders).
+
+    Each file is parsed once per version (size and mtime from the directory
+    index); queries re-parse only files that changed since the last one, and
+    update_file / remove_file keep it current as files are written.
+    """
+
+    def __init__(self, root=FILES_FOLDER):
+        self.root = root
+        self._lock = threading.RLock()
+        self._files = {}
+
+    @staticmethod
+    def is_source(filename):
+        return filename.lower().endswith(SOURCE_EXTENSIONS)
+
+    def _folder(self, session_id=''):
+        return os.path.join(self.root, session_id) if session_id else self.root
+
+    def _parse_file(self, folder, filename, version):
+        path = os.path.join(folder, filename)
+        # The encoding detected once per file version, shared with the file readers
+        with open(path, 'r', encoding=line_index.detect_encoding(path)) as f:
+            text = f.read()
+        entry = parse(text)
+        entry['version'] = version
+        self._files[(folder, filename)] = entry
+
+    def refresh(self, session_id=''):
+        """Bring one folder up to date, re-parsing only files whose size or mtime changed"""
+        folder = self._folder(session_id)
+        if not os.path.isdir(folder):
+            return
+        entries = {entry['name']: (entry['size'], entry['modified'])
+                   for entry in dir_index.for_folder(folder).entries() if self.is_source(entry['name'])}
+        with self._lock:
+            for key in [key for key in self._files if key[0] == folder and key[1] not in entries]:
+                del self._files[key]
+            for filename, version in entries.items():
+                cached = self._files.get((folder, filename))
+                if cached is None or cached['version'] != version:
+                    try:
+                        self._parse_file(folder, filename, version)
+                    except OSError as e:
+                        logger.warning(f"Error parsing {folder}/{filename}: {e}")
+
+    def update_file(self, filename, session_id=''):
+        """Re-parse one file after it was written"""
+        folder = self._folder(session_id)
+        if not self.is_source(filename):
+            return
+        path = os.path.join(folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove_file(filename, session_id)
+            return
+        with self._lock:
+            self._parse_file(folder, filename, (stat.st_size, stat.st_mtime))
+
+    def remove_file(self, filename, session_id=''):
+        with self._lock:
+            self._files.pop((self._folder(session_id), filename), None)
+
+    def _scope(self, session_id):
+        """Files visible to a query: files/ plus the session's own folder"""
+        self.refresh()
+        folders = {self.root}
+        if session_id:
+            self.refresh(session_id)
+            folders.add(self._folder(session_id))
+        with self._lock:
+            return [(folder, filename, entry) for (folder, filename), entry in self._files.items()
+                    if folder in folders]
+
+    @staticmethod
+    def _location(folder, filename, root):
+        session = os.path.relpath(folder, root)
+        return {'filename': filename, 'session_id': '' if session == '.' else session}
+
+    def definitions(self, name, session_id='', kind=None):
+        """Where is name defined; name may be qualified (pkg.routine) or bare"""
+        query = name.lower()
+        results = []
+        for folder, filename, entry in self._scope(session_id):
+            for definition in entry['definitions']:
+                if (kind is None or definition['kind'] == kind) and (
+                        definition['name'] == query or definition['name'].rpartition('.')[2] == query):
+                    results.append(dict(self._location(folder, filename, self.root), **definition))
+        return sorted(results, key=lambda item: (item['name'], item['filename'], item['line']))
+
+    def usages(self, name, session_id='', limit=None):
+        """Where is name used; a package name also matches calls into the package"""
+        query = name.lower()
+        results = []
+        for folder, filename, entry in self._scope(session_id):
+            for reference in entry['references']:
+                if _matches(query, reference['name']):
+                    results.append(dict(self._location(folder, filename, self.root), **reference))
+        results.sort(key=lambda item: (item['filename'], item['line']))
+        return results[:limit] if limit else results
+
+    def outline(self, filename, session_id=''):
+        """Package, imports and definitions of one file, or None"""
+        folder = self._folder(session_id)
+        self.refresh(session_id)
+        with self._lock:
+            entry = self._files.get((folder, filename))
+        if entry is None:
+            return None
+        return {'filename': filename, 'package': entry['package'], 'imports': entry['imports'],
+                'definitions': entry['definitions']}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'definitions': sum(len(entry['definitions']) for entry in self._files.values()),
+                'references': sum(len(entry['references']) for entry in self._files.values())
+            }
+
+
+index = SymbolIndex()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root and use paths relative to the working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """An empty files/, doc/ and cache/ tree as the working directory"""
+    for folder in ('files', 'doc', 'cache'):
+        (tmp_path / folder).mkdir()
+    monkeypatch.chdir(tmp_path)
+    import dir_index
+    import http_cache
+    monkeypatch.setattr(dir_index, '_indexes', {})
+    monkeypatch.setattr(http_cache, '_bodies', http_cache.OrderedDict())
+    monkeypatch.setattr(http_cache, '_body_bytes', 0)
+    return tmp_path
@@ -0,0 +1,68 @@
+import pytest
+
+import chunk_store
+from api import app
+
+GUIDE = '''# Liquidity Planning
+Front page text
+## Version History
+5.5 liquidity planning rewritten
+## Contents
+1 Introduction
+# 1 Introduction
+# 1.1 Cash sweeps
+Sweeps move surplus cash between accounts every night.
+# 2 Limits
+Intraday limits cap the overdraft of each account.
+'''
+
+
+def _write(workspace, name, text):
+    (workspace / 'doc' / name).write_text(text)
+
+
+def test_front_matter_left_out_and_headings_joined(workspace):
+    _write(workspace, '7001-5.5-en-CUG-Liquidity_Planning.md', GUIDE)
+    chunks = chunk_store.chunk_document('doc/7001-5.5-en-CUG-Liquidity_Planning.md')
+    assert [chunk['section'] for chunk in chunks] == ['1.1 Cash sweeps', '2 Limits']
+    assert chunks[0]['content'].startswith('# 1 Introduction\n# 1.1 Cash sweeps')
+
+
+def test_section_returned_once_across_releases(workspace):
+    _write(workspace, '7001-5.4-en-CUG-Liquidity_Planning.md', GUIDE)
+    _write(workspace, '7001-5.5-en-CUG-Liquidity_Planning.md', GUIDE.replace('# 2 Limits', '# 2 Credit limits'))
+    results = chunk_store.ChunkStore().top_chunks('surplus cash sweeps', k=5)
+    assert [(chunk['filename'], chunk['section']) for chunk in results] == [
+        ('7001-5.5-en-CUG-Liquidity_Planning.md', '1.1 Cash sweeps')]
+
+
+def test_query_ranks_against_its_own_vocabulary(workspace):
+    _write(workspace, '7001-5.5-en-CUG-Liquidity_Planning.md', GUIDE)
+    store = chunk_store.ChunkStore()
+    matrix = store._current_matrix()
+    _write(workspace, '7002-5.5-en-CUG-Collateral.md', '# 1 Haircuts\nHaircuts reduce collateral value.\n')
+    store.update_file('7002-5.5-en-CUG-Collateral.md')
+    assert 'haircuts' not in matrix['vocabulary']
+    assert store.top_chunks('haircuts collateral')[0]['filename'] == '7002-5.5-en-CUG-Collateral.md'
+
+    (workspace / 'doc' / '7002-5.5-en-CUG-Collateral.md').unlink()
+    store.remove_file('7002-5.5-en-CUG-Collateral.md')
+    assert store.top_chunks('haircuts') == []
+    assert 'haircuts' not in store._vocabulary
+
+
+def test_endpoint_uses_a_file_as_the_query(workspace):
+    _write(workspace, '7001-5.5-en-CUG-Liquidity_Planning.md', GUIDE)
+    (workspace / 'files' / 'pkg_limits.txt').write_text('check intraday limits of each account\n')
+    response = app.test_client().get('/files/chunks?filename=pkg_limits.txt&k=1')
+    assert response.status_code == 200
+    assert [chunk['section'] for chunk in response.get_json()['chunks']] == ['2 Limits']
+
+
+@pytest.mark.parametrize('query, status', [
+    ('', 400), ('q=%20', 400), ('q=cash&k=five', 400), ('filename=../api.py', 400),
+    ('filename=a.txt&session_id=..', 400), ('filename=missing.txt', 404)])
+def test_endpoint_rejects_bad_queries(workspace, query, status):
+    response = app.test_client().get(f'/files/chunks?{query}')
+    assert response.status_code == status
+    assert response.get_json()['chunks'] == []
@@ -0,0 +1,67 @@
+import threading
+
+import dir_index
+import search_index
+import text_cache
+from api import app
+
+
+def test_in_place_change_reaches_another_process_index(workspace):
+    path = workspace / 'files' / 'a.txt'
+    path.write_text('one')
+    here = dir_index.DirectoryIndex('files')
+    other = dir_index.DirectoryIndex('files')  # as seen by another worker
+    assert [entry['size'] for entry in other.entries()] == [3]
+
+    path.write_text('three')
+    here.note_changed('a.txt')
+    assert [entry['size'] for entry in here.entries()] == [5]
+    assert [entry['size'] for entry in other.entries()] == [5]
+
+
+def test_file_writer_replaces_atomically(workspace):
+    client = app.test_client()
+    other = dir_index.DirectoryIndex('files/s1')
+    for content in ('first version', 'second'):
+        response = client.post('/files/write', json={'file_content': content, 'file_name': 'pkg.txt',
+                                                     'session_id': 's1'})
+        assert response.get_json()['status'] == 'Success'
+        assert [entry['size'] for entry in other.entries()] == [len(content)]
+    assert sorted(p.name for p in (workspace / 'files' / 's1').iterdir()) == ['pkg.txt']
+
+
+def test_search_index_sees_changes_made_elsewhere(workspace):
+    path = workspace / 'files' / 'pkg.txt'
+    path.write_text('alpha beta')
+    index = search_index.SearchIndex(folders=('files',))
+    assert [result['filename'] for result in index.search('alpha')] == ['pkg.txt']
+
+    # Another worker rewrites the file and removes nothing else
+    path.write_text('gamma delta epsilon')
+    dir_index.DirectoryIndex('files').note_changed('pkg.txt')
+    assert index.search('alpha') == []
+    assert [result['filename'] for result in index.search('gamma')] == ['pkg.txt']
+
+    path.unlink()
+    assert index.search('gamma') == []
+
+
+def test_search_leaves_pdf_extraction_to_the_background(workspace, monkeypatch):
+    (workspace / 'doc' / 'guide.pdf').write_bytes(b'%PDF-1.4')
+    extracted = threading.Event()
+
+    def get_pages(path):
+        assert threading.current_thread().name == 'search-index-warm'
+        extracted.wait(5)
+        return ['swaption pricing']
+
+    monkeypatch.setattr(text_cache, 'get_pages', get_pages)
+    index = search_index.SearchIndex(folders=('doc',))
+    assert index.search('swaption') == []
+    assert index.pending() == 1
+
+    warming = index._warming
+    extracted.set()
+    warming.join(5)
+    assert index.pending() == 0
+    assert [result['filename'] for result in index.search('swaption')] == ['guide.pdf']
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import diff_engine
+from api import app
+
+
+def _apply(a, b, opcodes):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+            result.extend(a[i1:i2])
+        else:
+            result.extend(b[j1:j2])
+    return result
+
+
+def test_opcodes_rebuild_the_modified_side():
+    rng = random.Random(5)
+    for _ in range(500):
+        a = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+        b = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+        opcodes, coarse = diff_engine.diff_opcodes(a, b)
+        assert _apply(a, b, opcodes) == b and not coarse
+
+
+def test_myers_gives_up_past_max_edits():
+    a, b = list('abababab'), list('babababa')
+    deadline = diff_engine.time.perf_counter() + 10
+    assert diff_engine._myers(a, b, 0, len(a), 0, len(b), deadline, max_edits=8)
+    with pytest.raises(diff_engine._BudgetExceeded):
+        diff_engine._myers(list('aaaa'), list('bbbb'), 0, 4, 0, 4, deadline, max_edits=7)
+
+
+@pytest.mark.parametrize('time_budget', [0, -1, '2', True, float('nan')])
+def test_time_budget_must_be_positive(time_budget):
+    with pytest.raises(ValueError):
+        diff_engine.clamp_time_budget(time_budget)
+
+
+def test_time_budget_clamped():
+    assert diff_engine.clamp_time_budget(None) == diff_engine.DEFAULT_TIME_BUDGET
+    assert diff_engine.clamp_time_budget(1e9) == diff_engine.MAX_TIME_BUDGET
+    assert diff_engine.clamp_time_budget(0.5) == 0.5
+
+
+@pytest.mark.parametrize('time_budget', [0, 'fast'])
+def test_compare_rejects_invalid_time_budget(workspace, time_budget):
+    response = app.test_client().post('/files/compare', json={
+        'file1_content': 'a\n', 'file2_content': 'b\n', 'file1_name': 'a.txt', 'time_budget': time_budget})
+    assert response.status_code == 400
+
+
+def test_compare_clamps_negative_context(workspace):
+    response = app.test_client().post('/files/compare', json={
+        'file1_content': 'a\nb\nc\n', 'file2_content': 'a\nx\nc\n', 'file1_name': 'a.txt',
+        'response_mode': 'hunks', 'context': -2})
+    assert response.status_code == 200
+    hunks = response.get_json()['hunks']
+    assert [(hunk['original_start'], hunk['original_count']) for hunk in hunks] == [(2, 1)]
+    assert [line['content'] for line in hunks[0]['original_lines']] == ['b\n']
+
+
+def test_compare_unknown_content_hash_answers_404(workspace):
+    response = app.test_client().post('/files/compare', json={
+        'file1_ref': {'hash': '0' * 64}, 'file2_content': 'b\n', 'file1_name': 'a.txt'})
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'Error: Unknown content hash for file1'
+
+
+def test_compare_rejects_unknown_response_mode(workspace):
+    response = app.test_client().post('/files/compare', json={
+        'file1_content': 'a\n', 'file2_content': 'b\n', 'file1_name': 'a.txt', 'response_mode': 'diffstat'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('ref', [{'filename': '../secret.txt'}, {'filename': 'a.txt', 'session_id': '..'},
+                                 {'filename': 'a.txt', 'session_id': 's1/../..'}])
+def test_compare_refs_cannot_leave_the_files_folder(workspace, ref):
+    (workspace / 'secret.txt').write_text('secret\n')
+    (workspace / 'files' / 'a.txt').write_text('a\n')
+    response = app.test_client().post('/files/compare', json={
+        'file1_ref': ref, 'file2_content': 'b\n', 'file1_name': 'a.txt'})
+    assert response.status_code == 400
+
+
+def test_coarse_diff_skips_inline_highlights():
+    a, b = ['alpha 1\n', 'beta\n'], ['alpha 2\n', 'gamma\n']
+    opcodes = [('replace', 0, 2, 0, 2)]
+    assert diff_engine.compact(a, b, opcodes, inline_highlights=True)['highlights']['original']
+    assert diff_engine.compact(a, b, opcodes, inline_highlights=True, coarse=True)['highlights'] == {
+        'original': {}, 'modified': {}}
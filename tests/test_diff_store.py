@@ -0,0 +1,54 @@
+import pytest
+
+import diff_store
+from api import app
+
+
+@pytest.fixture
+def client(workspace, monkeypatch):
+    # Room for a single diff, so the next compare evicts the previous one
+    monkeypatch.setattr(diff_store, 'store', diff_store.DiffStore(max_entries=1))
+    return app.test_client()
+
+
+def _compare(client, old, new):
+    response = client.post('/files/compare', json={'file1_content': old, 'file2_content': new,
+                                                   'file1_name': 'a.txt', 'response_mode': 'hunks'})
+    assert response.status_code == 200
+    return response.get_json()['diff_id']
+
+
+def test_evicted_diff_answers_404(client):
+    evicted = _compare(client, 'a\nb\n', 'a\nc\n')
+    current = _compare(client, 'x\ny\n', 'x\nz\n')
+    assert client.get(f'/files/diff/{current}/hunks').status_code == 200
+    for path in (f'/files/diff/{evicted}/hunks', f'/files/diff/{evicted}/lines', '/files/diff/unknown/hunks'):
+        response = client.get(path)
+        assert response.status_code == 404
+        assert response.get_json()['status'] == 'Error: Diff not found'
+
+
+def test_non_integer_parameters_answer_400(client):
+    diff_id = _compare(client, 'a\nb\n', 'a\nc\n')
+    assert client.get(f'/files/diff/{diff_id}/hunks?offset=abc').status_code == 400
+    assert client.get(f'/files/diff/{diff_id}/lines?original_start=abc').status_code == 400
+
+
+def test_session_compare_stores_evicted_diffs_again(client, workspace):
+    (workspace / 'files' / 'pkg.txt').write_text('a\nb\n')
+    (workspace / 'files' / 's1').mkdir()
+    (workspace / 'files' / 's1' / 'pkg.txt').write_text('a\nc\n')
+    first = client.post('/files/compare/session', json={'session_id': 's1'}).get_json()['files'][0]
+    _compare(client, 'x\ny\n', 'x\nz\n')
+    assert client.get(first['hunks_url']).status_code == 404
+
+    again = client.post('/files/compare/session', json={'session_id': 's1'}).get_json()['files'][0]
+    assert again['diff_id'] == first['diff_id']
+    assert client.get(again['hunks_url']).status_code == 200
+
+
+@pytest.mark.parametrize('session_id, status', [('', 400), ('../files', 400), ('..', 400), ('missing', 404)])
+def test_session_compare_rejects_bad_sessions(client, session_id, status):
+    response = client.post('/files/compare/session', json={'session_id': session_id})
+    assert response.status_code == status
+    assert response.get_json()['files'] == []
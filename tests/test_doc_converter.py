@@ -0,0 +1,17 @@
+import pytest
+
+from api import app
+
+
+def test_convert_reports_markdown_documents(workspace):
+    (workspace / 'doc' / 'guide.md').write_text('# Guide\n')
+    response = app.test_client().post('/admin/convert', json={'workers': 1, 'force': True})
+    assert response.status_code == 200
+    assert [(report['filename'], report['status']) for report in response.get_json()['files']] == [
+        ('guide.md', 'converted')]
+
+
+@pytest.mark.parametrize('workers', [0, -2, 'four', True, 1.5])
+def test_convert_rejects_invalid_workers(workspace, workers):
+    response = app.test_client().post('/admin/convert', json={'workers': workers})
+    assert response.status_code == 400
@@ -0,0 +1,39 @@
+import pytest
+
+from api import app
+
+
+@pytest.fixture
+def client(workspace):
+    (workspace / 'files' / 'a.txt').write_text('alpha')
+    (workspace / 'files' / 'b.txt').write_text('beta')
+    return app.test_client()
+
+
+def _check_bodies(files_list, api_files):
+    assert files_list.status_code == 200 and api_files.status_code == 200
+    assert sorted(files_list.get_json()['files']) == ['a.txt', 'b.txt']
+    entries = api_files.get_json()
+    assert isinstance(entries, list)
+    assert sorted(entry['name'] for entry in entries) == ['a.txt', 'b.txt']
+    assert all({'name', 'size', 'modified'} <= set(entry) for entry in entries)
+    assert files_list.headers['ETag'] != api_files.headers['ETag']
+
+
+def test_file_list_first(client):
+    files_list = client.get('/files/list')
+    api_files = client.get('/api/files')
+    _check_bodies(files_list, api_files)
+
+
+def test_api_files_first(client):
+    api_files = client.get('/api/files')
+    files_list = client.get('/files/list')
+    _check_bodies(files_list, api_files)
+
+
+def test_etag_of_one_listing_does_not_validate_the_other(client):
+    etag = client.get('/files/list').headers['ETag']
+    response = client.get('/api/files', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert isinstance(response.get_json(), list)
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+import guide_index
+from api import app
+
+RELEASES = {
+    '5.7': '# Liquidity Planning\n# 1 Introduction\nCash sweeps run nightly.\n# 2 Limits\nLimits cap overdrafts.\n',
+    '5.8': '# Liquidity Planning\n# 1 Introduction\nCash sweeps run hourly.\n\n# 2 Limits\nLimits cap overdrafts.\n'
+           '# 3 Reports\nA daily report lists sweeps.\n',
+    '5.9': '# Liquidity Planning\n# 2 Limits\nIntraday limits cap overdrafts.\n# 3 Reports\nA daily report lists sweeps.\n',
+}
+
+
+@pytest.fixture
+def guides(workspace):
+    for release, text in RELEASES.items():
+        (workspace / 'doc' / f'7001-{release}-en-CUG-Liquidity_Planning.md').write_text(text)
+    return guide_index.GuideIndex()
+
+
+def test_delta_roundtrip():
+    rng = random.Random(3)
+    for _ in range(200):
+        a = [rng.choice('abcd') for _ in range(rng.randint(0, 20))]
+        b = [rng.choice('abcd') for _ in range(rng.randint(0, 20))]
+        assert guide_index.apply_delta(a, guide_index.make_delta(a, b)) == b
+
+
+def test_releases_rebuilt_from_the_delta_chain(guides, workspace):
+    entry = guides.get('7001')
+    for release in RELEASES:
+        path = workspace / 'doc' / f'7001-{release}-en-CUG-Liquidity_Planning.md'
+        assert guides.release_lines(entry, release) == guide_index.document_lines(str(path))
+    reloaded = guide_index.GuideIndex().get('7001')
+    assert reloaded['version'] == entry['version']
+    assert guides.release_lines(reloaded, '5.9') == guides.release_lines(entry, '5.9')
+
+
+def test_text_endpoint(guides):
+    response = app.test_client().get('/files/guides/7001/text?release=5.8')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['content'].splitlines()[2] == 'Cash sweeps run hourly.'
+    assert [section['title'] for section in body['sections']] == [
+        'Liquidity Planning', 'Introduction', 'Limits', 'Reports']
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/files/guides/7001/text', 400), ('/files/guides/9999/text?release=5.8', 404),
+    ('/files/guides/7001/text?release=6.0', 404), ('/files/guides/7001/changes?from=5.7', 400),
+    ('/files/guides/9999/changes?from=5.7&to=5.9', 404), ('/files/guides/7001/changes?from=5.7&to=6.0', 404),
+    ('/files/guides/7001/changes?from=5.7&to=5.7', 400)])
+def test_endpoints_reject_unknown_guides_and_releases(guides, url, status):
+    assert app.test_client().get(url).status_code == status
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from api import app
+
+
+@pytest.mark.parametrize('timeout', ['60', -5, 0, True, float('nan')])
+def test_submit_rejects_invalid_timeout(workspace, timeout):
+    response = app.test_client().post('/jobs/', json={'kind': 'convert_all', 'timeout': timeout})
+    assert response.status_code == 400
+
+
+def test_timeout_capped_and_defaulted():
+    assert jobs.validate_timeout(None) == jobs.JOB_TIMEOUT
+    assert jobs.validate_timeout(10 ** 6) == jobs.JOB_MAX_TIMEOUT
+    assert jobs.validate_timeout(0.5) == 0.5
+
+
+def test_timed_out_job_holds_its_worker_until_it_returns(workspace):
+    queue = jobs.JobQueue(workers=1)
+    release = threading.Event()
+    queue.register('slow', lambda params: release.wait(5))
+    job = queue.submit('slow', timeout=0.05)
+    while job.started is None:
+        time.sleep(0.01)
+    assert queue.wait(job.id, 5).status == 'timed_out'
+    assert queue.stats()['workers_held_by_timed_out'] == 1
+
+    release.set()
+    queue.shutdown(5)
+    assert queue.stats()['workers_held_by_timed_out'] == 0
+    assert job.status == 'timed_out'
+
+
+def test_full_queue_answers_429(workspace, monkeypatch):
+    queue = jobs.JobQueue(workers=1, max_queue=1)
+    release = threading.Event()
+    queue.register('slow', lambda params: release.wait(5))
+    monkeypatch.setattr(jobs, 'job_queue', queue)
+    client = app.test_client()
+    try:
+        running = client.post('/jobs/', json={'kind': 'slow'}).get_json()['job_id']
+        while queue.get(running).status != 'running':
+            time.sleep(0.01)
+        assert client.post('/jobs/', json={'kind': 'slow'}).status_code == 202
+        full = client.post('/jobs/', json={'kind': 'slow'})
+    finally:
+        release.set()
+        queue.shutdown(5)
+    assert full.status_code == 429
+    assert full.get_json()['status'].startswith('Error: Job queue is full')
+
+
+def test_unknown_job_answers_404(workspace):
+    response = app.test_client().get('/jobs/' + '0' * 32)
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'Error: Job not found'
+
+
+def test_state_file_holds_status_and_result_written_once(workspace, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_SAVED_RESULT_BYTES', 100)
+    queue = jobs.JobQueue(workers=1)
+    queue.register('compare', lambda params: {'diff_id': 'a' * 32, 'lines': ['x'] * params['lines']})
+    small = queue.submit('compare', {'lines': 2})
+    large = queue.submit('compare', {'lines': 100})
+    queue.shutdown(5)
+
+    other_process = jobs.JobQueue()
+    for job in (small, large):
+        with open(jobs._state_path(job.id), 'r', encoding='utf-8') as f:
+            assert 'result' not in f.read()
+        assert other_process.get(job.id).to_dict()['status'] == 'succeeded'
+    assert other_process.get(small.id).to_dict()['result'] == small.result
+    assert other_process.get(large.id).to_dict()['result'] == {'diff_id': 'a' * 32, 'result_truncated': True}
@@ -0,0 +1,51 @@
+import pytest
+
+import line_index
+from api import app
+
+
+def test_window_clamped_to_the_file(workspace):
+    path = workspace / 'files' / 'a.txt'
+    path.write_text('one\ntwo\nthree\n')
+    index = line_index.get_index(str(path))
+    assert index.total_lines == 3
+    assert index.read_lines(1, 1) == ('two\n', 1, 1)
+    assert index.read_lines(2, 10) == ('three\n', 2, 1)
+    assert index.read_lines(5, 2) == ('', 3, 0)
+    assert index.read_lines(0, 0) == ('', 0, 0)
+
+
+def test_last_line_without_newline(workspace):
+    path = workspace / 'files' / 'a.txt'
+    path.write_bytes(b'one\r\ntwo')
+    index = line_index.get_index(str(path))
+    assert index.total_lines == 2
+    assert index.read_lines(1) == ('two', 1, 1)
+    assert index.read_lines(0) == ('one\ntwo', 0, 2)
+
+
+def test_non_utf8_file_read_as_latin1(workspace):
+    path = workspace / 'files' / 'a.txt'
+    path.write_bytes('caf\xe9\nna\xefve\n'.encode('latin-1'))
+    index = line_index.get_index(str(path))
+    assert index.encoding == 'latin-1'
+    assert index.read_lines(1, 1) == ('na\xefve\n', 1, 1)
+
+
+def test_read_endpoint_returns_the_window(workspace):
+    (workspace / 'files' / 'a.txt').write_text('one\ntwo\nthree\n')
+    response = app.test_client().get('/files/read?filename=a.txt&from_line=2&line_count=1')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['content'], body['from_line'], body['line_count'], body['total_lines']) == ('two\n', 2, 1, 3)
+
+
+@pytest.mark.parametrize('window', ['from_line=0', 'line_count=-1', 'from_line=two'])
+def test_read_endpoint_rejects_invalid_windows(workspace, window):
+    (workspace / 'files' / 'a.txt').write_text('one\n')
+    response = app.test_client().get(f'/files/read?filename=a.txt&{window}')
+    assert response.status_code == 400
+
+
+def test_read_endpoint_answers_404_for_missing_files(workspace):
+    assert app.test_client().get('/files/read?filename=missing.txt').status_code == 404
@@ -0,0 +1,29 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import metrics
+from api import app as api_app
+
+
+def test_profiler_stopped_when_request_raises(monkeypatch):
+    monkeypatch.setattr(metrics, 'PROFILING_ENABLED', True)
+    app = Flask(__name__)
+    app.testing = True
+    metrics.init_app(app)
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/boom?profile=1')
+    assert not [thread for thread in threading.enumerate() if thread.name == 'sampling-profiler']
+    assert 'http_requests_total{method="GET",route="/boom",status="500"}' in metrics.render_prometheus()
+
+
+def test_unknown_profile_answers_404():
+    response = api_app.test_client().get('/metrics/profiles/missing')
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'Error: Profile not found'
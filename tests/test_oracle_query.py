@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+
+import pytest
+
+import oracle_query
+from api import app
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path, monkeypatch):
+    """The shared pool pointed at a SQLite stand-in for src#1 / src_hist"""
+    database = str(tmp_path / 'sources.db')
+    with sqlite3.connect(database) as connection:
+        connection.executescript("""
+            CREATE TABLE src (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE src_hist (src_id INTEGER, seq_nr INTEGER, text TEXT);
+            INSERT INTO src VALUES (1, 'pkg_a'), (2, 'pkg_b');
+            INSERT INTO src_hist VALUES (1, 1, 'a v1'), (1, 3, 'a v3'), (1, 2, 'a v2'), (2, 1, 'b v1');
+        """)
+    monkeypatch.setattr(oracle_query, 'SRC_TABLE', 'src')
+    monkeypatch.setattr(oracle_query, 'SRC_HIST_TABLE', 'src_hist')
+    opened = []
+
+    def connect():
+        connection = sqlite3.connect(database, check_same_thread=False)
+        opened.append(connection)
+        return connection
+
+    pool = oracle_query.configure_pool(connect, backend='sqlite', min_size=0, max_size=2,
+                                       health_check_interval=0, checkout_timeout=1)
+    pool.opened = opened
+    yield pool
+    oracle_query.close_pool()
+
+
+def test_latest_source_returns_newest_version(sqlite_pool):
+    assert oracle_query.fetch_latest_source('pkg_a') == ('pkg_a', 'a v3')
+    assert oracle_query.fetch_latest_source('pkg_b') == ('pkg_b', 'b v1')
+    assert oracle_query.fetch_latest_source('missing') is None
+
+
+def test_latest_source_sql_is_limited_to_one_row(sqlite_pool):
+    assert 'LIMIT 1' in oracle_query.latest_source_sql(sqlite_pool.row_limit(1))
+    assert 'FETCH FIRST 1 ROWS ONLY' in oracle_query.latest_source_sql(
+        oracle_query.ConnectionPool(lambda: None, backend='oracle').row_limit(1))
+
+
+def test_connections_are_reused_and_health_checked(sqlite_pool):
+    for _ in range(5):
+        oracle_query.fetch_latest_source('pkg_a')
+    # Every checkout after the first ran the SQLite health check on the same connection
+    assert len(sqlite_pool.opened) == 1
+    assert sqlite_pool.stats() == {'size': 1, 'idle': 1, 'max_size': 2}
+
+
+def test_query_error_keeps_healthy_connection(sqlite_pool):
+    with pytest.raises(sqlite3.Error):
+        oracle_query.fetch_one('SELECT * FROM no_such_table')
+    assert sqlite_pool.stats()['size'] == 1
+    assert oracle_query.fetch_one('SELECT 1') == (1,)
+
+
+def test_pool_is_bounded_across_threads(sqlite_pool):
+    results = []
+
+    def lookup():
+        results.append(oracle_query.fetch_latest_source('pkg_b'))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [('pkg_b', 'b v1')] * 8
+    assert sqlite_pool.stats()['size'] <= 2
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        oracle_query.ConnectionPool(lambda: None, backend='db2')
+
+
+def test_source_endpoint(sqlite_pool):
+    client = app.test_client()
+    response = client.get('/files/source/pkg_a')
+    assert response.status_code == 200 and response.get_json()['content'] == 'a v3'
+    assert client.get('/files/source/missing').status_code == 404
+
+
+def test_source_endpoint_answers_503_without_database(monkeypatch):
+    def unavailable(name):
+        raise RuntimeError('pool closed')
+    monkeypatch.setattr(oracle_query, 'fetch_latest_source', unavailable)
+    response = app.test_client().get('/files/source/pkg_a')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'Error: pool closed'
@@ -0,0 +1,17 @@
+import pytest
+
+from api import app
+
+
+def test_search_finds_text_files(workspace):
+    (workspace / 'files' / 'a.txt').write_text('intraday liquidity limits\n')
+    response = app.test_client().get('/files/search?q=liquidity')
+    assert response.status_code == 200
+    assert [result['filename'] for result in response.get_json()['results']] == ['a.txt']
+
+
+@pytest.mark.parametrize('query', ['', 'q=%20', 'q=cash&folder=cache', 'q=cash&limit=ten'])
+def test_search_rejects_bad_parameters(workspace, query):
+    response = app.test_client().get(f'/files/search?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['results'] == []
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import source_sync
+from api import app
+from conftest import ROOT
+
+FILES = os.path.join(ROOT, 'files')
+TYPED_FILES = sorted(name for name in os.listdir(FILES) if name.endswith('].txt'))
+
+
+@pytest.mark.parametrize('filename', TYPED_FILES)
+def test_source_filename_matches_existing_files(filename):
+    with open(os.path.join(FILES, filename), 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    assert source_sync.source_filename(filename.rsplit(' [', 1)[0], text) == filename
+
+
+def test_unknown_object_type_keeps_plain_name():
+    assert source_sync.source_filename('a/b', '[Unknown 1.0]\n\nwidget a/b\n') == 'a_b.txt'
+
+
+@pytest.mark.parametrize('name_filter', [5, ['PKG_%']])
+def test_sync_endpoint_rejects_non_string_filter(name_filter):
+    response = app.test_client().post('/admin/sync-sources', json={'filter': name_filter})
+    assert response.status_code == 400
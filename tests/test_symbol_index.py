@@ -0,0 +1,69 @@
+import pytest
+
+import symbol_index
+from api import app
+
+PACKAGE = '''[Script Package 4.0]
+public script package pkg_pay
+  import pkg_util;
+  public max_amount constant number := 10;
+  public function check(i_amount number) return boolean
+  is
+  begin
+    pkg_util.log('check -- not a comment');  -- pkg_util.trace() in a comment
+    return i_amount <= max_amount and code_pay_type.active;
+  end check;
+  procedure run
+  is
+  begin
+    if check(1) then
+      missing(2);
+    end if;
+  end run;
+end pkg_pay;
+'''
+
+CODE_TABLE = '''[Code Table 4.0]
+code table code_pay_type
+  row 1
+    intl_id "Active"
+'''
+
+
+def test_definitions_qualified_with_their_package():
+    parsed = symbol_index.parse(PACKAGE)
+    assert parsed['package'] == 'pkg_pay' and parsed['imports'] == ['pkg_util']
+    assert [(item['name'], item['kind'], item['line']) for item in parsed['definitions']] == [
+        ('pkg_pay', 'package', 2), ('pkg_pay.max_amount', 'constant', 4),
+        ('pkg_pay.check', 'function', 5), ('pkg_pay.run', 'procedure', 11)]
+
+
+def test_usages_skip_strings_comments_and_unknown_calls():
+    references = symbol_index.parse(PACKAGE)['references']
+    assert [(item['name'], item['kind'], item['line'], item['routine']) for item in references] == [
+        ('pkg_util', 'import', 3, None), ('pkg_util.log', 'call', 8, 'check'),
+        ('code_pay_type.active', 'member', 9, 'check'), ('pkg_pay.check', 'call', 14, 'run')]
+
+
+def test_code_table_rows():
+    parsed = symbol_index.parse(CODE_TABLE)
+    assert [(item['name'], item['kind']) for item in parsed['definitions']] == [
+        ('code_pay_type', 'code_table'), ('code_pay_type.active', 'code_row')]
+
+
+def test_endpoints_find_definitions_and_usages(workspace):
+    (workspace / 'files' / 'pkg_pay.txt').write_text(PACKAGE)
+    (workspace / 'files' / 'code_pay_type.txt').write_text(CODE_TABLE)
+    client = app.test_client()
+    definitions = client.get('/files/symbols/definitions?name=code_pay_type.active').get_json()['definitions']
+    assert [(item['filename'], item['line']) for item in definitions] == [('code_pay_type.txt', 4)]
+    usages = client.get('/files/symbols/usages?name=code_pay_type.active').get_json()['usages']
+    assert [(item['filename'], item['line']) for item in usages] == [('pkg_pay.txt', 9)]
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/files/symbols/definitions', 400), ('/files/symbols/usages?name=%20', 400),
+    ('/files/symbols/usages?name=check&limit=all', 400), ('/files/symbols/outline', 400),
+    ('/files/symbols/outline?filename=missing.txt', 404)])
+def test_endpoints_reject_bad_queries(workspace, url, status):
+    assert app.test_client().get(url).status_code == status
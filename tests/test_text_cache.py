@@ -0,0 +1,23 @@
+import pytest
+
+import text_cache
+from api import app
+
+
+def test_page_spec():
+    assert text_cache.parse_page_spec('3,1-2, 5-', 6) == [1, 2, 3, 5, 6]
+    assert text_cache.parse_page_spec('4-9', 5) == [4, 5]
+    with pytest.raises(ValueError):
+        text_cache.parse_page_spec('3-1', 5)
+
+
+@pytest.mark.parametrize('query', ['start=abc', 'start=0', 'pages=abc', 'limit=0'])
+def test_doc_rejects_invalid_page_selection(workspace, query):
+    (workspace / 'doc' / 'guide.md').write_text('# Guide\n')
+    response = app.test_client().get(f'/files/doc/guide.md?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['content'] == ''
+
+
+def test_doc_answers_404_for_missing_files(workspace):
+    assert app.test_client().get('/files/doc/missing.md').status_code == 404
@@ -0,0 +1,50 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from api import app
+
+
+@pytest.fixture
+def client(workspace):
+    return app.test_client()
+
+
+def test_create_rejects_non_integer_size(client):
+    for size in ('10', -1, 1.5, True, None):
+        response = client.post('/api/uploads/files', json={'filename': 'a.txt', 'size': size})
+        assert response.status_code == 400, size
+
+
+def test_resumable_upload(client, workspace):
+    body = b'alpha\nbeta\n'
+    created = client.post('/api/uploads/files', json={
+        'filename': 'a.txt', 'size': len(body), 'sha256': hashlib.sha256(body).hexdigest()}).get_json()
+    upload_id = created['upload_id']
+    first = client.put(f'/api/uploads/{upload_id}', data=body[:4], headers={'Upload-Offset': '0'})
+    assert first.status_code == 200 and first.get_json()['offset'] == 4
+    assert client.put(f'/api/uploads/{upload_id}', data=body[4:], headers={'Upload-Offset': '0'}).status_code == 409
+    last = client.put(f'/api/uploads/{upload_id}', data=body[4:], headers={'Upload-Offset': '4'})
+    assert last.status_code == 200 and last.get_json()['complete']
+    assert (workspace / 'files' / 'a.txt').read_bytes() == body
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+
+
+def test_raw_body_upload(client, workspace):
+    response = client.post('/api/upload/files?filename=raw.txt', data=b'raw bytes',
+                           content_type='application/octet-stream')
+    assert response.status_code == 200
+    assert (workspace / 'files' / 'raw.txt').read_bytes() == b'raw bytes'
+
+
+def test_oversized_body_refused_before_reading(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 16)
+    raw = client.post('/api/upload/files?filename=big.txt', data=b'x' * 64,
+                      content_type='application/octet-stream')
+    assert raw.status_code == 413
+    form = client.post('/api/upload/files', data={'file': (io.BytesIO(b'x' * 64), 'big.txt')},
+                       content_type='multipart/form-data')
+    assert form.status_code == 413
+    assert not os.path.exists('files/big.txt')
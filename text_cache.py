@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pdfplumber
+
+import metrics
+
+# Extracted text lives under cache/text, one JSON file per document version.
+# Entries are named <path key>-<content sha256>-<mtime_ns>.json so a changed
+# file (new content or new mtime) never hits a stale entry, while all versions
+# of one source path can still be found and dropped together.
+TEXT_CACHE_FOLDER = os.path.join('cache', 'text')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_path_locks = {}
+_fingerprints = {}
+
+
+def is_pdf(path):
+    return str(path).lower().endswith('.pdf')
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _path_key(path):
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+
+
+def _path_lock(path):
+    key = _path_key(path)
+    with _lock:
+        if key not in _path_locks:
+            _path_locks[key] = threading.Lock()
+        return _path_locks[key]
+
+
+def _fingerprint(path):
+    """Return (content digest, mtime_ns) for a file, hashing only when it changed on disk"""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    with _lock:
+        known = _fingerprints.get(key)
+    if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+        return known[2], stat.st_mtime_ns
+    digest = file_digest(path)
+    with _lock:
+        _fingerprints[key] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest, stat.st_mtime_ns
+
+
+def _cache_path(path):
+    digest, mtime_ns = _fingerprint(path)
+    return Path(TEXT_CACHE_FOLDER) / f'{_path_key(path)}-{digest}-{mtime_ns}.json'
+
+
+def _read_entry(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)['pages']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_entry(path, cache_file, pages):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # Drop older versions of the same source before publishing the new one
+    for stale in cache_file.parent.glob(f'{_path_key(path)}-*.json'):
+        if stale != cache_file:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+    tmp_file = cache_file.with_suffix(f'.{threading.get_ident()}.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'source': os.path.basename(path), 'pages': pages}, f)
+    os.replace(tmp_file, cache_file)
+
+
+def extract_page(page):
+    text = page.extract_text() or ""
+    # Release the parsed layout objects so only one page is held at a time
+    page.close()
+    return text
+
+
+def extract_pages(path):
+    """Extract the text of every page of a PDF, bypassing the cache"""
+    started = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        pages = [extract_page(page) for page in pdf.pages]
+    metrics.record_pdf_extraction(path, len(pages), time.perf_counter() - started)
+    return pages
+
+
+def get_pages(path):
+    """Return the page texts of a PDF, extracting and caching them on first use"""
+    cache_file = _cache_path(path)
+    pages = _read_entry(cache_file)
+    metrics.cache_result('pdf_text', pages is not None)
+    if pages is not None:
+        return pages
+    with _path_lock(path):
+        # Another thread may have filled the entry while we waited
+        pages = _read_entry(cache_file)
+        if pages is None:
+            pages = extract_pages(path)
+            _write_entry(path, cache_file, pages)
+    return pages
+
+
+def store_pages(path, pages):
+    """Publish page texts extracted elsewhere (e.g. by a worker process) as the cache entry"""
+    with _path_lock(path):
+        _write_entry(path, _cache_path(path), pages)
+
+
+def join_pages(pages):
+    return ''.join(page + "\n" for page in pages)
+
+
+def get_text(path):
+    """Return the text of a document; PDFs go through the cache, other files are read directly"""
+    if not is_pdf(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return join_pages(get_pages(path))
+
+
+def page_count(path):
+    """Return the number of pages of a document; non-PDF files count as a single page"""
+    if not is_pdf(path):
+        return 1
+    pages = _read_entry(_cache_path(path))
+    if pages is not None:
+        return len(pages)
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def parse_page_spec(spec, count):
+    """Turn a 1-based page spec like "1-3,7" into a sorted list of page numbers"""
+    numbers = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, _, last = part.partition('-')
+            first = int(first) if first.strip() else 1
+            last = int(last) if last.strip() else count
+        else:
+            first = last = int(part)
+        if first < 1 or last < first:
+            raise ValueError(f'Invalid page range: {part}')
+        numbers.update(range(first, min(last, count) + 1))
+    return sorted(numbers)
+
+
+def iter_pages(path, numbers=None):
+    """Yield (page number, text) pairs for the requested 1-based pages, or all pages.
+
+    Pages come from the cache when the document has been extracted before,
+    otherwise only the requested pages are opened and extracted, one at a time.
+    A full uncached pass fills the cache once it completes.
+    """
+    if not is_pdf(path):
+        if numbers is None or 1 in numbers:
+            yield 1, get_text(path)
+        return
+
+    cache_file = _cache_path(path)
+    pages = _read_entry(cache_file)
+    metrics.cache_result('pdf_text', pages is not None)
+    if pages is not None:
+        for number in numbers if numbers is not None else range(1, len(pages) + 1):
+            if number <= len(pages):
+                yield number, pages[number - 1]
+        return
+
+    extracted = []
+    with pdfplumber.open(path) as pdf:
+        wanted = numbers if numbers is not None else range(1, len(pdf.pages) + 1)
+        for number in wanted:
+            if number > len(pdf.pages):
+                break
+            started = time.perf_counter()
+            text = extract_page(pdf.pages[number - 1])
+            # Recorded per page, since a streaming client may stop consuming early
+            metrics.record_pdf_extraction(path, 1, time.perf_counter() - started)
+            if numbers is None:
+                extracted.append(text)
+            yield number, text
+    if numbers is None:
+        with _path_lock(path):
+            if not cache_file.exists():
+                _write_entry(path, cache_file, extracted)
+
+
+def is_cached(path):
+    """Return True if the current version of a PDF already has a cache entry"""
+    return _cache_path(path).exists()
+
+
+def invalidate(path):
+    """Remove every cached version of a document"""
+    with _lock:
+        _fingerprints.pop(os.path.abspath(path), None)
+    cache_dir = Path(TEXT_CACHE_FOLDER)
+    if not cache_dir.exists():
+        return
+    for entry in cache_dir.glob(f'{_path_key(path)}-*.json'):
+        try:
+            entry.unlink()
+        except OSError as e:
+            print(f"Error removing cached text {entry}: {e}")
+
+
+def warm(path):
+    """Fill the cache for a document in a background thread"""
+    if not is_pdf(path):
+        return None
+
+    def _run():
+        try:
+            get_pages(path)
+        except Exception as e:
+            print(f"Error extracting text from {path}: {e}")
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import chunk_store
+import dir_index
+import guide_index
+import jobs
+import search_index
+import symbol_index
+import text_cache
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# In-progress resumable uploads: <id>.json holds the metadata, <id>.part the
+# bytes received so far (its size is the resume offset)
+UPLOAD_FOLDER = os.path.join('cache', 'uploads')
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(512 * 1024 * 1024)))
+# Request body limit (Flask MAX_CONTENT_LENGTH): an upload plus its multipart framing
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Unfinished uploads are dropped after this many seconds without progress
+UPLOAD_EXPIRY = 24 * 60 * 60
+
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+_lock = threading.Lock()
+_upload_locks = {}
+# Running sha256 of each upload this process has received bytes for, with
+# the offset it covers; another process catches up by re-reading the .part file
+_hashers = {}
+
+
+class UploadError(Exception):
+    """Raised for an upload that cannot be accepted; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _upload_lock(upload_id):
+    with _lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+@contextmanager
+def _locked_part(upload_id):
+    """Open an upload's .part file under an exclusive lock held across processes; None if it is gone"""
+    part = None
+    if _UPLOAD_ID_PATTERN.match(upload_id or ''):
+        try:
+            part = open(_paths(upload_id)[1], 'r+b')
+        except FileNotFoundError:
+            pass
+    if part is None:
+        yield None
+        return
+    try:
+        if fcntl is not None:
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(part.fileno(), msvcrt.LK_LOCK, 1)
+        yield part
+    finally:
+        if fcntl is None:
+            part.seek(0)
+            msvcrt.locking(part.fileno(), msvcrt.LK_UNLCK, 1)
+        part.close()
+
+
+def _copy_hashing(stream, out, digest, limit, too_large):
+    """Copy stream to out in chunks, updating digest; returns the bytes copied"""
+    copied = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > limit:
+            raise UploadError(too_large, 413)
+        digest.update(chunk)
+        out.write(chunk)
+
+
+def _same_content(path, size, sha256):
+    try:
+        return os.path.getsize(path) == size and text_cache.file_digest(path) == sha256
+    except OSError:
+        return False
+
+
+def _publish(tmp_path, target_path):
+    """Move a finished upload into place atomically"""
+    try:
+        os.replace(tmp_path, target_path)
+    except OSError:
+        # cache/ on another filesystem: copy next to the target, then rename
+        staged = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copyfile(tmp_path, staged)
+        os.replace(staged, target_path)
+        os.remove(tmp_path)
+
+
+def _commit(tmp_path, folder, filename, size, sha256):
+    """Publish a fully received file unless the target already holds the same bytes"""
+    target_path = os.path.join(folder, filename)
+    if _same_content(target_path, size, sha256):
+        os.remove(tmp_path)
+        return {'filename': filename, 'size': size, 'sha256': sha256, 'stored': False}
+    _publish(tmp_path, target_path)
+    text_cache.invalidate(target_path)
+    dir_index.for_folder(folder).note_changed(filename)
+    return {
+        'filename': filename,
+        'size': size,
+        'sha256': sha256,
+        'stored': True,
+        'job_id': enqueue_processing(folder, filename)
+    }
+
+
+def save_stream(stream, folder, filename):
+    """Write an upload stream to folder/filename, hashing it on the way.
+
+    The bytes go to a temp file and replace the target with a rename, so
+    readers never see a partial file. An upload identical to the existing
+    file is discarded without touching it.
+    """
+    os.makedirs(folder, exist_ok=True)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_FOLDER, f'{uuid.uuid4().hex}.upload')
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as out:
+            size = _copy_hashing(stream, out, digest, MAX_UPLOAD_BYTES,
+                                 f'Upload exceeds the {MAX_UPLOAD_BYTES} byte limit')
+        return _commit(tmp_path, folder, filename, size, digest.hexdigest())
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _paths(upload_id):
+    return os.path.join(UPLOAD_FOLDER, f'{upload_id}.json'), os.path.join(UPLOAD_FOLDER, f'{upload_id}.part')
+
+
+def _load(upload_id):
+    if not _UPLOAD_ID_PATTERN.match(upload_id or ''):
+        return None
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['offset'] = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        return None
+    return meta
+
+
+def create(folder, filename, size, sha256=None):
+    """Start a resumable upload; returns its state, already complete if the target holds sha256"""
+    if isinstance(size, bool) or not isinstance(size, int) or size < 0:
+        raise UploadError('Upload size must be a non-negative integer')
+    if sha256 is not None and not (isinstance(sha256, str) and _SHA256_PATTERN.match(sha256)):
+        raise UploadError('sha256 must be 64 hex digits')
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadError(f'Upload exceeds the {MAX_UPLOAD_BYTES} byte limit', 413)
+    if sha256 and _same_content(os.path.join(folder, filename), size, sha256.lower()):
+        # Nothing to send: the same bytes are already stored
+        return {'upload_id': None, 'filename': filename, 'size': size, 'offset': size,
+                'sha256': sha256.lower(), 'complete': True, 'stored': False}
+
+    upload_id = uuid.uuid4().hex
+    meta = {
+        'upload_id': upload_id,
+        'folder': folder,
+        'filename': filename,
+        'size': size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created': time.time()
+    }
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    meta_path, part_path = _paths(upload_id)
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return dict(meta, offset=0, complete=False)
+
+
+def status(upload_id):
+    """Return the state of an upload (offset = bytes received), or None"""
+    meta = _load(upload_id)
+    if meta is not None:
+        meta['complete'] = False
+    return meta
+
+
+def _hasher_at(upload_id, part_path, offset):
+    cached = _hashers.get(upload_id)
+    if cached is not None and cached[0] == offset:
+        # A copy, so a failed chunk leaves the cached state at its offset
+        return cached[1].copy()
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest
+
+
+def append(upload_id, offset, stream):
+    """Append a chunk at offset; once all bytes are in, verify and publish the file.
+
+    A chunk must start exactly at the current offset (409 otherwise), which
+    lets a client that lost a response ask for the offset and resume. Chunks
+    are serialized by a lock on the .part file, so workers of other processes
+    cannot append to the same upload at the same time.
+    """
+    with _upload_lock(upload_id), _locked_part(upload_id) as part:
+        meta = _load(upload_id) if part is not None else None
+        if meta is None:
+            raise UploadError('Upload not found', 404)
+        if offset != meta['offset']:
+            raise UploadError(f"Chunk starts at {offset}, expected {meta['offset']}", 409)
+        meta_path, part_path = _paths(upload_id)
+        digest = _hasher_at(upload_id, part_path, offset)
+        part.seek(0, os.SEEK_END)
+        received = _copy_hashing(stream, part, digest, meta['size'] - offset,
+                                 f"Chunk extends past the declared size of {meta['size']} bytes")
+        part.flush()
+        offset += received
+        _hashers[upload_id] = (offset, digest)
+        os.utime(meta_path)
+
+        if offset < meta['size']:
+            return dict(meta, offset=offset, complete=False)
+
+        _hashers.pop(upload_id, None)
+        with _lock:
+            _upload_locks.pop(upload_id, None)
+        # Without its metadata the upload is gone for every other request
+        os.remove(meta_path)
+
+    sha256 = digest.hexdigest()
+    if meta['sha256'] and meta['sha256'] != sha256:
+        os.remove(part_path)
+        raise UploadError(f"Checksum mismatch: expected {meta['sha256']}, received {sha256}")
+    result = _commit(part_path, meta['folder'], meta['filename'], offset, sha256)
+    return dict(result, upload_id=upload_id, offset=offset, complete=True)
+
+
+def abort(upload_id):
+    with _upload_lock(upload_id), _locked_part(upload_id) as part:
+        if part is None or _load(upload_id) is None:
+            return False
+        _hashers.pop(upload_id, None)
+        with _lock:
+            _upload_locks.pop(upload_id, None)
+        meta_path, part_path = _paths(upload_id)
+        os.remove(meta_path)
+    try:
+        os.remove(part_path)
+    except OSError:
+        pass
+    return True
+
+
+def prune_stale(expiry=UPLOAD_EXPIRY):
+    """Remove uploads without progress for expiry seconds"""
+    removed = 0
+    now = time.time()
+    try:
+        names = os.listdir(UPLOAD_FOLDER)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if name.endswith('.json') and now - os.path.getmtime(os.path.join(UPLOAD_FOLDER, name)) > expiry:
+            removed += abort(name[:-len('.json')])
+    return removed
+
+
+def process_upload(params):
+    """Job handler: extract a stored upload into the text cache, index it for search, chunk it and rebuild its guide"""
+    folder = params['folder']
+    filename = params['filename']
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        raise LookupError(f'File not found: {filename}')
+    pages = len(text_cache.get_pages(path)) if text_cache.is_pdf(path) else None
+    search_index.index.add_file(folder, filename)
+    if folder == symbol_index.FILES_FOLDER:
+        symbol_index.index.update_file(filename)
+    if folder == chunk_store.DOC_FOLDER:
+        chunk_store.store.update_file(filename)
+    guide = guide_index.parse_name(filename) if folder == guide_index.DOC_FOLDER else None
+    if guide:
+        guide_index.index.get(guide[0])
+    return {'folder': folder, 'filename': filename, 'pages': pages}
+
+
+def enqueue_processing(folder, filename):
+    """Queue extraction and indexing of a stored file; returns the job id, or None if done inline"""
+    try:
+        return jobs.job_queue.submit('process_upload', {'folder': folder, 'filename': filename}).id
+    except jobs.QueueFull:
+        # Index now and let the first reader pay for extraction
+        search_index.index.add_file(folder, filename)
+        return None
+
+
+jobs.job_queue.register('process_upload', process_upload)